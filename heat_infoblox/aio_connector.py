@@ -0,0 +1,421 @@
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import asyncio
+import functools
+import logging
+import time
+
+from urllib3 import filepost
+
+from heat_infoblox import connector
+from heat_infoblox import ibexceptions as exc
+from heat_infoblox import logutils
+from heat_infoblox import metrics
+
+"""Asyncio client of the WAPI, for tools built around the plugin.
+
+The Heat engine runs on eventlet and keeps using connector.Infoblox. This
+module requires Python 3.5 or later and, unless a session is given,
+aiohttp. Example:
+
+    async with aio_connector.Infoblox(options) as conn:
+        zones = await conn.get_object('zone_auth', {'view': 'default'})
+        refs = await aio_connector.fan_out(
+            [functools.partial(conn.delete_object, z['_ref'])
+             for z in zones], limit=10)
+
+The retry policy and circuit breaker of the grid master are the same as
+those of connector.Infoblox. Reads always go to the grid master, and
+requests can neither be recorded nor replayed nor cached.
+"""
+
+LOG = logging.getLogger(__name__)
+
+
+class _Response(object):
+    """The parts of a response used by the connector and the retry policy."""
+
+    def __init__(self, status_code, content, headers):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers
+
+
+class _Unlimited(object):
+    async def __aenter__(self):
+        pass
+
+    async def __aexit__(self, exc_type, exc_value, tb):
+        pass
+
+
+def _slot(limit):
+    # a limit of 0 means unlimited, as for connector.Infoblox
+    return asyncio.Semaphore(limit) if limit else _Unlimited()
+
+
+class Infoblox(connector.Infoblox):
+    """Asyncio variant of connector.Infoblox.
+
+    get_object, get_all_objects, create_object, update_object,
+    delete_object, call_func, multi_request, upload_file and download_file
+    are coroutines taking the same arguments, returning the same results
+    and raising the same exceptions as those of connector.Infoblox.
+
+    At most http_pool_maxsize connections are opened to the grid, and at
+    most max_concurrent_reads and max_concurrent_writes requests are in
+    flight at once. The aiohttp session is created on first use, in the
+    running loop; close() it when done, or use the connector as an async
+    context manager.
+    """
+
+    def __init__(self, options, session=None):
+        super(Infoblox, self).__init__(options)
+        self.session = session
+        self.read_endpoints = None
+        self.ref_cache = None
+        self._slots = None
+
+    def _make_session(self):
+        return None
+
+    def _get_session(self):
+        if self.session is None:
+            import aiohttp
+
+            self.session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.http_pool_maxsize),
+                auth=aiohttp.BasicAuth(self.username, self.password))
+        return self.session
+
+    def _get_slots(self):
+        # asyncio primitives belong to the loop they are created in
+        if self._slots is None:
+            self._slots = {False: _slot(self.max_concurrent_reads),
+                           True: _slot(self.max_concurrent_writes)}
+        return self._slots
+
+    async def close(self):
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, tb):
+        await self.close()
+
+    async def _send(self, method, url, objtype, data=None, headers=None):
+        kwargs = {}
+        if not self.sslverify:
+            kwargs['ssl'] = False
+        sent = len(data or b'')
+        start = time.time()
+        try:
+            async with self._get_session().request(
+                    method, url, data=data, headers=headers,
+                    **kwargs) as resp:
+                r = _Response(resp.status, await resp.read(), resp.headers)
+        except Exception:
+            metrics.record_call(objtype, method, None, time.time() - start,
+                                sent, 0)
+            raise
+        metrics.record_call(objtype, method, r.status_code,
+                            time.time() - start, sent, len(r.content))
+        return r
+
+    async def _request(self, method, url, objtype, idempotent=True,
+                       write=None, **kwargs):
+        """Send a request to the grid master.
+
+        As connector.Infoblox._request, but the backoff between attempts
+        does not block the loop.
+        """
+        breaker = self.circuit_breaker
+        if write is None:
+            write = method != 'GET'
+        debug = LOG.isEnabledFor(logging.DEBUG)
+        if debug:
+            LOG.debug("WAPI request method=%s url=%s data=%s", method,
+                      logutils.redact_url(url),
+                      logutils.Body(kwargs.get('data')))
+        # retries are part of the call: the breaker lets the call through
+        # once, and is told its final outcome
+        breaker.before_call()
+        attempt = 0
+        while True:
+            try:
+                async with self._get_slots()[write]:
+                    r = await self._send(method, url, objtype, **kwargs)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # e.g. aiohttp.ClientError or asyncio.TimeoutError
+                breaker.record_failure()
+                raise
+
+            if debug:
+                LOG.debug("WAPI response method=%s url=%s status=%s "
+                          "content=%s", method, logutils.redact_url(url),
+                          r.status_code, logutils.Body(r.content))
+
+            if not self.retry_policy.is_retryable(r):
+                breaker.record_success()
+                return r
+
+            attempt += 1
+            if not idempotent or attempt >= self.retry_policy.max_attempts:
+                breaker.record_failure()
+                return r
+
+            delay = self.retry_policy.backoff(attempt, r)
+            LOG.warning("WAPI %s %s returned %s, retrying in %.2f seconds "
+                        "(attempt %d of %d)", method,
+                        logutils.redact_url(url), r.status_code,
+                        delay, attempt, self.retry_policy.max_attempts)
+            await asyncio.sleep(delay)
+
+    @staticmethod
+    def _fields(return_fields):
+        if return_fields:
+            return {'_return_fields': ','.join(return_fields)}
+        return {}
+
+    async def get_object(self, objtype, payload=None, return_fields=None,
+                         extattrs=None, from_master=False):
+        self._validate_objtype_or_die(objtype)
+        r = await self._request(
+            'GET', self._construct_url(objtype, self._fields(return_fields),
+                                       extattrs),
+            objtype,
+            data=self.codec.dumps(payload),
+            headers={'Content-type': 'application/json'})
+
+        if r.status_code != 200:
+            raise exc.InfobloxSearchError(
+                response=self._error_response(r),
+                objtype=objtype,
+                content=r.content,
+                code=r.status_code)
+
+        return self.codec.loads(r.content)
+
+    async def get_all_objects(self, objtype, payload=None, return_fields=None,
+                              query_params=None, page_size=1000):
+        self._validate_objtype_or_die(objtype)
+
+        query = dict(query_params or {})
+        query.update({'_paging': 1, '_return_as_object': 1,
+                      '_max_results': page_size})
+        query.update(self._fields(return_fields))
+        data = self.codec.dumps(payload)
+        result = []
+        while True:
+            r = await self._request(
+                'GET', self._construct_url(objtype, query), objtype,
+                data=data,
+                headers={'Content-type': 'application/json'})
+            if r.status_code != 200:
+                raise exc.InfobloxSearchError(
+                    response=self._error_response(r),
+                    objtype=objtype,
+                    content=r.content,
+                    code=r.status_code)
+            page = self.codec.loads(r.content)
+            result.extend(page['result'])
+            if not page.get('next_page_id'):
+                return result
+            query = {'_page_id': page['next_page_id']}
+            data = None
+
+    async def create_object(self, objtype, payload, return_fields=None):
+        self._validate_objtype_or_die(objtype)
+        r = await self._request(
+            'POST', self._construct_url(objtype, self._fields(return_fields)),
+            objtype,
+            idempotent=False,
+            data=self.codec.dumps(payload),
+            headers={'Content-type': 'application/json'})
+
+        if r.status_code != 201:
+            raise exc.InfobloxCannotCreateObject(
+                response=self._error_response(r),
+                objtype=objtype,
+                content=r.content,
+                args=payload,
+                code=r.status_code)
+
+        return self.codec.loads(r.content)
+
+    async def call_func(self, func_name, ref, payload, return_fields=None):
+        query_params = {'_function': func_name}
+        query_params.update(self._fields(return_fields))
+        read_only = func_name in connector.READ_ONLY_FUNCTIONS
+        r = await self._request(
+            'POST', self._construct_url(ref, query_params),
+            '%s?_function=%s' % (ref.split('/', 1)[0], func_name),
+            idempotent=read_only,
+            write=not read_only,
+            data=self.codec.dumps(payload),
+            headers={'Content-type': 'application/json'})
+
+        if r.status_code not in (200, 201):
+            raise exc.InfobloxFuncException(
+                response=self._error_response(r),
+                ref=ref,
+                func_name=func_name,
+                content=r.content,
+                code=r.status_code)
+
+        return self.codec.loads(r.content)
+
+    async def multi_request(self, calls):
+        read_only = all(call.get('method', 'GET') == 'GET' for call in calls)
+        r = await self._request(
+            'POST', self._construct_url('request'), 'request',
+            idempotent=read_only,
+            write=not read_only,
+            data=self.codec.dumps(calls),
+            headers={'Content-type': 'application/json'})
+
+        if r.status_code != 200:
+            raise exc.InfobloxMultiRequestError(
+                response=self._error_response(r),
+                count=len(calls),
+                content=r.content,
+                code=r.status_code)
+
+        return self.codec.loads(r.content)
+
+    async def update_object(self, ref, payload):
+        r = await self._request(
+            'PUT', self._construct_url(ref), ref.split('/', 1)[0],
+            data=self.codec.dumps(payload),
+            headers={'Content-type': 'application/json'})
+
+        if r.status_code != 200:
+            raise exc.InfobloxCannotUpdateObject(
+                response=self._error_response(r),
+                ref=ref,
+                content=r.content,
+                code=r.status_code)
+
+        return self.codec.loads(r.content)
+
+    async def delete_object(self, ref):
+        r = await self._request(
+            'DELETE', self._construct_url(ref), ref.split('/', 1)[0])
+
+        if r.status_code != 200:
+            raise exc.InfobloxCannotDeleteObject(
+                response=self._error_response(r),
+                ref=ref,
+                content=r.content,
+                code=r.status_code)
+
+        return self.codec.loads(r.content)
+
+    async def upload_file(self, data, filename='import.csv'):
+        upload = await self.call_func('uploadinit', 'fileop', {})
+        # the body requests sends for files={'filedata': ...}
+        body, content_type = filepost.encode_multipart_formdata(
+            {'filedata': (filename, data)})
+        r = await self._request('POST', upload['url'], 'fileop',
+                                idempotent=False, data=body,
+                                headers={'Content-Type': content_type})
+
+        if r.status_code not in (200, 201):
+            raise exc.InfobloxFileTransferError(
+                response=self._error_response(r),
+                url=logutils.redact_url(upload['url']),
+                content=r.content,
+                code=r.status_code)
+
+        return upload['token']
+
+    async def download_file(self, url):
+        r = await self._request('GET', url, 'fileop')
+
+        if r.status_code != 200:
+            raise exc.InfobloxFileTransferError(
+                response=self._error_response(r),
+                url=logutils.redact_url(url),
+                content=r.content,
+                code=r.status_code)
+
+        return r.content
+
+
+async def fan_out(calls, limit=None):
+    """Await many calls concurrently and return their results in order.
+
+    'calls' are functions returning an awaitable, e.g. functools.partial
+    objects of connector coroutines; at most 'limit' of them run at once.
+    If one of them fails, the others are cancelled, and the first error is
+    raised once none of them is running any more.
+    """
+    semaphore = asyncio.Semaphore(limit) if limit else None
+
+    async def run(call):
+        if semaphore is None:
+            return await call()
+        async with semaphore:
+            return await call()
+
+    tasks = [asyncio.ensure_future(run(call)) for call in calls]
+    if not tasks:
+        return []
+    try:
+        done, pending = await asyncio.wait(
+            tasks, return_when=asyncio.FIRST_EXCEPTION)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    for task in tasks:
+        if task in done and task.exception():
+            raise task.exception()
+    return [task.result() for task in tasks]
+
+
+class BlockingConnector(object):
+    """Blocking facade of an asyncio connector, for the manipulator.
+
+    Lets object_manipulator.InfobloxObjectManipulator run on top of an
+    asyncio connector: the coroutines of the connector are run in 'loop',
+    which runs in another thread, and waited for. Run the manipulator in an
+    executor of the loop:
+
+        ib = object_manipulator.InfobloxObjectManipulator(
+            aio_connector.BlockingConnector(conn, loop))
+        await loop.run_in_executor(None, ib.create_tsigs, keys)
+    """
+
+    def __init__(self, connector, loop):
+        self._connector = connector
+        self._loop = loop
+
+    def __getattr__(self, name):
+        attr = getattr(self._connector, name)
+        if not asyncio.iscoroutinefunction(attr):
+            return attr
+
+        @functools.wraps(attr)
+        def call(*args, **kwargs):
+            return asyncio.run_coroutine_threadsafe(
+                attr(*args, **kwargs), self._loop).result()
+        return call
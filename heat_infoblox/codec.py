@@ -0,0 +1,104 @@
+# Copyright (c) 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import importlib
+import json
+import sys
+
+"""JSON codecs for WAPI request and response bodies.
+
+The fastest installed JSON library is used unless a specific codec is
+configured. All codecs serialize to bytes, ready to be sent as a request
+body, and parse response bytes directly without decoding them to text
+first.
+"""
+
+AUTO = 'auto'
+
+# json.loads() accepts bytes on Python 2 (where they are str) and 3.6+
+_JSON_LOADS_BYTES = sys.version_info < (3,) or sys.version_info >= (3, 6)
+
+
+class Codec(object):
+    def __init__(self, name, dumps, loads):
+        self.name = name
+        self.dumps = dumps
+        self.loads = loads
+
+
+def _orjson():
+    orjson = importlib.import_module('orjson')
+    return Codec('orjson', orjson.dumps, orjson.loads)
+
+
+def _ujson():
+    ujson = importlib.import_module('ujson')
+
+    def dumps(obj):
+        return ujson.dumps(obj, escape_forward_slashes=False).encode('utf-8')
+    return Codec('ujson', dumps, ujson.loads)
+
+
+def _simplejson():
+    simplejson = importlib.import_module('simplejson')
+
+    def dumps(obj):
+        return simplejson.dumps(obj).encode('utf-8')
+    return Codec('simplejson', dumps, simplejson.loads)
+
+
+def _json():
+    def dumps(obj):
+        return json.dumps(obj).encode('utf-8')
+
+    def loads(data):
+        if not _JSON_LOADS_BYTES and isinstance(data, bytes):
+            data = data.decode('utf-8')
+        return json.loads(data)
+    return Codec('json', dumps, loads)
+
+
+# In order of preference
+CODECS = (
+    ('orjson', _orjson),
+    ('ujson', _ujson),
+    ('simplejson', _simplejson),
+    ('json', _json),
+)
+
+_codecs = {}
+
+
+def get_codec(name=AUTO):
+    """Return the codec 'name', or the fastest one installed for 'auto'."""
+    if name in _codecs:
+        return _codecs[name]
+
+    factories = dict(CODECS)
+    if name == AUTO:
+        candidates = [n for n, f in CODECS]
+    elif name in factories:
+        candidates = [name]
+    else:
+        raise ValueError("Unknown JSON codec '%s'." % name)
+
+    for candidate in candidates:
+        try:
+            codec = factories[candidate]()
+        except ImportError:
+            continue
+        _codecs[name] = codec
+        return codec
+    raise ImportError("JSON codec '%s' is not installed." % name)
@@ -30,4 +30,45 @@ OPTS = [
     cfg.IntOpt('http_pool_maxsize', default=100),
 ]
 
+# Tuning options passed through to connector.Infoblox
+CONNECTOR_OPTS = [
+    cfg.IntOpt('retry_max_attempts', default=5),
+    cfg.FloatOpt('retry_base_delay', default=0.5),
+    cfg.FloatOpt('retry_max_delay', default=30.0),
+    cfg.IntOpt('circuit_breaker_threshold', default=10),
+    cfg.FloatOpt('circuit_breaker_reset_timeout', default=30.0),
+    cfg.IntOpt('max_concurrent_reads', default=16),
+    cfg.IntOpt('max_concurrent_writes', default=4),
+    cfg.FloatOpt('read_rate_limit', default=0),
+    cfg.FloatOpt('write_rate_limit', default=0),
+    cfg.ListOpt('read_urls', default=[]),
+    cfg.StrOpt('read_strategy', default='round_robin',
+               choices=['round_robin', 'least_loaded']),
+    cfg.FloatOpt('read_endpoint_cooldown', default=30.0),
+    cfg.StrOpt('json_codec', default='auto',
+               choices=['auto', 'orjson', 'ujson', 'simplejson', 'json']),
+    cfg.StrOpt('record_file'),
+    cfg.StrOpt('replay_file'),
+    cfg.FloatOpt('replay_time_scale', default=1.0),
+    cfg.FloatOpt('restart_debounce_delay', default=2.0),
+    cfg.FloatOpt('snapshot_ttl', default=0),
+    cfg.StrOpt('ref_cache_file'),
+    cfg.FloatOpt('ref_cache_ttl', default=300.0),
+]
+
+# Export of the WAPI call metrics of the engine, see metrics.py
+METRICS_OPTS = [
+    cfg.StrOpt('metrics_statsd_address'),
+    cfg.StrOpt('metrics_file'),
+]
+
+# Profiling of resource actions, see profiling.py
+PROFILING_OPTS = [
+    cfg.StrOpt('profile_dir'),
+    cfg.IntOpt('profile_max_bytes', default=100 * 1024 * 1024),
+]
+
 CONF.register_opts(OPTS, group='infoblox')
+CONF.register_opts(CONNECTOR_OPTS, group='infoblox')
+CONF.register_opts(METRICS_OPTS, group='infoblox')
+CONF.register_opts(PROFILING_OPTS, group='infoblox')
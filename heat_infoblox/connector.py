@@ -13,17 +13,35 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import json as jsonutils
+import contextlib
 import logging
+import time
 
 import requests
 from six.moves.urllib import parse
 
+from heat_infoblox import codec
+from heat_infoblox import endpoints
+from heat_infoblox import governor
 from heat_infoblox import ibexceptions as exc
+from heat_infoblox import logutils
+from heat_infoblox import metrics
+from heat_infoblox import refcache
+from heat_infoblox import replay
+from heat_infoblox import retry
+from heat_infoblox import singleflight
+from heat_infoblox import tracing
 
 
 LOG = logging.getLogger(__name__)
 
+# Identical searches in flight from any connector share one HTTP request
+_searches = singleflight.Group()
+
+# WAPI functions which do not change anything and may be served by a
+# read-only endpoint
+READ_ONLY_FUNCTIONS = frozenset(['read_token'])
+
 
 class Infoblox(object):
     """Infoblox class
@@ -45,26 +63,94 @@ class Infoblox(object):
 
         reqd_opts = ['url', 'username', 'password']
         default_opts = {'http_pool_connections': 5,
-                        'http_pool_maxsize': 20}
-        for opt in reqd_opts + default_opts.keys():
+                        'http_pool_maxsize': 20,
+                        'read_urls': [],
+                        'read_strategy': endpoints.ROUND_ROBIN,
+                        'json_codec': codec.AUTO,
+                        'record_file': None,
+                        'replay_file': None,
+                        'ref_cache_file': None}
+        # 0 is a valid value of these, e.g. retry_max_attempts=0 disables
+        # the retries, so only None falls back to their default
+        numeric_opts = {'retry_max_attempts': 5,
+                        'retry_base_delay': 0.5,
+                        'retry_max_delay': 30.0,
+                        'circuit_breaker_threshold': 10,
+                        'circuit_breaker_reset_timeout': 30.0,
+                        'max_concurrent_reads': 16,
+                        'max_concurrent_writes': 4,
+                        'read_rate_limit': 0,
+                        'write_rate_limit': 0,
+                        'read_endpoint_cooldown': 30.0,
+                        'replay_time_scale': 1.0,
+                        'restart_debounce_delay': 2.0,
+                        'snapshot_ttl': 0,
+                        'ref_cache_ttl': 300.0}
+        for opt in reqd_opts + list(default_opts):
             setattr(self, opt, options.get(opt) or default_opts.get(opt))
+        for opt, default in numeric_opts.items():
+            value = options.get(opt)
+            setattr(self, opt, default if value is None else value)
 
         for opt in reqd_opts:
-            LOG.debug("self.%s = %s" % (opt, getattr(self, opt)))
             if not getattr(self, opt):
                 raise exc.InfobloxIsMisconfigured(option=opt)
-
-        self.session = requests.Session()
+        LOG.debug("Infoblox connector url=%s username=%s",
+                  logutils.redact_url(self.url), self.username)
+
+        self.session = self._make_session()
+
+        self.retry_policy = retry.RetryPolicy(
+            max_attempts=self.retry_max_attempts,
+            base_delay=self.retry_base_delay,
+            max_delay=self.retry_max_delay)
+        self.circuit_breaker = retry.get_circuit_breaker(
+            self.url,
+            self.circuit_breaker_threshold,
+            self.circuit_breaker_reset_timeout)
+        self.governor = governor.get_governor(
+            self.url,
+            self.max_concurrent_reads,
+            self.max_concurrent_writes,
+            self.read_rate_limit,
+            self.write_rate_limit)
+
+        self.codec = codec.get_codec(self.json_codec)
+
+        self.read_endpoints = None
+        if self.read_urls:
+            self.read_endpoints = endpoints.get_endpoint_pool(
+                self.read_urls, self.read_strategy,
+                self.read_endpoint_cooldown)
+        # Object families written through this connector. Reads of those
+        # go to the grid master so they see our own writes.
+        self._pinned = set()
+
+        self.ref_cache = None
+        if self.ref_cache_file:
+            self.ref_cache = refcache.get_ref_cache(self.ref_cache_file,
+                                                    self.ref_cache_ttl)
+
+    def _make_session(self):
+        if self.replay_file:
+            return replay.ReplaySession(
+                replay.get_trace(self.replay_file), self.replay_time_scale)
+        session = requests.Session()
         adapter = requests.adapters.HTTPAdapter(
             max_retries=5,
             pool_connections=self.http_pool_connections,
             pool_maxsize=self.http_pool_maxsize)
-        self.session.mount('http://', adapter)
-        self.session.mount('https://', adapter)
-        self.session.auth = (self.username, self.password)
-        self.session.verify = self.sslverify
-
-    def _construct_url(self, relative_path, query_params=None, extattrs=None):
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.auth = (self.username, self.password)
+        session.verify = self.sslverify
+        if self.record_file:
+            session = replay.RecordingSession(
+                session, replay.get_recorder(self.record_file))
+        return session
+
+    def _construct_url(self, relative_path, query_params=None, extattrs=None,
+                       base_url=None):
         if query_params is None:
             query_params = {}
         if extattrs is None:
@@ -86,10 +172,163 @@ class Infoblox(object):
                 query += '&'
             query += parse.urlencode(query_params)
 
-        baseurl = parse.urljoin(self.url, parse.quote(relative_path))
-        LOG.debug("_construct_url: %s" % (baseurl + query))
+        baseurl = parse.urljoin(base_url or self.url,
+                                parse.quote(relative_path))
         return baseurl + query
 
+    def _limits(self, base_url):
+        if base_url is None:
+            return self.circuit_breaker, self.governor
+        breaker = retry.get_circuit_breaker(
+            base_url,
+            self.circuit_breaker_threshold,
+            self.circuit_breaker_reset_timeout)
+        return breaker, governor.get_governor(
+            base_url,
+            self.max_concurrent_reads,
+            self.max_concurrent_writes,
+            self.read_rate_limit,
+            self.write_rate_limit)
+
+    def _send(self, method, url, objtype, **kwargs):
+        sent = len(kwargs.get('data') or b'')
+        start = time.time()
+        try:
+            if not tracing.enabled():
+                r = self.session.request(method, url, **kwargs)
+            else:
+                info = {'method': method, 'objtype': objtype,
+                        'host': parse.urlparse(url).hostname}
+                with tracing.trace('infoblox-wapi', info) as stop_info:
+                    r = self.session.request(method, url, **kwargs)
+                    stop_info['status'] = r.status_code
+                    stop_info['size'] = len(r.content or b'')
+        except requests.exceptions.RequestException:
+            metrics.record_call(objtype, method, None, time.time() - start,
+                                sent, 0)
+            raise
+        metrics.record_call(objtype, method, r.status_code,
+                            time.time() - start, sent, len(r.content or b''))
+        return r
+
+    def _request(self, method, url, objtype, idempotent=True, base_url=None,
+                 write=None, **kwargs):
+        """Send a request to the grid master or to 'base_url'.
+
+        Each attempt waits for a read or write slot of the server's governor;
+        any method but GET takes a write slot unless 'write' says otherwise,
+        e.g. for read-only functions.
+        Overload responses (see retry.RetryPolicy) are retried with jittered
+        backoff if the call is idempotent. The outcome of the call, once its
+        retries are over, is reported to the server's circuit breaker, which
+        fails fast while it is struggling.
+        """
+        breaker, limiter = self._limits(base_url)
+        if write is None:
+            write = method != 'GET'
+        debug = LOG.isEnabledFor(logging.DEBUG)
+        if debug:
+            LOG.debug("WAPI request method=%s url=%s data=%s", method,
+                      logutils.redact_url(url),
+                      logutils.Body(kwargs.get('data')))
+        # retries are part of the call: the breaker lets the call through
+        # once, and is told its final outcome
+        breaker.before_call()
+        attempt = 0
+        while True:
+            try:
+                with limiter.slot(write):
+                    r = self._send(method, url, objtype, **kwargs)
+            except requests.exceptions.RequestException:
+                breaker.record_failure()
+                raise
+
+            if debug:
+                LOG.debug("WAPI response method=%s url=%s status=%s "
+                          "content=%s", method, logutils.redact_url(url),
+                          r.status_code, logutils.Body(r.content))
+
+            if not self.retry_policy.is_retryable(r):
+                breaker.record_success()
+                return r
+
+            attempt += 1
+            if not idempotent or attempt >= self.retry_policy.max_attempts:
+                breaker.record_failure()
+                return r
+
+            delay = self.retry_policy.backoff(attempt, r)
+            LOG.warning("WAPI %s %s returned %s, retrying in %.2f seconds "
+                        "(attempt %d of %d)", method,
+                        logutils.redact_url(url), r.status_code,
+                        delay, attempt, self.retry_policy.max_attempts)
+            time.sleep(delay)
+
+    @staticmethod
+    def _object_family(objtype_or_ref):
+        # 'member:dns' and 'member/b25l...' both belong to 'member'
+        return objtype_or_ref.split('/', 1)[0].split(':', 1)[0]
+
+    @contextlib.contextmanager
+    def _writing(self, *objtypes_or_refs):
+        """Pin the families written to, and outdate their cached results.
+
+        The cached results are outdated once the write is over, so that the
+        searches made by other workers meanwhile are not used either.
+        """
+        families = set(self._object_family(o) for o in objtypes_or_refs)
+        self._pinned.update(families)
+        try:
+            yield
+        finally:
+            if self.ref_cache is not None:
+                for family in sorted(families):
+                    if not self.ref_cache.bump(self.url, family):
+                        LOG.warning("Searches of %s cached by other workers "
+                                    "may be used until they expire, after "
+                                    "a write to it", family)
+
+    def _read_request(self, method, path, query_params, objtype,
+                      extattrs=None, from_master=False, **kwargs):
+        """Send a read-only request, preferably to a read endpoint.
+
+        The grid master serves the request if 'from_master' is set, if the
+        object family was written through this connector, if there are no
+        healthy read endpoints or if the chosen read endpoint fails or is
+        overloaded.
+        """
+        pool = self.read_endpoints
+        if (pool is not None and not from_master and
+                self._object_family(path) not in self._pinned):
+            endpoint = pool.select()
+            if endpoint is not None:
+                url = self._construct_url(path, query_params, extattrs,
+                                          base_url=endpoint.url)
+                try:
+                    with pool.use(endpoint):
+                        r = self._request(method, url, objtype,
+                                          base_url=endpoint.url,
+                                          write=False, **kwargs)
+                    if (r.status_code < 500 and
+                            r.status_code != requests.codes.too_many):
+                        return r
+                except (requests.exceptions.RequestException,
+                        exc.InfobloxCircuitOpen) as e:
+                    LOG.info("Read endpoint %s failed: %s", endpoint.url, e)
+                LOG.warning("Read endpoint %s is unavailable, using the grid "
+                            "master instead", endpoint.url)
+                pool.mark_down(endpoint)
+
+        url = self._construct_url(path, query_params, extattrs)
+        return self._request(method, url, objtype, write=False, **kwargs)
+
+    def _error_response(self, r):
+        # Errors from a proxy or an overloaded server may not be JSON
+        try:
+            return self.codec.loads(r.content)
+        except ValueError:
+            return None
+
     def _validate_objtype_or_die(self, objtype):
         if not objtype:
             raise ValueError('WAPI object type can\'t be empty.')
@@ -97,12 +336,14 @@ class Infoblox(object):
             raise ValueError('WAPI object type can\'t contains slash.')
 
     def get_object(self, objtype, payload=None, return_fields=None,
-                   extattrs=None):
+                   extattrs=None, from_master=False):
         """Retrieve a list of Infoblox objects of type 'objtype'
 
         Args:
             objtype  (str): Infoblox object type, e.g. 'view', 'tsig', etc.
             payload (dict): Payload with data to send
+            from_master (bool): Never use a read-only endpoint, e.g. because
+                                the result is about to be written back
         Returns:
             A list of the Infoblox objects requested
         Raises:
@@ -121,25 +362,91 @@ class Infoblox(object):
 
         headers = {'Content-type': 'application/json'}
 
-        data = jsonutils.dumps(payload)
+        data = self.codec.dumps(payload)
         url = self._construct_url(objtype, query_params, extattrs)
-        LOG.debug("DATA = %s" % data)
-
-        r = self.session.get(url,
-                             data=data,
-                             verify=self.sslverify,
-                             headers=headers)
 
-        LOG.debug("RESPONSE[%s] = %s" % (r.status_code, r.content))
+        family = self._object_family(objtype)
+        from_master = from_master or family in self._pinned
+        cache = None if from_master else self.ref_cache
+        if cache is not None:
+            # results are only shared by connectors of the same user, who
+            # sees the same objects
+            query = '%s %s %s' % (self.username, url,
+                                  refcache.natural_key(payload))
+            content = cache.get_result(self.url, family, query)
+            if content is not None:
+                return self.codec.loads(content)
+            version = cache.version(self.url, family)
+        # Each caller decodes the shared response itself, so callers never
+        # share (and mutate) the same result objects.
+        r = _searches.do(
+            (self.username, url, data, from_master),
+            lambda: self._read_request('GET', objtype, query_params,
+                                       objtype, extattrs,
+                                       from_master=from_master,
+                                       data=data,
+                                       verify=self.sslverify,
+                                       headers=headers))
 
         if r.status_code != requests.codes.ok:
             raise exc.InfobloxSearchError(
-                response=jsonutils.loads(r.content),
+                response=self._error_response(r),
                 objtype=objtype,
                 content=r.content,
                 code=r.status_code)
 
-        return jsonutils.loads(r.content)
+        if cache is not None:
+            cache.put_result(self.url, family, query, r.content, version)
+        return self.codec.loads(r.content)
+
+    def get_all_objects(self, objtype, payload=None, return_fields=None,
+                        query_params=None, page_size=1000):
+        """Retrieve all the Infoblox objects of type 'objtype', page by page
+
+        Unlike get_object, there is no limit on the number of objects found.
+        The pages are read from the grid master, which keeps the state of
+        the search between them.
+
+        Args:
+            objtype  (str): Infoblox object type, e.g. 'view', 'tsig', etc.
+            payload (dict): Payload with data to send
+            query_params (dict): Other query arguments of the search, e.g.
+                                 {'*TenantID~': '.*'}
+            page_size (int): Maximum number of objects read per request
+        Returns:
+            A list of the Infoblox objects requested
+        Raises:
+            InfobloxSearchError
+        """
+        self._validate_objtype_or_die(objtype)
+
+        query = dict(query_params or {})
+        query.update({'_paging': 1, '_return_as_object': 1,
+                      '_max_results': page_size})
+        if return_fields:
+            query['_return_fields'] = ','.join(return_fields)
+
+        headers = {'Content-type': 'application/json'}
+        data = self.codec.dumps(payload)
+        result = []
+        while True:
+            r = self._request('GET', self._construct_url(objtype, query),
+                              objtype,
+                              data=data,
+                              verify=self.sslverify,
+                              headers=headers)
+            if r.status_code != requests.codes.ok:
+                raise exc.InfobloxSearchError(
+                    response=self._error_response(r),
+                    objtype=objtype,
+                    content=r.content,
+                    code=r.status_code)
+            page = self.codec.loads(r.content)
+            result.extend(page['result'])
+            if not page.get('next_page_id'):
+                return result
+            query = {'_page_id': page['next_page_id']}
+            data = None
 
     def create_object(self, objtype, payload, return_fields=None):
         """Create an Infoblox object of type 'objtype'
@@ -166,27 +473,26 @@ class Infoblox(object):
 
         headers = {'Content-type': 'application/json'}
 
-        LOG.debug("DATA = %s" % jsonutils.dumps(payload))
+        data = self.codec.dumps(payload)
 
-        r = self.session.post(url,
-                              data=jsonutils.dumps(payload),
+        with self._writing(objtype):
+            r = self._request('POST', url, objtype,
+                              idempotent=False,
+                              data=data,
                               verify=self.sslverify,
                               headers=headers)
 
-        LOG.debug("RESPONSE = %s" % r)
-
         if r.status_code != requests.codes.CREATED:
             raise exc.InfobloxCannotCreateObject(
-                response=jsonutils.loads(r.content),
+                response=self._error_response(r),
                 objtype=objtype,
                 content=r.content,
                 args=payload,
                 code=r.status_code)
 
-        return jsonutils.loads(r.content)
+        return self.codec.loads(r.content)
 
     def call_func(self, func_name, ref, payload, return_fields=None):
-        LOG.debug("CALL_FUNC %s, %s, %s" % (func_name, ref, payload))
         if not return_fields:
             return_fields = []
 
@@ -196,29 +502,118 @@ class Infoblox(object):
         if return_fields:
             query_params['_return_fields'] = ','.join(return_fields)
 
-        LOG.debug("CALLING FUNC _construct_url")
-
         url = self._construct_url(ref, query_params)
-
-        LOG.debug("FUNC_URL = %s" % url)
-        LOG.debug("DATA = %s" % jsonutils.dumps(payload))
+        data = self.codec.dumps(payload)
 
         headers = {'Content-type': 'application/json'}
-        r = self.session.post(url,
-                              data=jsonutils.dumps(payload),
-                              verify=self.sslverify,
-                              headers=headers)
+        # e.g. 'member?_function=read_token', as in the WAPI URL
+        objtype = '%s?_function=%s' % (ref.split('/', 1)[0], func_name)
+        if func_name in READ_ONLY_FUNCTIONS:
+            r = self._read_request('POST', ref, query_params, objtype,
+                                   data=data,
+                                   verify=self.sslverify,
+                                   headers=headers)
+        else:
+            with self._writing(ref):
+                r = self._request('POST', url, objtype,
+                                  idempotent=False,
+                                  data=data,
+                                  verify=self.sslverify,
+                                  headers=headers)
 
         if r.status_code not in (requests.codes.CREATED,
                                  requests.codes.ok):
             raise exc.InfobloxFuncException(
-                response=jsonutils.loads(r.content),
+                response=self._error_response(r),
                 ref=ref,
                 func_name=func_name,
                 content=r.content,
                 code=r.status_code)
 
-        return jsonutils.loads(r.content)
+        return self.codec.loads(r.content)
+
+    def multi_request(self, calls):
+        """Run several WAPI calls in a single request
+
+        The grid runs the calls in order and rolls all of them back if one
+        fails.
+
+        Args:
+            calls (list): Calls as dicts with the 'method' and 'object' (an
+                          object type or reference) of the call, and
+                          optionally its 'data' and query 'args'
+        Returns:
+            A list of the results of the calls
+        Raises:
+            InfobloxMultiRequestError
+        """
+        headers = {'Content-type': 'application/json'}
+        written = [call['object'] for call in calls
+                   if call.get('method', 'GET') != 'GET']
+        with self._writing(*written):
+            r = self._request('POST', self._construct_url('request'),
+                              'request',
+                              idempotent=not written,
+                              write=bool(written),
+                              data=self.codec.dumps(calls),
+                              verify=self.sslverify,
+                              headers=headers)
+
+        if r.status_code != requests.codes.ok:
+            raise exc.InfobloxMultiRequestError(
+                response=self._error_response(r),
+                count=len(calls),
+                content=r.content,
+                code=r.status_code)
+
+        return self.codec.loads(r.content)
+
+    def upload_file(self, data, filename='import.csv'):
+        """Upload a file to the grid, e.g. for a CSV import
+
+        Args:
+            data (bytes): Content of the file
+        Returns:
+            The token of the uploaded file
+        Raises:
+            InfobloxException
+        """
+        upload = self.call_func('uploadinit', 'fileop', {})
+        r = self._request('POST', upload['url'], 'fileop',
+                          idempotent=False,
+                          files={'filedata': (filename, data)},
+                          verify=self.sslverify)
+
+        if r.status_code not in (requests.codes.CREATED,
+                                 requests.codes.ok):
+            raise exc.InfobloxFileTransferError(
+                response=self._error_response(r),
+                url=logutils.redact_url(upload['url']),
+                content=r.content,
+                code=r.status_code)
+
+        return upload['token']
+
+    def download_file(self, url):
+        """Download a file prepared by the grid, e.g. a CSV error log
+
+        Args:
+            url (str): URL returned by the fileop function preparing it
+        Returns:
+            The content of the file, as bytes
+        Raises:
+            InfobloxFileTransferError
+        """
+        r = self._request('GET', url, 'fileop', verify=self.sslverify)
+
+        if r.status_code != requests.codes.ok:
+            raise exc.InfobloxFileTransferError(
+                response=self._error_response(r),
+                url=logutils.redact_url(url),
+                content=r.content,
+                code=r.status_code)
+
+        return r.content
 
     def update_object(self, ref, payload):
         """Update an Infoblox object
@@ -233,19 +628,21 @@ class Infoblox(object):
         """
 
         headers = {'Content-type': 'application/json'}
-        r = self.session.put(self._construct_url(ref),
-                             data=jsonutils.dumps(payload),
-                             verify=self.sslverify,
-                             headers=headers)
+        with self._writing(ref):
+            r = self._request('PUT', self._construct_url(ref),
+                              ref.split('/', 1)[0],
+                              data=self.codec.dumps(payload),
+                              verify=self.sslverify,
+                              headers=headers)
 
         if r.status_code != requests.codes.ok:
             raise exc.InfobloxCannotUpdateObject(
-                response=jsonutils.loads(r.content),
+                response=self._error_response(r),
                 ref=ref,
                 content=r.content,
                 code=r.status_code)
 
-        return jsonutils.loads(r.content)
+        return self.codec.loads(r.content)
 
     def delete_object(self, ref):
         """Remove an Infoblox object
@@ -257,14 +654,16 @@ class Infoblox(object):
         Raises:
             InfobloxException
         """
-        r = self.session.delete(self._construct_url(ref),
-                                verify=self.sslverify)
+        with self._writing(ref):
+            r = self._request('DELETE', self._construct_url(ref),
+                              ref.split('/', 1)[0],
+                              verify=self.sslverify)
 
         if r.status_code != requests.codes.ok:
             raise exc.InfobloxCannotDeleteObject(
-                response=jsonutils.loads(r.content),
+                response=self._error_response(r),
                 ref=ref,
                 content=r.content,
                 code=r.status_code)
 
-        return jsonutils.loads(r.content)
+        return self.codec.loads(r.content)
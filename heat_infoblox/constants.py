@@ -24,3 +24,11 @@ SSLVERIFY = 'sslverify'
 
 NETMRI = 'NetMRI'
 DDI = 'Infoblox'
+
+# Field holding the value of each type of DNS record
+RECORD_VALUE_FIELDS = {
+    'record:a': 'ipv4addr',
+    'record:aaaa': 'ipv6addr',
+    'record:cname': 'canonical',
+    'record:ptr': 'ptrdname',
+}
@@ -0,0 +1,96 @@
+# Copyright (c) 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import contextlib
+import itertools
+import threading
+import time
+
+"""Selection of read-only WAPI endpoints (Grid Master Candidates)."""
+
+ROUND_ROBIN = 'round_robin'
+LEAST_LOADED = 'least_loaded'
+STRATEGIES = (ROUND_ROBIN, LEAST_LOADED)
+
+
+class Endpoint(object):
+    __slots__ = ('url', 'in_flight', 'down_until')
+
+    def __init__(self, url):
+        self.url = url
+        self.in_flight = 0
+        self.down_until = 0
+
+    def is_healthy(self, now):
+        return self.down_until <= now
+
+
+class EndpointPool(object):
+    """A set of read endpoints with passive health checking.
+
+    An endpoint that fails is taken out of rotation for 'cooldown' seconds.
+    After that the next read sent to it acts as a health probe: success keeps
+    it in rotation, failure takes it out again.
+    """
+
+    def __init__(self, urls, strategy=ROUND_ROBIN, cooldown=30.0):
+        if strategy not in STRATEGIES:
+            raise ValueError("Unknown read endpoint strategy '%s'." %
+                             strategy)
+        self.endpoints = [Endpoint(url) for url in urls]
+        self.strategy = strategy
+        self.cooldown = cooldown
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def select(self):
+        """Return a healthy endpoint, or None if there is none."""
+        now = time.time()
+        with self._lock:
+            healthy = [e for e in self.endpoints if e.is_healthy(now)]
+            if not healthy:
+                return None
+            if self.strategy == LEAST_LOADED:
+                return min(healthy, key=lambda e: e.in_flight)
+            return healthy[next(self._counter) % len(healthy)]
+
+    @contextlib.contextmanager
+    def use(self, endpoint):
+        with self._lock:
+            endpoint.in_flight += 1
+        try:
+            yield endpoint
+        finally:
+            with self._lock:
+                endpoint.in_flight -= 1
+
+    def mark_down(self, endpoint):
+        with self._lock:
+            endpoint.down_until = time.time() + self.cooldown
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_endpoint_pool(urls, strategy=ROUND_ROBIN, cooldown=30.0):
+    """Return the pool shared by all connectors using the same endpoints."""
+    key = (tuple(urls), strategy)
+    with _pools_lock:
+        pool = _pools.get(key)
+        if pool is None:
+            pool = EndpointPool(urls, strategy, cooldown)
+            _pools[key] = pool
+        return pool
@@ -0,0 +1,97 @@
+# Copyright (c) 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import contextlib
+import threading
+import time
+
+"""Per-grid concurrency and request rate limits."""
+
+
+class TokenBucket(object):
+    """Token bucket rate limiter.
+
+    'rate' tokens per second are added up to 'burst'. A caller that finds
+    the bucket empty reserves the next token and sleeps until it is due, so
+    waiting callers are served in arrival order. A rate of 0 disables the
+    limit.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst or max(1.0, self.rate))
+        self.tokens = self.burst
+        self.updated = time.time()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        with self._lock:
+            now = time.time()
+            self.tokens = min(self.burst,
+                              self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            wait = -self.tokens / self.rate if self.tokens < 0 else 0
+        if wait > 0:
+            time.sleep(wait)
+
+
+def _semaphore(limit):
+    return threading.BoundedSemaphore(limit) if limit else None
+
+
+class Governor(object):
+    """Limits the requests in flight to one grid master.
+
+    Reads and writes have separate limits because the grid master degrades
+    much sooner with concurrent write transactions than with searches.
+    """
+
+    def __init__(self, max_reads, max_writes, read_rate=0, write_rate=0):
+        # a limit of 0 means unlimited, as for the rates
+        self._semaphores = {False: _semaphore(max_reads),
+                            True: _semaphore(max_writes)}
+        self._buckets = {False: TokenBucket(read_rate),
+                         True: TokenBucket(write_rate)}
+
+    @contextlib.contextmanager
+    def slot(self, write):
+        semaphore = self._semaphores[write]
+        if semaphore is None:
+            self._buckets[write].acquire()
+            yield
+            return
+        semaphore.acquire()
+        try:
+            self._buckets[write].acquire()
+            yield
+        finally:
+            semaphore.release()
+
+
+_governors = {}
+_governors_lock = threading.Lock()
+
+
+def get_governor(url, max_reads, max_writes, read_rate=0, write_rate=0):
+    """Return the governor shared by all connectors to 'url'."""
+    with _governors_lock:
+        governor = _governors.get(url)
+        if governor is None:
+            governor = Governor(max_reads, max_writes, read_rate, write_rate)
+            _governors[url] = governor
+        return governor
@@ -56,10 +56,16 @@ class ResourceExhausted(ServiceUnavailable):
     pass
 
 
+class InfobloxCircuitOpen(ServiceUnavailable):
+    message = _("Requests to %(url)s are suspended after repeated failures, "
+                "retry in %(retry_in)s seconds.")
+
+
 class InfobloxException(InfobloxExceptionBase):
     """Generic Infoblox Exception."""
     def __init__(self, response, **kwargs):
         self.response = response
+        self.code = kwargs.get('code')
         super(InfobloxException, self).__init__(**kwargs)
 
 
@@ -93,6 +99,19 @@ class InfobloxFuncException(InfobloxException):
                 "ref %(ref)s: %(content)s [code %(code)s]")
 
 
+class InfobloxMultiRequestError(InfobloxException):
+    message = _("Cannot execute a request of %(count)s calls: "
+                "%(content)s [code %(code)s]")
+
+
+class InfobloxFileTransferError(InfobloxException):
+    message = _("Cannot transfer file %(url)s: %(content)s [code %(code)s]")
+
+
+class InfobloxCsvImportFailed(InfobloxExceptionBase):
+    message = _("CSV import %(import_id)s ended with status %(status)s")
+
+
 class NoInfobloxMemberAvailable(ResourceExhausted):
     message = _("No Infoblox Member is available.")
 
@@ -0,0 +1,94 @@
+# Copyright (c) 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import re
+
+import six
+
+"""Lazy, redacting log arguments.
+
+The objects below are passed as logging arguments and only format their
+value when a record is actually emitted. Callers on hot paths should still
+check LOG.isEnabledFor() first so that nothing at all is allocated when the
+level is disabled.
+"""
+
+# Maximum number of characters of a request or response body to log
+MAX_BODY_LENGTH = 2048
+
+MASK = '***'
+
+SENSITIVE_KEYS = ('password', 'secret', 'key', 'token', 'shared_secret',
+                  'default_admin_password')
+
+# A sensitive string value, possibly cut off by truncation
+_SENSITIVE_JSON = re.compile(
+    r'("(?:%s)"\s*:\s*)"(?:[^"\\]|\\.)*(?:"|$)' % '|'.join(SENSITIVE_KEYS))
+
+_URL_CREDENTIALS = re.compile(r'(://[^/:@]+:)[^/@]*@')
+
+
+def redact_url(url):
+    return _URL_CREDENTIALS.sub(r'\1%s@' % MASK, url)
+
+
+def redact_json(text):
+    """Mask the sensitive string values of a JSON text."""
+    return _SENSITIVE_JSON.sub(r'\1"%s"' % MASK, text)
+
+
+class Body(object):
+    """A request or response body, redacted and truncated when formatted."""
+
+    __slots__ = ('body', 'limit')
+
+    def __init__(self, body, limit=MAX_BODY_LENGTH):
+        self.body = body
+        self.limit = limit
+
+    def __str__(self):
+        body = self.body
+        if body is None:
+            return ''
+        if isinstance(body, bytes):
+            size = len(body)
+            body = body[:self.limit * 2].decode('utf-8', 'replace')
+        else:
+            size = len(body)
+        body = redact_json(body)
+        if size > self.limit:
+            return '%s... (%d bytes)' % (body[:self.limit], size)
+        return body
+
+
+class Redacted(object):
+    """A payload dict with sensitive values masked when formatted."""
+
+    __slots__ = ('obj',)
+
+    def __init__(self, obj):
+        self.obj = obj
+
+    @classmethod
+    def _redact(cls, obj):
+        if isinstance(obj, dict):
+            return dict((k, MASK if k in SENSITIVE_KEYS else cls._redact(v))
+                        for k, v in six.iteritems(obj))
+        if isinstance(obj, (list, tuple)):
+            return [cls._redact(v) for v in obj]
+        return obj
+
+    def __str__(self):
+        return str(self._redact(self.obj))
@@ -0,0 +1,337 @@
+# Copyright (c) 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import bisect
+import contextlib
+import functools
+import logging
+import os
+import re
+import threading
+import time
+
+import six
+
+from heat_infoblox import config
+
+"""In-process WAPI call metrics.
+
+Every HTTP call made by connector.Infoblox is recorded in REGISTRY, broken
+down by WAPI object type and HTTP method. The registry can be rendered in
+the Prometheus text exposition format and written to a file, and calls can
+also be forwarded to statsd as they happen. Where the metrics are exported
+is set for the whole process by the [infoblox] options of the engine. Resource
+actions decorated with track_action log a summary of the calls they made.
+"""
+
+LOG = logging.getLogger(__name__)
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+                   30.0)
+
+# Minimum number of seconds between two writes of the metrics file
+TEXT_FILE_INTERVAL = 5.0
+
+# Resource actions lasting longer than this number of seconds have their
+# summary logged at INFO level, the others at DEBUG level
+SLOW_ACTION = 1.0
+
+
+def is_error(status):
+    return status is None or status >= 400
+
+
+class Histogram(object):
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        # the last bucket is +Inf
+        self.counts = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class CallStats(object):
+    __slots__ = ('calls', 'errors', 'bytes_sent', 'bytes_received',
+                 'latency')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.latency = Histogram()
+
+
+class Registry(object):
+    """WAPI call statistics keyed by (objtype, method)."""
+
+    def __init__(self):
+        self._stats = {}
+        self._lock = threading.Lock()
+
+    def record(self, objtype, method, status, latency, sent, received):
+        key = (objtype, method)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = CallStats()
+            stats.calls += 1
+            if is_error(status):
+                stats.errors += 1
+            stats.bytes_sent += sent
+            stats.bytes_received += received
+            stats.latency.observe(latency)
+
+    def get(self, objtype, method):
+        with self._lock:
+            return self._stats.get((objtype, method))
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+
+    def render_text(self):
+        """Render the registry in the Prometheus text exposition format."""
+        counters = (
+            ('calls', 'WAPI calls.'),
+            ('errors', 'WAPI calls which failed or returned an error.'),
+            ('bytes_sent', 'Bytes of WAPI request bodies.'),
+            ('bytes_received', 'Bytes of WAPI response bodies.'),
+        )
+        with self._lock:
+            items = sorted(self._stats.items())
+            lines = []
+            for name, doc in counters:
+                metric = 'heat_infoblox_wapi_%s_total' % name
+                lines.append('# HELP %s %s' % (metric, doc))
+                lines.append('# TYPE %s counter' % metric)
+                for (objtype, method), stats in items:
+                    lines.append('%s{%s} %d' % (metric,
+                                                _labels(objtype, method),
+                                                getattr(stats, name)))
+
+            metric = 'heat_infoblox_wapi_latency_seconds'
+            lines.append('# HELP %s WAPI call latency.' % metric)
+            lines.append('# TYPE %s histogram' % metric)
+            for (objtype, method), stats in items:
+                labels = _labels(objtype, method)
+                cumulative = 0
+                bounds = [repr(b) for b in LATENCY_BUCKETS] + ['+Inf']
+                for bound, count in zip(bounds, stats.latency.counts):
+                    cumulative += count
+                    lines.append('%s_bucket{%s,le="%s"} %d' %
+                                 (metric, labels, bound, cumulative))
+                lines.append('%s_sum{%s} %f' % (metric, labels,
+                                                stats.latency.sum))
+                lines.append('%s_count{%s} %d' % (metric, labels,
+                                                  stats.latency.count))
+        return '\n'.join(lines) + '\n'
+
+    def write_text_file(self, path):
+        # write and rename, so a collector never reads a partial file
+        tmp_path = '%s.%d.tmp' % (path, os.getpid())
+        with open(tmp_path, 'w') as f:
+            f.write(self.render_text())
+        os.rename(tmp_path, path)
+
+
+def _labels(objtype, method):
+    return 'objtype="%s",method="%s"' % (objtype.replace('"', '\\"'), method)
+
+
+class StatsdExporter(object):
+    """Sends every call to statsd over UDP."""
+
+    _unsafe = re.compile(r'[^A-Za-z0-9_.-]')
+
+    def __init__(self, address, prefix='heat_infoblox.wapi'):
+        # imported here so that loading the plugins does not import socket
+        import socket
+
+        host, port = address.rsplit(':', 1)
+        self.address = (host, int(port))
+        self.prefix = prefix
+        self._socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+
+    def send(self, objtype, method, status, latency, sent, received):
+        name = '%s.%s.%s' % (self.prefix, self._unsafe.sub('_', objtype),
+                             method)
+        lines = ['%s.calls:1|c' % name,
+                 '%s.latency:%d|ms' % (name, latency * 1000),
+                 '%s.bytes_received:%d|c' % (name, received)]
+        if is_error(status):
+            lines.append('%s.errors:1|c' % name)
+        try:
+            self._socket.sendto(six.b('\n'.join(lines)), self.address)
+        except (IOError, OSError) as e:
+            LOG.debug("Cannot send metrics to statsd: %s", e)
+
+
+REGISTRY = Registry()
+
+# Empty until configured, from the engine configuration on first use
+_exporters = {}
+_exporters_lock = threading.Lock()
+_text_file_written = [0]
+_text_file_lock = threading.Lock()
+_local = threading.local()
+
+
+def configure(statsd_address=None, text_file=None):
+    """Set where metrics are exported, in addition to REGISTRY.
+
+    The Heat engine does not call this: the exporters are set from its
+    metrics_statsd_address and metrics_file options on first use.
+    """
+    with _exporters_lock:
+        _configure(statsd_address, text_file)
+
+
+def _configure(statsd_address, text_file):
+    statsd = _exporters.get('statsd')
+    if statsd_address and (statsd is None or
+                           statsd_address != '%s:%d' % statsd.address):
+        _exporters['statsd'] = StatsdExporter(statsd_address)
+    elif not statsd_address:
+        _exporters['statsd'] = None
+    _exporters['text_file'] = text_file
+
+
+def _get_exporters():
+    if not _exporters:
+        with _exporters_lock:
+            if not _exporters:
+                conf = config.CONF.infoblox
+                _configure(conf.metrics_statsd_address, conf.metrics_file)
+    return _exporters
+
+
+def record_call(objtype, method, status, latency, sent, received):
+    REGISTRY.record(objtype, method, status, latency, sent, received)
+    statsd = _get_exporters()['statsd']
+    if statsd is not None:
+        statsd.send(objtype, method, status, latency, sent, received)
+    for scope in getattr(_local, 'scopes', ()):
+        scope.record(objtype, method, status)
+
+
+def write_text_file(force=False):
+    path = _get_exporters()['text_file']
+    if not path:
+        return
+    # the lock also keeps two threads from writing the same temporary file
+    with _text_file_lock:
+        now = time.time()
+        if not force and now - _text_file_written[0] < TEXT_FILE_INTERVAL:
+            return
+        _text_file_written[0] = now
+        try:
+            REGISTRY.write_text_file(path)
+        except (IOError, OSError) as e:
+            LOG.warning("Cannot write metrics to %s: %s", path, e)
+
+
+def current_scopes():
+    """The action scopes of the current thread, for the threads it starts."""
+    return list(getattr(_local, 'scopes', ()))
+
+
+@contextlib.contextmanager
+def scopes_entered(scopes):
+    """Count the calls of the current thread in 'scopes' as well.
+
+    Used by worker threads, e.g. of object_manipulator.parallel_map, with
+    the current_scopes() of the thread which started them.
+    """
+    if not hasattr(_local, 'scopes'):
+        _local.scopes = []
+    added = [scope for scope in scopes if scope not in _local.scopes]
+    _local.scopes.extend(added)
+    try:
+        yield
+    finally:
+        for scope in added:
+            _local.scopes.remove(scope)
+
+
+class ActionScope(object):
+    """Counts the calls made by the current thread while it is active.
+
+    Threads started meanwhile count theirs too if they enter the scope with
+    scopes_entered().
+    """
+
+    def __init__(self):
+        self.calls = {}
+        self.errors = 0
+        self.started = None
+        self.elapsed = None
+        self._lock = threading.Lock()
+
+    def record(self, objtype, method, status):
+        key = (method, objtype)
+        with self._lock:
+            self.calls[key] = self.calls.get(key, 0) + 1
+            if is_error(status):
+                self.errors += 1
+
+    @property
+    def total(self):
+        return sum(self.calls.values())
+
+    def __enter__(self):
+        if not hasattr(_local, 'scopes'):
+            _local.scopes = []
+        _local.scopes.append(self)
+        self.started = time.time()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.elapsed = time.time() - self.started
+        _local.scopes.remove(self)
+
+    def summary(self):
+        calls = ', '.join('%s %s x%d' % (method, objtype, count)
+                          for (method, objtype), count
+                          in sorted(self.calls.items()))
+        return '%d WAPI calls (%d errors) in %.3fs: %s' % (
+            self.total, self.errors, self.elapsed, calls or 'none')
+
+
+def track_action(fn):
+    """Log the WAPI calls made by a resource action."""
+    @functools.wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        scope = ActionScope()
+        try:
+            with scope:
+                return fn(self, *args, **kwargs)
+        finally:
+            # e.g. attribute resolutions and completion checks are frequent
+            level = logging.DEBUG
+            if scope.elapsed > SLOW_ACTION:
+                level = logging.INFO
+            if LOG.isEnabledFor(level):
+                LOG.log(level, "%s '%s' %s: %s", type(self).__name__,
+                        self.name, fn.__name__, scope.summary())
+            write_text_file()
+    return wrapper
@@ -14,23 +14,182 @@
 #    under the License.
 
 
+import csv
 import gettext
 import logging
+import threading
+import time
 
+import six
+from six.moves import queue
+
+from heat_infoblox import constants
 from heat_infoblox import ibexceptions as exc
+from heat_infoblox import logutils
+from heat_infoblox import metrics
+from heat_infoblox import refcache
+from heat_infoblox import singleflight
+from heat_infoblox import snapshot
+from heat_infoblox import tracing
 
 _ = gettext.gettext
 
 LOG = logging.getLogger(__name__)
 
-
+# Number of zones looked up or created per multi-request
+ZONE_BATCH_SIZE = 100
+
+# Number of DNS record changes made per multi-request
+RECORD_BATCH_SIZE = 100
+
+# Number of addresses released per multi-request
+RELEASE_BATCH_SIZE = 1000
+
+# Number of TSIG key changes made per multi-request
+TSIG_BATCH_SIZE = 100
+
+# Columns of the CSV import of members, named after the WAPI fields
+MEMBER_CSV_COLUMNS = (
+    'header-member', 'host_name*', 'platform', 'vip_setting.address',
+    'vip_setting.subnet_mask', 'vip_setting.gateway',
+    'pre_provisioning.hardware_info.hwmodel',
+    'pre_provisioning.hardware_info.hwtype', 'pre_provisioning.licenses',
+)
+
+# Status of a CSV import task which is over
+CSV_IMPORT_DONE = frozenset(['COMPLETED', 'FAILED', 'STOPPED'])
+
+# MAC address of the fixed addresses which only reserve an IP address
+RESERVED_MAC = '00:00:00:00:00:00'
+
+# Number of seconds the views of the tenants are used for, after which they
+# are looked up again in case views were deleted by other clients
+TENANT_VIEWS_TTL = 300.0
+
+# Service restarts asked for by any manipulator within the debounce delay
+# of the connector are made once per grid
+_restarts = singleflight.Debouncer()
+
+
+def parallel_map(fn, items, workers):
+    """Call fn on each of items, with up to 'workers' calls at once.
+
+    The calls are made by threads, which are green threads in the Heat
+    engine as eventlet monkey patches it, and count in the metrics of the
+    calling resource action. Returns the results in the order of items; the
+    exception raised by a call takes the place of its result so that one
+    failure does not abort the others.
+    """
+    items = list(items)
+    results = [None] * len(items)
+    pending = queue.Queue()
+    for i in range(len(items)):
+        pending.put(i)
+    scopes = metrics.current_scopes()
+
+    def work():
+        with metrics.scopes_entered(scopes):
+            while True:
+                try:
+                    i = pending.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    results[i] = fn(items[i])
+                except Exception as e:
+                    LOG.warning(_("Call for %(item)s failed: %(error)s"),
+                                {'item': items[i], 'error': e})
+                    results[i] = e
+
+    threads = [threading.Thread(target=work)
+               for i in range(min(max(workers, 1), len(items)))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+class TenantViews(object):
+    """The network and DNS views of the tenants of a grid.
+
+    The views of all the tenants are loaded at once on first use, then
+    kept up to date with the views created through add(), and loaded again
+    once they are older than 'ttl' seconds.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._views = None
+        self._loaded = 0
+        self._lock = threading.Lock()
+
+    def get(self, tenant, load):
+        """Return (network view, DNS view) of tenant, loading them if needed.
+
+        'load' returns the views of all the tenants as {tenant: (network
+        view, DNS view)}; it is called by one caller while the others wait.
+        Either view is None if it does not exist.
+        """
+        with self._lock:
+            now = time.time()
+            if self._views is None or now - self._loaded > self.ttl:
+                self._views = load()
+                self._loaded = now
+            return self._views.get(tenant, (None, None))
+
+    def add(self, tenant, net_view, dns_view):
+        with self._lock:
+            if self._views is not None:
+                self._views[tenant] = (net_view, dns_view)
+
+    def clear(self):
+        with self._lock:
+            self._views = None
+
+
+_tenant_views = {}
+_tenant_views_lock = threading.Lock()
+
+
+def get_tenant_views(url):
+    """Return the tenant views shared by all manipulators of a grid."""
+    with _tenant_views_lock:
+        views = _tenant_views.get(url)
+        if views is None:
+            views = _tenant_views[url] = TenantViews(TENANT_VIEWS_TTL)
+        return views
+
+
+@tracing.trace_cls('infoblox-manipulator')
 class InfobloxObjectManipulator(object):
     FIELDS = ['ttl', 'use_ttl']
 
     def __init__(self, connector):
         self.connector = connector
+        # Lookups of members, name server groups and DNS views are answered
+        # from a snapshot of the grid if the connector enables it
+        self.snapshot = None
+        ttl = getattr(connector, 'snapshot_ttl', 0)
+        if ttl:
+            self.snapshot = snapshot.get_snapshot(connector.url, ttl)
+
+    def _load_snapshot(self, objtype, fields):
+        return self.connector.get_all_objects(objtype, return_fields=fields)
+
+    def _from_snapshot(self, objtype, name=None, return_fields=None,
+                       extattrs=None, for_update=False):
+        # Objects about to be written back are read from the grid master
+        if self.snapshot is None or extattrs or for_update:
+            return None
+        return self.snapshot.lookup(objtype, self._load_snapshot, name,
+                                    return_fields)
 
     def get_member(self, member_name, return_fields=None, extattrs=None):
+        members = self._from_snapshot('member', member_name, return_fields,
+                                      extattrs)
+        if members is not None:
+            return members
         obj = {'host_name': member_name}
         return self.connector.get_object(
             'member', obj, return_fields, extattrs
@@ -77,6 +236,95 @@ class InfobloxObjectManipulator(object):
         self._update_infoblox_object('member', {'host_name': member_name},
                                      extra_data)
 
+    def import_members(self, members, poll_interval=5, timeout=3600):
+        """Create and pre-provision many members with one CSV import.
+
+        This replaces a create_member and a pre_provision_member call per
+        member by a single upload of a CSV file, imported by the grid in
+        the background, and a few polls of the import task.
+
+        Args:
+            members (list): Members as dicts with the 'name', 'platform'
+                            and 'lan1' arguments of create_member and the
+                            'hwmodel', 'hwtype' and 'licenses' arguments of
+                            pre_provision_member
+        Returns:
+            The errors of the members which could not be imported, as
+            {member name: error message}
+        Raises:
+            InfobloxCsvImportFailed if the import failed as a whole or did
+            not complete within timeout seconds
+        """
+        token = self.connector.upload_file(self._members_csv(members),
+                                           'members.csv')
+        task = self.connector.call_func(
+            'csv_import', 'fileop',
+            {'token': token, 'operation': 'INSERT',
+             'on_error': 'CONTINUE'})['csv_import_task']
+        task = self._wait_for_import(task, poll_interval, timeout)
+        if self.snapshot is not None:
+            for member in members:
+                self.snapshot.created('member', member['name'])
+        LOG.info(_("CSV import %(import_id)s of %(count)d members: "
+                   "%(status)s, %(failed)s failed"),
+                 {'import_id': task['import_id'], 'count': len(members),
+                  'status': task['status'],
+                  'failed': task.get('lines_failed')})
+        if task['status'] != 'COMPLETED':
+            raise exc.InfobloxCsvImportFailed(import_id=task['import_id'],
+                                              status=task['status'])
+        if not task.get('lines_failed'):
+            return {}
+        return self._csv_import_errors(task['import_id'])
+
+    @staticmethod
+    def _members_csv(members):
+        out = six.StringIO()
+        writer = csv.writer(out, lineterminator='\n')
+        writer.writerow(MEMBER_CSV_COLUMNS)
+        for member in members:
+            ipv4 = (member.get('lan1') or {}).get('ipv4') or {}
+            writer.writerow([
+                'member', member['name'], member.get('platform', 'VNIOS'),
+                ipv4.get('address', ''), ipv4.get('subnet_mask', ''),
+                ipv4.get('gateway', ''), member.get('hwmodel') or '',
+                member.get('hwtype', 'IB-VNIOS'),
+                ','.join(member.get('licenses') or [])])
+        return out.getvalue().encode('utf-8')
+
+    def _wait_for_import(self, task, poll_interval, timeout):
+        deadline = time.time() + timeout
+        while task['status'] not in CSV_IMPORT_DONE:
+            if time.time() >= deadline:
+                raise exc.InfobloxCsvImportFailed(
+                    import_id=task['import_id'], status='TIMEOUT')
+            time.sleep(poll_interval)
+            task = self.connector.get_object(
+                'csvimporttask', {'import_id': task['import_id']},
+                return_fields=['import_id', 'status', 'lines_processed',
+                               'lines_failed'],
+                from_master=True)[0]
+        return task
+
+    def _csv_import_errors(self, import_id):
+        log = self.connector.call_func('csv_error_log', 'fileop',
+                                       {'import_id': import_id})
+        try:
+            content = self.connector.download_file(log['url'])
+        finally:
+            self.connector.call_func('downloadcomplete', 'fileop',
+                                     {'token': log['token']})
+        # The error log holds the failed rows, each followed by its error
+        rows = list(csv.reader(six.StringIO(content.decode('utf-8'))))
+        errors = {}
+        name_column = None
+        for row in rows:
+            if 'host_name*' in row:
+                name_column = row.index('host_name*')
+            elif name_column is not None and len(row) > name_column:
+                errors[row[name_column]] = row[-1]
+        return errors
+
     def configure_member_dns(self, member_name,
                              enable_dns=False):
         extra_data = {'enable_dns': enable_dns}
@@ -87,18 +335,46 @@ class InfobloxObjectManipulator(object):
         member_data = {'host_name': member_name}
         self._delete_infoblox_object('member', member_data)
 
-    def get_all_ns_groups(self, return_fields=None, extattrs=None):
+    def get_all_ns_groups(self, return_fields=None, extattrs=None,
+                          for_update=False):
+        groups = self._from_snapshot('nsgroup', None, return_fields,
+                                     extattrs, for_update)
+        if groups is not None:
+            return groups
         obj = {}
         return self.connector.get_object(
-            'nsgroup', obj, return_fields, extattrs
+            'nsgroup', obj, return_fields, extattrs, from_master=for_update
         )
 
-    def get_ns_group(self, group_name, return_fields=None, extattrs=None):
+    def get_ns_group(self, group_name, return_fields=None, extattrs=None,
+                     for_update=False):
+        groups = self._from_snapshot('nsgroup', group_name, return_fields,
+                                     extattrs, for_update)
+        if groups is not None:
+            return groups
         obj = {'name': group_name}
         return self.connector.get_object(
-            'nsgroup', obj, return_fields, extattrs
+            'nsgroup', obj, return_fields, extattrs, from_master=for_update
         )
 
+    def get_ns_groups_of_member(self, member_name):
+        """Return the names of the name server groups of a member."""
+        if self.snapshot is not None:
+            return self.snapshot.groups_of(member_name, self._load_snapshot)
+        fields = snapshot.NSGROUP_MEMBER_FIELDS
+        return sorted(
+            group['name'] for group in self.connector.get_all_objects(
+                'nsgroup', return_fields=('name',) + fields)
+            if any(m['name'] == member_name
+                   for field in fields for m in group.get(field) or []))
+
+    def get_view(self, view_name, return_fields=None):
+        views = self._from_snapshot('view', view_name, return_fields)
+        if views is not None:
+            return views
+        return self.connector.get_object('view', {'name': view_name},
+                                         return_fields)
+
     def update_ns_group(self, group_name, group):
         self._update_infoblox_object('nsgroup', {'name': group_name},
                                      group)
@@ -111,6 +387,7 @@ class InfobloxObjectManipulator(object):
     def delete_dns_view(self, net_view_name):
         net_view_data = {'name': net_view_name}
         self._delete_infoblox_object('view', net_view_data)
+        get_tenant_views(self.connector.url).clear()
 
     def create_network_view(self, net_view_name, tenant_id):
         net_view_data = {'name': net_view_name}
@@ -125,57 +402,140 @@ class InfobloxObjectManipulator(object):
 
         net_view_data = {'name': net_view_name}
         self._delete_infoblox_object('networkview', net_view_data)
+        get_tenant_views(self.connector.url).clear()
 
     def create_tsig(self, name, algorithm, secret):
-        tsig = {
-            'name': name,
-            'key': secret
-        }
-        self._create_infoblox_object(
-            'tsig', tsig,
-            check_if_exists=True)
+        # keys are looked up by name, so that the secret is not sent in
+        # the query string of the search; an existing key is rotated if its
+        # secret differs, as by create_tsigs
+        tsig = self._get_infoblox_object_or_none(
+            'tsig', {'name': name}, return_fields=['key'], from_master=True)
+        if tsig is None:
+            self._create_infoblox_object(
+                'tsig', {'name': name}, {'key': secret},
+                check_if_exists=False)
+            return
+        if tsig.get('key') != secret:
+            self._update_infoblox_object_by_ref(tsig['_ref'], {'key': secret})
+        self._remember_ref('tsig', refcache.natural_key({'name': name}), tsig)
 
     def delete_tsig(self, name, algorithm, secret):
-        tsig = {
-            'name': name,
-            'key': secret
-        }
-        self._delete_infoblox_object(
-            'tsig', tsig,
-            check_if_exists=True)
+        self._delete_infoblox_object('tsig', {'name': name})
+
+    def get_tsigs(self):
+        """Return {name: {'_ref', 'name', 'key'}} of all the TSIG keys."""
+        return dict((tsig['name'], tsig) for tsig in
+                    self.connector.get_all_objects(
+                        'tsig', return_fields=['name', 'key']))
+
+    def create_tsigs(self, keys, batch_size=TSIG_BATCH_SIZE):
+        """Create or rotate many TSIG keys.
+
+        The existing keys are fetched with one paged search, then the
+        missing keys are created and the keys whose secret differs are
+        updated, batch_size at a time with one multi-request each. Keys
+        which are up to date are left alone.
+
+        Args:
+            keys: {name: secret} of the keys
+        Returns:
+            (number of keys created, number of keys rotated)
+        """
+        existing = self.get_tsigs()
+        creates = []
+        updates = []
+        for name in sorted(keys):
+            tsig = existing.get(name)
+            if tsig is None:
+                creates.append({'method': 'POST', 'object': 'tsig',
+                                'data': {'name': name, 'key': keys[name]}})
+            elif tsig.get('key') != keys[name]:
+                updates.append({'method': 'PUT', 'object': tsig['_ref'],
+                                'data': {'key': keys[name]}})
+        self._change_tsigs(creates + updates, batch_size)
+        LOG.info(_("Created %(created)d and rotated %(rotated)d TSIG keys "
+                   "of %(count)d"), {'created': len(creates),
+                                     'rotated': len(updates),
+                                     'count': len(keys)})
+        return len(creates), len(updates)
+
+    def delete_tsigs(self, names, batch_size=TSIG_BATCH_SIZE):
+        """Delete many TSIG keys; keys which do not exist are skipped.
+
+        Returns the number of keys deleted.
+        """
+        existing = self.get_tsigs()
+        deletes = [{'method': 'DELETE', 'object': existing[name]['_ref']}
+                   for name in sorted(set(names)) if name in existing]
+        self._change_tsigs(deletes, batch_size)
+        LOG.info(_("Deleted %d TSIG keys"), len(deletes))
+        return len(deletes)
+
+    def _change_tsigs(self, calls, batch_size):
+        for i in range(0, len(calls), batch_size):
+            self.connector.multi_request(calls[i:i + batch_size])
 
     def create_multi_tenant_dns_view(self, net_view, tenant):
-        if not net_view:
-            net_view = "%s.%s" % (self.connector.network_view, tenant)
-        dns_view = "%s.%s" % (self.connector.dns_view, net_view)
-
         try:
-            self.create_network_view(
-                net_view_name=net_view,
-                tenant_id=tenant)
-
-            self.create_dns_view(
-                net_view_name=net_view,
-                dns_view_name=dns_view)
+            dns_view = self._create_tenant_views(net_view, tenant)
         except exc.InfobloxException as e:
             LOG.warning(_("Issue happens during views creating: %s"), e)
+            dns_view = self._tenant_dns_view(net_view, tenant)
+
+        return dns_view
+
+    def _tenant_net_view(self, net_view, tenant):
+        return net_view or "%s.%s" % (self.connector.network_view, tenant)
+
+    def _tenant_dns_view(self, net_view, tenant):
+        return "%s.%s" % (self.connector.dns_view,
+                          self._tenant_net_view(net_view, tenant))
+
+    def _create_tenant_views(self, net_view, tenant):
+        net_view = self._tenant_net_view(net_view, tenant)
+        dns_view = self._tenant_dns_view(net_view, tenant)
+
+        self.create_network_view(
+            net_view_name=net_view,
+            tenant_id=tenant)
+
+        self.create_dns_view(
+            net_view_name=net_view,
+            dns_view_name=dns_view)
 
-        LOG.debug("net_view: %s, dns_view: %s" % (net_view, dns_view))
+        LOG.debug("net_view: %s, dns_view: %s", net_view, dns_view)
         return dns_view
 
     def get_dns_view(self, tenant):
         if not self.connector.multi_tenant:
             return self.connector.dns_view
-        else:
-            # Look for the network view with the specified TenantID EA
-            net_view = self._get_infoblox_object_or_none(
-                'networkview',
-                return_fields=['name'],
-                extattrs={'TenantID': {'value': tenant}})
-            if net_view:
-                net_view = net_view['name']
 
-            return self.create_multi_tenant_dns_view(net_view, tenant)
+        # The views of a known tenant are looked up once for all of them,
+        # and only created for new tenants. A failed creation raises and is
+        # not cached, so that the next call tries again.
+        views = get_tenant_views(self.connector.url)
+        net_view, dns_view = views.get(tenant, self._find_tenant_views)
+        if dns_view is None:
+            dns_view = self._create_tenant_views(net_view, tenant)
+            views.add(tenant, self._tenant_net_view(net_view, tenant),
+                      dns_view)
+        return dns_view
+
+    def _find_tenant_views(self):
+        net_views = self.connector.get_all_objects(
+            'networkview', return_fields=['name', 'extattrs'],
+            query_params={'*TenantID~': '.*'})
+        dns_views = set(view['name'] for view in
+                        self.connector.get_all_objects(
+                            'view', return_fields=['name']))
+        views = {}
+        for net_view in net_views:
+            tenant = net_view['extattrs']['TenantID']['value']
+            dns_view = '%s.%s' % (self.connector.dns_view, net_view['name'])
+            views[tenant] = (net_view['name'],
+                             dns_view if dns_view in dns_views else None)
+        LOG.debug("Found the views of %d tenants", len(views))
+        return views
 
     def create_zone_auth(self, fqdn, dns_view):
         try:
@@ -188,20 +548,200 @@ class InfobloxObjectManipulator(object):
         except exc.InfobloxCannotCreateObject as e:
             LOG.warning(e)
 
+    def create_zones_auth(self, fqdns, dns_view, ns_group=None,
+                          batch_size=ZONE_BATCH_SIZE):
+        """Create many zones, then restart the DNS service once.
+
+        Zones are looked up, then created, batch_size at a time with one
+        multi-request each, and without restart_if_needed. Zones which
+        already exist are left alone. If the creation of a batch fails, its
+        zones are created one by one. Returns the refs of the created zones.
+        """
+        fqdns = list(fqdns)
+        created = []
+        for i in range(0, len(fqdns), batch_size):
+            batch = fqdns[i:i + batch_size]
+            found = self.connector.multi_request(
+                [{'method': 'GET', 'object': 'zone_auth',
+                  'data': {'fqdn': fqdn, 'view': dns_view},
+                  'args': {'_return_fields': 'fqdn'}} for fqdn in batch])
+            missing = [fqdn for fqdn, zones in zip(batch, found) if not zones]
+            if not missing:
+                continue
+            zones = [{'fqdn': fqdn, 'view': dns_view} for fqdn in missing]
+            if ns_group:
+                for zone in zones:
+                    zone['ns_group'] = ns_group
+            try:
+                created.extend(self.connector.multi_request(
+                    [{'method': 'POST', 'object': 'zone_auth', 'data': zone}
+                     for zone in zones]))
+            except exc.InfobloxMultiRequestError as e:
+                LOG.warning(_("Cannot create %(count)d zones at once, "
+                              "creating them one by one: %(error)s"),
+                            {'count': len(zones), 'error': e})
+                for zone in zones:
+                    try:
+                        created.append(self._create_infoblox_object(
+                            'zone_auth', zone, check_if_exists=True))
+                    except exc.InfobloxCannotCreateObject as e:
+                        LOG.warning(e)
+        LOG.info(_("Created %(created)d zones of %(count)d in view "
+                   "%(view)s"), {'created': len(created),
+                                 'count': len(fqdns), 'view': dns_view})
+        if created:
+            self.restart_grid_services('DNS')
+        return created
+
+    def restart_grid_services(self, service_option='ALL'):
+        """Restart the grid services which need it.
+
+        Calls made for the same grid and services within the restart
+        debounce delay of the connector result in a single restart.
+        """
+        _restarts.do((self.connector.url, service_option),
+                     lambda: self._restart_grid_services(service_option),
+                     self.connector.restart_debounce_delay)
+
+    def _restart_grid_services(self, service_option):
+        grid = self._get_infoblox_object_or_none('grid', from_master=True)
+        if not grid:
+            LOG.warning(_("Restart of %(services)s services skipped: no grid "
+                          "found on %(url)s"),
+                        {'services': service_option,
+                         'url': logutils.redact_url(self.connector.url)})
+            return
+        self.connector.call_func('restartservices', grid,
+                                 {'member_order': 'SIMULTANEOUSLY',
+                                  'restart_option': 'RESTART_IF_NEEDED',
+                                  'service_option': service_option})
+        LOG.info(_("Restart of %(services)s services requested on %(grid)s"),
+                 {'services': service_option, 'grid': grid})
+
+    def get_records(self, record_type, zone, dns_view):
+        """Return all the records of a type (e.g. 'record:a') of a zone."""
+        value_field = constants.RECORD_VALUE_FIELDS[record_type]
+        return self.connector.get_all_objects(
+            record_type, {'zone': zone, 'view': dns_view},
+            return_fields=['name', value_field, 'ttl', 'use_ttl'])
+
+    def change_records(self, deletes=(), creates=(), updates=(),
+                       batch_size=RECORD_BATCH_SIZE):
+        """Delete, create and update DNS records, in this order.
+
+        The changes are made batch_size at a time with one multi-request
+        each, which the grid rolls back if one of its changes fails.
+
+        Args:
+            deletes: refs of the records to delete
+            creates: (record type, fields) of the records to create
+            updates: (ref, fields) of the records to update
+        """
+        calls = ([{'method': 'DELETE', 'object': ref} for ref in deletes] +
+                 [{'method': 'POST', 'object': record_type, 'data': data}
+                  for record_type, data in creates] +
+                 [{'method': 'PUT', 'object': ref, 'data': data}
+                  for ref, data in updates])
+        for i in range(0, len(calls), batch_size):
+            self.connector.multi_request(calls[i:i + batch_size])
+        LOG.info(_("Deleted %(deleted)d, created %(created)d and updated "
+                   "%(updated)d DNS records"),
+                 {'deleted': len(deletes), 'created': len(creates),
+                  'updated': len(updates)})
+
+    def get_network(self, cidr, net_view_name, for_update=False):
+        return self._get_infoblox_object_or_none(
+            'network', {'network': cidr, 'network_view': net_view_name},
+            from_master=for_update)
+
+    def next_available_ips(self, network_ref, num, exclude=None):
+        """Return the next num free addresses of a network, in one call."""
+        payload = {'num': num}
+        if exclude:
+            payload['exclude'] = list(exclude)
+        return self.connector.call_func('next_available_ip', network_ref,
+                                        payload)['ips']
+
+    def reserve_ips(self, ips, net_view_name, comment):
+        """Reserve addresses with one multi-request, all or none of them.
+
+        Returns the refs of the fixed addresses reserving them.
+        """
+        return self.connector.multi_request(
+            [{'method': 'POST', 'object': 'fixedaddress',
+              'data': {'ipv4addr': ip, 'mac': RESERVED_MAC,
+                       'network_view': net_view_name, 'comment': comment}}
+             for ip in ips])
+
+    def get_reserved_ips(self, cidr, net_view_name, comment):
+        return self.connector.get_all_objects(
+            'fixedaddress', {'network': cidr, 'network_view': net_view_name,
+                             'comment': comment},
+            return_fields=['ipv4addr'])
+
+    def release_ips(self, refs, batch_size=RELEASE_BATCH_SIZE):
+        """Delete fixed addresses, batch_size at a time."""
+        refs = list(refs)
+        for i in range(0, len(refs), batch_size):
+            self.connector.multi_request(
+                [{'method': 'DELETE', 'object': ref}
+                 for ref in refs[i:i + batch_size]])
+        LOG.info(_("Released %d addresses"), len(refs))
+
     def delete_zone_auth(self, fqdn):
         self._delete_infoblox_object(
             'zone_auth', {'fqdn': fqdn})
 
+    def map_calls(self, fn, items):
+        """Call fn on each of items concurrently, see parallel_map.
+
+        As many calls are made at once as the connector pools connections
+        to the grid.
+        """
+        return parallel_map(fn, items, self.connector.http_pool_maxsize)
+
+    def map_get_members(self, member_names, return_fields=None):
+        """Return the result of get_member for each of member_names."""
+        return self.map_calls(
+            lambda name: self.get_member(name, return_fields), member_names)
+
+    def map_update_ns_groups(self, groups):
+        """Update name server groups, given as (name, fields) pairs."""
+        return self.map_calls(lambda group: self.update_ns_group(*group),
+                              groups)
+
+    def map_delete_objects(self, refs):
+        """Delete objects by ref; returns the ref of each deleted object."""
+        return self.map_calls(self._delete_infoblox_object_by_ref, refs)
+
+    def _cached_ref(self, obj_type, payload):
+        cache = getattr(self.connector, 'ref_cache', None)
+        if cache is None:
+            return None
+        return cache.get_ref(self.connector.url, obj_type,
+                             refcache.natural_key(payload))
+
+    def _remember_ref(self, obj_type, key, ib_object):
+        cache = getattr(self.connector, 'ref_cache', None)
+        if cache is None or not ib_object:
+            return
+        ref = ib_object
+        if not isinstance(ib_object, six.string_types):
+            ref = ib_object['_ref']
+        cache.put_ref(self.connector.url, obj_type, key, ref)
+
     def _create_infoblox_object(self, obj_type, payload,
                                 additional_create_kwargs=None,
                                 check_if_exists=True,
                                 return_fields=None):
         if additional_create_kwargs is None:
             additional_create_kwargs = {}
+        key = refcache.natural_key(payload)
 
         ib_object = None
         if check_if_exists:
-            ib_object = self._get_infoblox_object_or_none(obj_type, payload)
+            ib_object = self._get_infoblox_object_or_none(obj_type, payload,
+                                                          from_master=True)
             if ib_object:
                 LOG.info(_(
                     "Infoblox %(obj_type)s already exists: %(ib_object)s"),
@@ -211,15 +751,21 @@ class InfobloxObjectManipulator(object):
             payload.update(additional_create_kwargs)
             ib_object = self.connector.create_object(obj_type, payload,
                                                      return_fields)
+            if self.snapshot is not None:
+                self.snapshot.created(
+                    obj_type, payload.get(snapshot.NAME_FIELDS.get(obj_type)))
             LOG.info(_("Infoblox %(obj_type)s was created: %(ib_object)s"),
                      {'obj_type': obj_type, 'ib_object': ib_object})
 
+        self._remember_ref(obj_type, key, ib_object)
         return ib_object
 
     def _get_infoblox_object_or_none(self, obj_type, payload=None,
-                                     return_fields=None, extattrs=None):
+                                     return_fields=None, extattrs=None,
+                                     from_master=False):
         ib_object = self.connector.get_object(obj_type, payload, return_fields,
-                                              extattrs=extattrs)
+                                              extattrs=extattrs,
+                                              from_master=from_master)
         if ib_object:
             if return_fields:
                 return ib_object[0]
@@ -228,40 +774,67 @@ class InfobloxObjectManipulator(object):
 
         return None
 
-    def _update_infoblox_object(self, obj_type, payload, update_kwargs):
-        ib_object_ref = None
-        warn_msg = _('Infoblox %(obj_type)s will not be updated because'
-                     ' it cannot be found: %(payload)s')
+    def _write_by_key(self, obj_type, payload, write, warn_msg):
+        """Find the ref of an object and call write(ref).
+
+        The ref is taken from the ref cache of the connector if it has
+        one; if the cached ref is not found any more, e.g. as the object was
+        renamed, it is forgotten and the object is looked up on the grid.
+        """
+        ref = self._cached_ref(obj_type, payload)
+        if ref is not None:
+            try:
+                return write(ref)
+            except (exc.InfobloxCannotUpdateObject,
+                    exc.InfobloxCannotDeleteObject) as e:
+                if e.code != 404:
+                    raise
+                LOG.info(_('Cached ref %s was not found'), ref)
+                self.connector.ref_cache.forget_ref(self.connector.url, ref)
+
         try:
-            ib_object_ref = self._get_infoblox_object_or_none(obj_type,
-                                                              payload)
-            if not ib_object_ref:
-                LOG.warning(warn_msg % {'obj_type': obj_type,
-                                        'payload': payload})
+            ref = self._get_infoblox_object_or_none(
+                obj_type, payload, from_master=True)
+            if not ref:
+                LOG.warning(warn_msg, {'obj_type': obj_type,
+                                       'payload': logutils.Redacted(payload)})
         except exc.InfobloxSearchError as e:
-            LOG.warning(warn_msg, {'obj_type': obj_type, 'payload': payload})
+            ref = None
+            LOG.warning(warn_msg, {'obj_type': obj_type,
+                                   'payload': logutils.Redacted(payload)})
             LOG.info(e)
 
-        if ib_object_ref:
-            self._update_infoblox_object_by_ref(ib_object_ref, update_kwargs)
+        if ref:
+            self._remember_ref(obj_type, refcache.natural_key(payload), ref)
+            return write(ref)
+
+    def _update_infoblox_object(self, obj_type, payload, update_kwargs):
+        warn_msg = _('Infoblox %(obj_type)s will not be updated because'
+                     ' it cannot be found: %(payload)s')
+        self._write_by_key(
+            obj_type, payload,
+            lambda ref: self._update_infoblox_object_by_ref(ref,
+                                                            update_kwargs),
+            warn_msg)
 
     def _update_infoblox_object_by_ref(self, ref, update_kwargs):
         self.connector.update_object(ref, update_kwargs)
+        if self.snapshot is not None:
+            self.snapshot.updated(ref, update_kwargs)
         LOG.info(_('Infoblox object was updated: %s'), ref)
 
     def _delete_infoblox_object(self, obj_type, payload):
-        ib_object_ref = None
         warn_msg = _('Infoblox %(obj_type)s will not be deleted because'
                      ' it cannot be found: %(payload)s')
-        try:
-            ib_object_ref = self._get_infoblox_object_or_none(obj_type,
-                                                              payload)
-            if not ib_object_ref:
-                LOG.warning(warn_msg, obj_type, payload)
-        except exc.InfobloxSearchError as e:
-            LOG.warning(warn_msg, {'obj_type': obj_type, 'payload': payload})
-            LOG.info(e)
-
-        if ib_object_ref:
-            self.connector.delete_object(ib_object_ref)
-            LOG.info(_('Infoblox object was deleted: %s'), ib_object_ref)
+        self._write_by_key(obj_type, payload,
+                           self._delete_infoblox_object_by_ref, warn_msg)
+
+    def _delete_infoblox_object_by_ref(self, ref):
+        result = self.connector.delete_object(ref)
+        if self.snapshot is not None:
+            self.snapshot.deleted(ref)
+        cache = getattr(self.connector, 'ref_cache', None)
+        if cache is not None:
+            cache.forget_ref(self.connector.url, ref)
+        LOG.info(_('Infoblox object was deleted: %s'), ref)
+        return result
@@ -0,0 +1,146 @@
+# Copyright (c) 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import functools
+import logging
+import os
+import re
+import threading
+import time
+
+from heat_infoblox import config
+
+"""Opt-in CPU and memory profiles of resource actions.
+
+When the [infoblox] profile_dir option or the HEAT_INFOBLOX_PROFILE_DIR
+environment variable names a directory, every action of the classes
+decorated with profile_cls writes a cProfile dump (.prof, to be read with
+pstats or snakeviz) and, where tracemalloc is available, a snapshot of the
+memory allocated during the action (.tracemalloc). The oldest files are
+removed once the directory holds more than profile_max_bytes.
+
+A profile covers everything run by the thread of the action, including the
+other green threads it yields to, so only one action is profiled at a time
+per process; actions started meanwhile run unprofiled.
+"""
+
+LOG = logging.getLogger(__name__)
+
+ENV_DIR = 'HEAT_INFOBLOX_PROFILE_DIR'
+
+ACTIONS = ('handle_create', 'handle_delete', 'check_create_complete',
+           '_resolve_attribute')
+
+SUFFIXES = ('.prof', '.tracemalloc')
+
+# Number of frames kept for each traced memory allocation
+TRACEMALLOC_FRAMES = 25
+
+_active = threading.Lock()
+_unsafe = re.compile(r'[^A-Za-z0-9_.-]')
+
+
+def profile_dir():
+    return os.environ.get(ENV_DIR) or config.CONF.infoblox.profile_dir
+
+
+def rotate(directory, max_bytes):
+    """Remove the oldest profiles until directory holds max_bytes or less."""
+    files = []
+    for name in os.listdir(directory):
+        if name.endswith(SUFFIXES):
+            path = os.path.join(directory, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            files.append((st.st_mtime, name, st.st_size, path))
+    total = sum(f[2] for f in files)
+    for mtime, name, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+
+
+def _write(directory, prefix, profiler, snapshot):
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    profiler.dump_stats(os.path.join(directory, prefix + '.prof'))
+    if snapshot is not None:
+        snapshot.dump(os.path.join(directory, prefix + '.tracemalloc'))
+    rotate(directory, config.CONF.infoblox.profile_max_bytes)
+
+
+def get_tracemalloc():
+    # not in Python 2.7; imported here, like cProfile, so that loading the
+    # plugins does not import them
+    try:
+        import tracemalloc
+    except ImportError:
+        return None
+    return tracemalloc
+
+
+def profile_action(fn):
+    """Profile a resource action when profiling is enabled."""
+    @functools.wraps(fn)
+    def wrapper(self, *args, **kwargs):
+        directory = profile_dir()
+        if not directory or not _active.acquire(False):
+            return fn(self, *args, **kwargs)
+
+        try:
+            import cProfile
+            tracemalloc = get_tracemalloc()
+            started = tracemalloc is not None and not tracemalloc.is_tracing()
+            if started:
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+            profiler = cProfile.Profile()
+            profiler.enable()
+            try:
+                return fn(self, *args, **kwargs)
+            finally:
+                profiler.disable()
+                snapshot = None
+                if tracemalloc is not None:
+                    snapshot = tracemalloc.take_snapshot()
+                if started:
+                    tracemalloc.stop()
+                now = time.time()
+                prefix = _unsafe.sub('_', '%s.%03d-%d-%s-%s-%s' % (
+                    time.strftime('%Y%m%dT%H%M%S', time.localtime(now)),
+                    now * 1000 % 1000, os.getpid(), type(self).__name__,
+                    self.name, fn.__name__))
+                try:
+                    _write(directory, prefix, profiler, snapshot)
+                except (IOError, OSError) as e:
+                    LOG.warning("Cannot write profile to %s: %s",
+                                directory, e)
+        finally:
+            _active.release()
+    return wrapper
+
+
+def profile_cls(cls):
+    """Profile the actions (see ACTIONS) of the decorated resource class."""
+    for name in ACTIONS:
+        fn = getattr(cls, name, None)
+        if fn is not None:
+            setattr(cls, name, profile_action(fn))
+    return cls
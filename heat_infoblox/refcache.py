@@ -0,0 +1,225 @@
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import json
+import logging
+import sqlite3
+import threading
+import time
+
+"""On-disk cache of object refs and search results, kept across restarts.
+
+The cache is a SQLite database shared by the engine workers of a host. It
+holds two kinds of entries, both expiring after a TTL:
+
+* refs, keyed by the object type and natural key of an object, e.g. the
+  host name of a member. A ref may be out of date if the object was deleted
+  or renamed meanwhile; callers look the object up again when the ref is
+  not found.
+* small search results, stamped with the version of their object family.
+  A write to a family bumps its version, so that the results read before
+  it are not used any more by any worker.
+
+Errors of the database are logged and handled as cache misses, so that
+the cache never fails a WAPI call.
+"""
+
+LOG = logging.getLogger(__name__)
+
+# Search results larger than this are not cached
+MAX_RESULT_BYTES = 64 * 1024
+
+# Seconds SQLite waits for the lock of another worker. SQLite blocks the
+# native thread, and so the whole eventlet hub of the Heat engine, while
+# it waits: a locked database is a cache miss instead.
+BUSY_TIMEOUT = 0.005
+
+# Version bumps must not be missed, they are retried this many times,
+# sleeping (cooperatively under eventlet) BUMP_RETRY_DELAY seconds between
+BUMP_RETRIES = 20
+BUMP_RETRY_DELAY = 0.01
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS refs ('
+    ' grid TEXT, objtype TEXT, natural_key TEXT, ref TEXT,'
+    ' stored_at REAL, PRIMARY KEY (grid, objtype, natural_key))',
+    'CREATE TABLE IF NOT EXISTS results ('
+    ' grid TEXT, family TEXT, query TEXT, content BLOB, version INTEGER,'
+    ' stored_at REAL, PRIMARY KEY (grid, family, query))',
+    'CREATE TABLE IF NOT EXISTS versions ('
+    ' grid TEXT, family TEXT, version INTEGER,'
+    ' PRIMARY KEY (grid, family))',
+)
+
+
+def natural_key(payload):
+    """Return a stable string for a search payload, e.g. {'name': 'a'}."""
+    return json.dumps(payload or {}, sort_keys=True)
+
+
+def _is_busy(error):
+    # "database is locked" or "database table is locked"
+    return 'locked' in str(error)
+
+
+class RefCache(object):
+    """SQLite store of refs and search results, see the module docstring.
+
+    Every operation is a short transaction of its own. The database is in
+    WAL mode, so readers do not wait for the writer. Writers of other
+    processes wait for each other only BUSY_TIMEOUT seconds; an operation
+    which cannot get the lock is a cache miss, except version bumps, which
+    are retried.
+    """
+
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._db = None
+
+    def _connect(self):
+        if self._db is None:
+            db = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT,
+                                 isolation_level=None,
+                                 check_same_thread=False)
+            try:
+                db.execute('PRAGMA journal_mode=WAL')
+                for statement in SCHEMA:
+                    db.execute(statement)
+                self._purge(db)
+            except sqlite3.Error:
+                db.close()
+                raise
+            self._db = db
+        return self._db
+
+    def _purge(self, db):
+        try:
+            db.execute('DELETE FROM refs WHERE stored_at < ?',
+                       (time.time() - self.ttl,))
+            db.execute('DELETE FROM results WHERE stored_at < ?',
+                       (time.time() - self.ttl,))
+        except sqlite3.OperationalError as e:
+            # expired entries are not used anyway, another worker or the
+            # next start removes them
+            if not _is_busy(e):
+                raise
+
+    def _run(self, fn, default=None, retries=0):
+        for attempt in range(retries + 1):
+            if attempt:
+                time.sleep(BUMP_RETRY_DELAY)
+            with self._lock:
+                try:
+                    return fn(self._connect())
+                except sqlite3.Error as e:
+                    if not _is_busy(e):
+                        LOG.warning("Ref cache %s is unavailable: %s",
+                                    self.path, e)
+                        return default
+        if retries:
+            LOG.warning("Ref cache %s stayed locked by another worker",
+                        self.path)
+        else:
+            LOG.debug("Ref cache %s is locked by another worker", self.path)
+        return default
+
+    def get_ref(self, grid, objtype, key):
+        def get(db):
+            row = db.execute(
+                'SELECT ref FROM refs WHERE grid = ? AND objtype = ? AND '
+                'natural_key = ? AND stored_at >= ?',
+                (grid, objtype, key, time.time() - self.ttl)).fetchone()
+            return row[0] if row else None
+        return self._run(get)
+
+    def put_ref(self, grid, objtype, key, ref):
+        self._run(lambda db: db.execute(
+            'INSERT OR REPLACE INTO refs VALUES (?, ?, ?, ?, ?)',
+            (grid, objtype, key, ref, time.time())))
+
+    def forget_ref(self, grid, ref):
+        """Remove the entries of a ref, e.g. once the object is deleted."""
+        self._run(lambda db: db.execute(
+            'DELETE FROM refs WHERE grid = ? AND ref = ?', (grid, ref)))
+
+    def version(self, grid, family):
+        """Return the version of an object family, to stamp results with."""
+        def get(db):
+            row = db.execute(
+                'SELECT version FROM versions WHERE grid = ? AND family = ?',
+                (grid, family)).fetchone()
+            return row[0] if row else 0
+        return self._run(get)
+
+    def bump(self, grid, family):
+        """Make the results of an object family cached so far out of date.
+
+        Returns False if the database stayed locked, in which case the
+        results cached by other workers may be used until they expire.
+        """
+        def bump(db):
+            db.execute('BEGIN IMMEDIATE')
+            try:
+                db.execute('INSERT OR IGNORE INTO versions VALUES (?, ?, 0)',
+                           (grid, family))
+                db.execute('UPDATE versions SET version = version + 1 '
+                           'WHERE grid = ? AND family = ?', (grid, family))
+            except sqlite3.Error:
+                db.execute('ROLLBACK')
+                raise
+            db.execute('COMMIT')
+            return True
+        return self._run(bump, default=False, retries=BUMP_RETRIES)
+
+    def get_result(self, grid, family, query):
+        def get(db):
+            row = db.execute(
+                'SELECT r.content FROM results r LEFT JOIN versions v '
+                'ON v.grid = r.grid AND v.family = r.family '
+                'WHERE r.grid = ? AND r.family = ? AND r.query = ? AND '
+                'r.stored_at >= ? AND r.version = IFNULL(v.version, 0)',
+                (grid, family, query, time.time() - self.ttl)).fetchone()
+            return bytes(row[0]) if row else None
+        return self._run(get)
+
+    def put_result(self, grid, family, query, content, version):
+        """Store a search result read at 'version' of its family."""
+        if version is None or len(content) > MAX_RESULT_BYTES:
+            return
+        self._run(lambda db: db.execute(
+            'INSERT OR REPLACE INTO results VALUES (?, ?, ?, ?, ?, ?)',
+            (grid, family, query, sqlite3.Binary(content), version,
+             time.time())))
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_ref_cache(path, ttl):
+    """Return the ref cache shared by all connectors using 'path'."""
+    with _caches_lock:
+        cache = _caches.get(path)
+        if cache is None:
+            cache = _caches[path] = RefCache(path, ttl)
+        return cache
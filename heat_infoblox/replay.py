@@ -0,0 +1,223 @@
+# Copyright (c) 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import gzip
+import io
+import json
+import logging
+import threading
+import time
+
+import requests
+from requests import structures
+import six
+from six.moves.urllib import parse
+
+from heat_infoblox import logutils
+
+"""Record and replay of WAPI traffic.
+
+A RecordingSession wraps the requests session of a connector and appends
+every exchange to a trace file, one compact JSON object per line, gzipped
+if the file name ends with '.gz'. A ReplaySession serves those exchanges
+back instead of a grid, optionally waiting for the recorded latency of each
+response scaled by a factor. Sensitive values are masked in the trace, so
+replayed objects carry masks in place of passwords and keys.
+
+Requests are matched on their method, path, query and JSON body, ignoring
+the host, so a trace recorded against one grid can be replayed with any
+URL. Each recorded exchange is served once, in order; when they run out the
+last one is served again, e.g. for a job polled more often than recorded.
+"""
+
+LOG = logging.getLogger(__name__)
+
+# Response headers kept in a trace
+KEPT_HEADERS = ('Content-Type', 'Retry-After')
+
+
+def _open(path, mode):
+    if path.endswith('.gz'):
+        return io.TextIOWrapper(gzip.open(path, mode + 'b'), encoding='utf-8')
+    return io.open(path, mode, encoding='utf-8')
+
+
+def _text(data):
+    if data is None:
+        return ''
+    if isinstance(data, bytes):
+        return data.decode('utf-8', 'replace')
+    return data
+
+
+def _normalize_body(data):
+    text = _text(data)
+    try:
+        text = json.dumps(json.loads(text), sort_keys=True,
+                          separators=(',', ':'))
+    except ValueError:
+        pass
+    return logutils.redact_json(text)
+
+
+def request_key(method, url, data=None):
+    """Return the (method, path, body) a request is matched on."""
+    parsed = parse.urlsplit(url)
+    path = parsed.path
+    if parsed.query:
+        query = sorted(parse.parse_qsl(parsed.query, keep_blank_values=True))
+        path += '?' + parse.urlencode(query)
+    return method, path, _normalize_body(data)
+
+
+class Recorder(object):
+    """Appends exchanges to a trace file."""
+
+    def __init__(self, path):
+        self.path = path
+        self.started = time.time()
+        self._file = _open(path, 'a')
+        self._lock = threading.Lock()
+
+    def write(self, record):
+        line = json.dumps(record, sort_keys=True, separators=(',', ':'))
+        with self._lock:
+            self._file.write(six.text_type(line) + u'\n')
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class RecordingSession(object):
+    """A requests session which records every exchange."""
+
+    def __init__(self, session, recorder):
+        self.session = session
+        self.recorder = recorder
+
+    def __getattr__(self, name):
+        return getattr(self.session, name)
+
+    def request(self, method, url, **kwargs):
+        method, path, body = request_key(method, url, kwargs.get('data'))
+        record = {'at': round(time.time() - self.recorder.started, 6),
+                  'method': method, 'path': path, 'body': body}
+        start = time.time()
+        try:
+            r = self.session.request(method, url, **kwargs)
+        except requests.exceptions.RequestException as e:
+            record.update(elapsed=round(time.time() - start, 6),
+                          error=six.text_type(e))
+            self.recorder.write(record)
+            raise
+        record.update(elapsed=round(time.time() - start, 6),
+                      status=r.status_code,
+                      headers=dict((h, r.headers[h]) for h in KEPT_HEADERS
+                                   if h in r.headers),
+                      content=logutils.redact_json(_text(r.content)))
+        self.recorder.write(record)
+        return r
+
+
+class Trace(object):
+    """The exchanges of a trace file, indexed by request."""
+
+    def __init__(self, path):
+        self.path = path
+        self._exchanges = collections.defaultdict(collections.deque)
+        self._last = {}
+        self._lock = threading.Lock()
+        with _open(path, 'r') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    key = (record['method'], record['path'], record['body'])
+                    self._exchanges[key].append(record)
+
+    def __len__(self):
+        return sum(len(q) for q in self._exchanges.values())
+
+    def pop(self, key):
+        """Return the next exchange recorded for a request, or None."""
+        with self._lock:
+            queue = self._exchanges.get(key)
+            if queue:
+                self._last[key] = queue.popleft()
+            return self._last.get(key)
+
+
+class ReplayResponse(object):
+    def __init__(self, status_code, content, headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = structures.CaseInsensitiveDict(headers or {})
+
+
+class ReplaySession(object):
+    """Serves the exchanges of a trace in place of a grid.
+
+    Each response is delayed by its recorded latency multiplied by
+    time_scale: 1.0 replays the original timings, 0 does not wait.
+    """
+
+    def __init__(self, trace, time_scale=1.0):
+        self.trace = trace
+        self.time_scale = time_scale
+
+    def request(self, method, url, data=None, **kwargs):
+        key = request_key(method, url, data)
+        record = self.trace.pop(key)
+        if record is None:
+            LOG.warning("No recorded response for %s %s", method,
+                        logutils.redact_url(url))
+            content = json.dumps({
+                'Error': 'AdmConDataNotFoundError: No recorded response '
+                         'for %s %s' % (method, key[1])})
+            return ReplayResponse(404, content.encode('utf-8'),
+                                  {'Content-Type': 'application/json'})
+        if self.time_scale:
+            time.sleep(record['elapsed'] * self.time_scale)
+        if 'error' in record:
+            raise requests.exceptions.ConnectionError(record['error'])
+        return ReplayResponse(record['status'],
+                              record['content'].encode('utf-8'),
+                              record['headers'])
+
+
+_recorders = {}
+_traces = {}
+_lock = threading.Lock()
+
+
+def get_recorder(path):
+    """Return the recorder shared by all connectors writing to path."""
+    with _lock:
+        recorder = _recorders.get(path)
+        if recorder is None:
+            recorder = _recorders[path] = Recorder(path)
+        return recorder
+
+
+def get_trace(path):
+    """Return the trace shared by all connectors replaying path."""
+    with _lock:
+        trace = _traces.get(path)
+        if trace is None:
+            trace = _traces[path] = Trace(path)
+            LOG.info("Replaying %d WAPI exchanges from %s", len(trace), path)
+        return trace
@@ -17,9 +17,8 @@ from heat.common.i18n import _
 from heat.engine import constraints
 from heat.engine import properties
 
-from heat_infoblox import connector
+from heat_infoblox import config
 from heat_infoblox import constants
-from heat_infoblox import object_manipulator
 
 """Utilities for specifying resources."""
 
@@ -80,9 +79,21 @@ def connection_schema(conn_type):
     )
 
 
+def connector_options():
+    """Connector tuning options from the [infoblox] configuration group."""
+    return dict((opt.dest, getattr(config.CONF.infoblox, opt.dest))
+                for opt in config.CONNECTOR_OPTS)
+
+
 def connect_to_infoblox(conn_params):
+    # Imported here so that loading the plugins does not import requests
+    from heat_infoblox import connector
+    from heat_infoblox import object_manipulator
+
+    options = connector_options()
+    options.update({'url': conn_params[constants.URL],
+                    'username': conn_params[constants.USERNAME],
+                    'password': conn_params[constants.PASSWORD],
+                    'sslverify': conn_params[constants.SSLVERIFY]})
     return object_manipulator.InfobloxObjectManipulator(
-        connector.Infoblox({'url': conn_params[constants.URL],
-                            'username': conn_params[constants.USERNAME],
-                            'password': conn_params[constants.PASSWORD],
-                            'sslverify': conn_params[constants.SSLVERIFY]}))
+        connector.Infoblox(options))
@@ -0,0 +1,162 @@
+# Copyright (c) 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import logging
+
+from heat.common import exception
+from heat.common.i18n import _
+from heat.engine import attributes
+from heat.engine import constraints
+from heat.engine import properties
+from heat.engine import resource
+from heat.engine import support
+
+from heat_infoblox import constants
+from heat_infoblox import ibexceptions as exc
+from heat_infoblox import metrics
+from heat_infoblox import profiling
+from heat_infoblox import resource_utils
+
+
+LOG = logging.getLogger(__name__)
+
+# Maximum number of addresses allocated per round trip
+ALLOCATION_BATCH_SIZE = 1000
+
+# Number of times the allocation of a batch is tried, as other clients may
+# take the addresses offered to us before we reserve them
+MAX_ALLOCATION_ATTEMPTS = 3
+
+
+@profiling.profile_cls
+class AddressBlock(resource.Resource):
+    '''A resource which represents a block of reserved IP addresses.
+
+    Use this resource to reserve many addresses of a network at once, e.g.
+    for a group of servers. The next available addresses of the network are
+    found with one call, then reserved with one multi-request.
+    '''
+
+    PROPERTIES = (
+        NETWORK, NETWORK_VIEW, COUNT,
+    ) = (
+        'network', 'network_view', 'count',
+    )
+
+    ATTRIBUTES = (
+        ADDRESSES,
+    ) = (
+        'addresses',
+    )
+
+    support_status = support.SupportStatus(
+        support.UNSUPPORTED,
+        _('See support.infoblox.com for support.'))
+
+    properties_schema = {
+        constants.CONNECTION:
+            resource_utils.connection_schema(constants.DDI),
+        NETWORK: properties.Schema(
+            properties.Schema.STRING,
+            _('The network to allocate the addresses from, in CIDR '
+              'notation.'),
+            required=True),
+        NETWORK_VIEW: properties.Schema(
+            properties.Schema.STRING,
+            _('The network view of the network.'),
+            default='default'),
+        COUNT: properties.Schema(
+            properties.Schema.INTEGER,
+            _('The number of addresses to allocate.'),
+            required=True,
+            constraints=[
+                constraints.Range(min=1)
+            ]),
+    }
+
+    attributes_schema = {
+        ADDRESSES: attributes.Schema(
+            _('The allocated addresses, in ascending order.'),
+            type=attributes.Schema.LIST)
+    }
+
+    def infoblox(self):
+        if not getattr(self, 'infoblox_object', None):
+            conn = self.properties[constants.CONNECTION]
+            self.infoblox_object = resource_utils.connect_to_infoblox(conn)
+        return self.infoblox_object
+
+    def _allocate(self, network_ref, count):
+        """Reserve count addresses, a batch at a time."""
+        net_view = self.properties[self.NETWORK_VIEW]
+        comment = self.physical_resource_name()
+        allocated = []
+        failures = 0
+        while len(allocated) < count:
+            num = min(count - len(allocated), ALLOCATION_BATCH_SIZE)
+            ips = self.infoblox().next_available_ips(network_ref, num,
+                                                     exclude=allocated)
+            try:
+                self.infoblox().reserve_ips(ips, net_view, comment)
+            except exc.InfobloxMultiRequestError as e:
+                failures += 1
+                if failures >= MAX_ALLOCATION_ATTEMPTS:
+                    raise
+                LOG.info("Cannot reserve %d addresses of %s, retrying: %s",
+                         num, self.properties[self.NETWORK], e)
+                continue
+            allocated.extend(ips)
+        return allocated
+
+    @metrics.track_action
+    def handle_create(self):
+        cidr = self.properties[self.NETWORK]
+        network = self.infoblox().get_network(
+            cidr, self.properties[self.NETWORK_VIEW])
+        if network is None:
+            raise exception.EntityNotFound(entity='Network', name=cidr)
+
+        # Set first, so that a failed allocation is cleaned up on delete
+        self.resource_id_set(self.physical_resource_name())
+        self._allocate(network, self.properties[self.COUNT])
+
+    def _reserved(self):
+        return self.infoblox().get_reserved_ips(
+            self.properties[self.NETWORK],
+            self.properties[self.NETWORK_VIEW],
+            self.resource_id)
+
+    @metrics.track_action
+    def handle_delete(self):
+        if self.resource_id is None:
+            return None
+        self.infoblox().release_ips(r['_ref'] for r in self._reserved())
+
+    @metrics.track_action
+    def _resolve_attribute(self, name):
+        import netaddr
+
+        if name == self.ADDRESSES:
+            if self.resource_id is None:
+                return []
+            return sorted((r['ipv4addr'] for r in self._reserved()),
+                          key=netaddr.IPAddress)
+        return None
+
+
+def resource_mapping():
+    return {
+        'Infoblox::IPAM::AddressBlock': AddressBlock,
+    }
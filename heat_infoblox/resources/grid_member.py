@@ -14,7 +14,6 @@
 #    under the License.
 
 import logging
-import netaddr
 
 from heat.common.i18n import _
 from heat.engine import attributes
@@ -24,12 +23,16 @@ from heat.engine import resource
 from heat.engine import support
 
 from heat_infoblox import constants
+from heat_infoblox import metrics
+from heat_infoblox import profiling
 from heat_infoblox import resource_utils
+from heat_infoblox import tracing
 
 
 LOG = logging.getLogger(__name__)
 
 
+@profiling.profile_cls
 class GridMember(resource.Resource):
     '''A resource which represents an Infoblox Grid Member.
 
@@ -190,8 +193,14 @@ class GridMember(resource.Resource):
             type=attributes.Schema.STRING)
     }
 
+    def _neutron_call(self, function, *args):
+        with tracing.trace('infoblox-neutron', {'function': function}):
+            return getattr(self.client('neutron'), function)(*args)
+
     def _make_network_settings(self, ip):
-        subnet = self.client('neutron').show_subnet(ip['subnet_id'])['subnet']
+        import netaddr
+
+        subnet = self._neutron_call('show_subnet', ip['subnet_id'])['subnet']
         ipnet = netaddr.IPNetwork(subnet['cidr'])
         return {
             'address': ip['ip_address'],
@@ -200,7 +209,9 @@ class GridMember(resource.Resource):
         }
 
     def _make_ipv6_settings(self, ip):
-        subnet = self.client('neutron').show_subnet(ip['subnet_id'])['subnet']
+        import netaddr
+
+        subnet = self._neutron_call('show_subnet', ip['subnet_id'])['subnet']
         prefix = netaddr.IPNetwork(subnet['cidr'])
         autocfg = subnet['ipv6_ra_mode'] == "slaac"
         return {
@@ -220,8 +231,8 @@ class GridMember(resource.Resource):
         if self.properties[port_name] is None:
             return None
 
-        port = self.client('neutron').show_port(
-            self.properties[port_name])['port']
+        port = self._neutron_call(
+            'show_port', self.properties[port_name])['port']
 
         if port is None:
             return None
@@ -236,6 +247,7 @@ class GridMember(resource.Resource):
                     ipv4 = self._make_network_settings(ip)
         return {'ipv4': ipv4, 'ipv6': ipv6}
 
+    @metrics.track_action
     def handle_create(self):
         mgmt = self._make_port_network_settings(self.MGMT_PORT)
         lan1 = self._make_port_network_settings(self.LAN1_PORT)
@@ -264,7 +276,8 @@ class GridMember(resource.Resource):
         # This is a workaround needed because Juno Heat does not honor
         # dependencies in nested autoscale group stacks.
         fields = {'name', 'grid_primary', 'grid_secondaries'}
-        groups = self.infoblox().get_all_ns_groups(return_fields=fields)
+        groups = self.infoblox().get_all_ns_groups(return_fields=fields,
+                                                   for_update=True)
         for group in groups:
             new_list = {}
             changed = False
@@ -278,6 +291,7 @@ class GridMember(resource.Resource):
             if changed:
                 self.infoblox().update_ns_group(group['name'], new_list)
 
+    @metrics.track_action
     def handle_delete(self):
         if self.resource_id is not None:
             self._remove_from_all_ns_groups()
@@ -342,6 +356,7 @@ class GridMember(resource.Resource):
                 member['_ref'], {})['pnode_tokens']
         return token
 
+    @metrics.track_action
     def _resolve_attribute(self, name):
         member_name = self.resource_id
         member = self.infoblox().get_member(
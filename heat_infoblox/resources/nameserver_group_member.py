@@ -23,12 +23,15 @@ from heat.engine import resource
 from heat.engine import support
 
 from heat_infoblox import constants
+from heat_infoblox import metrics
+from heat_infoblox import profiling
 from heat_infoblox import resource_utils
 
 
 LOG = logging.getLogger(__name__)
 
 
+@profiling.profile_cls
 class NameServerGroupMember(resource.Resource):
     '''A resource which represents a name server group.
 
@@ -120,20 +123,22 @@ class NameServerGroupMember(resource.Resource):
         self._remove_member(member_list, member)
         member_list.append(member)
 
-    def _get_ns_group(self, group_name):
+    def _get_ns_group(self, group_name, for_update=False):
         LOG.debug("LOADING NSGROUP: %s" % group_name)
         groups = self.infoblox().get_ns_group(
             group_name,
-            return_fields=['name', 'grid_primary', 'grid_secondaries']
+            return_fields=['name', 'grid_primary', 'grid_secondaries'],
+            for_update=for_update
         )
         if len(groups) == 0:
             raise exception.EntityNotFound(entity='Name Server Group',
                                            name=group_name)
         return groups[0]
 
+    @metrics.track_action
     def handle_create(self):
         group_name = self.properties[self.GROUP_NAME]
-        group = self._get_ns_group(group_name)
+        group = self._get_ns_group(group_name, for_update=True)
         LOG.debug("NSGROUP: %s" % group)
 
         member_role = self.properties[self.MEMBER_ROLE]
@@ -150,6 +155,7 @@ class NameServerGroupMember(resource.Resource):
             "%s/%s/%s" % (group_name, member_role, member['name'])
         )
 
+    @metrics.track_action
     def handle_delete(self):
         LOG.debug("NSGROUP %s DELETE" % self.resource_id)
         if self.resource_id is None:
@@ -161,13 +167,14 @@ class NameServerGroupMember(resource.Resource):
         if member_role == 'grid_secondary':
             field_name = 'grid_secondaries'
 
-        group = self._get_ns_group(group_name)
+        group = self._get_ns_group(group_name, for_update=True)
 
         LOG.debug("NSGROUP for DELETE: %s" % group)
         self._remove_member(group[field_name], member)
         LOG.debug("NSGROUP update DELETE: %s" % group)
         self.infoblox().update_ns_group(group_name, group)
 
+    @metrics.track_action
     def _resolve_attribute(self, name):
         LOG.debug("RESOLVE ATTRIBUTE: %s" % name)
         group_name = self.properties[self.GROUP_NAME]
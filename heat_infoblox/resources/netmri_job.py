@@ -23,13 +23,14 @@ from heat.engine import resource
 from heat.engine import support
 
 from heat_infoblox import constants
+from heat_infoblox import profiling
 from heat_infoblox import resource_utils
-
-import infoblox_netmri as netmri
+from heat_infoblox import tracing
 
 LOG = logging.getLogger(__name__)
 
 
+@profiling.profile_cls
 class NetMRIJob(resource.Resource):
     '''A resource which represents a job executed in NetMRI.'''
 
@@ -123,11 +124,21 @@ class NetMRIJob(resource.Resource):
     @property
     def netmri(self):
         if not getattr(self, 'netmri_object', None):
-            self.netmri_object = netmri.InfobloxNetMRI(
+            import infoblox_netmri
+
+            self.netmri_object = infoblox_netmri.InfobloxNetMRI(
                 self.properties[constants.CONNECTION]
             )
         return self.netmri_object
 
+    def _api_request(self, path, params):
+        with tracing.trace('infoblox-netmri', {'path': path}):
+            return self.netmri.api_request(path, params)
+
+    def _show(self, objtype, obj_id):
+        with tracing.trace('infoblox-netmri', {'path': '%s/show' % objtype}):
+            return self.netmri.show(objtype, obj_id)
+
     def _device_ids(self):
         ids = set()
         ips = set()
@@ -157,8 +168,8 @@ class NetMRIJob(resource.Resource):
             api_params = {'select': ['VirtualNetworkID', 'VirtualNetworkName']}
             if not need_all_views:
                 api_params['VirtualNetworkName'] = list(view_names)
-            views = self.netmri.api_request('virtual_networks/search',
-                                            api_params)['virtual_networks']
+            views = self._api_request('virtual_networks/search',
+                                      api_params)['virtual_networks']
 
             # map name -> ID for the views
             view_map = {}
@@ -176,7 +187,7 @@ class NetMRIJob(resource.Resource):
 
             # create a map of IP -> [ views IDs ] found in the NetMRI
             # so we know all views in which an IP is found
-            devices = self.netmri.api_request('devices/index', {
+            devices = self._api_request('devices/index', {
                 'DeviceIPDotted': ips,
                 'VirtualNetworkID': list(view_map.values()),
                 'select': 'DeviceID,DeviceIPDotted,VirtualNetworkID'
@@ -225,14 +236,14 @@ class NetMRIJob(resource.Resource):
 
         params.update(inputs)
 
-        r = self.netmri.api_request('scripts/run', params)
+        r = self._api_request('scripts/run', params)
         self.resource_id_set(r['JobID'])
 
     def check_create_complete(self, handler_data):
         if not self.properties[self.WAIT]:
             return True
 
-        job = self.netmri.show('job', int(self.resource_id))
+        job = self._show('job', int(self.resource_id))
         LOG.debug("job = %s", job)
         if job['completed_at']:
             return True
@@ -243,11 +254,11 @@ class NetMRIJob(resource.Resource):
         pass
 
     def _get_job_details(self):
-        details = self.netmri.api_request('job_details/index',
-                                          {'id': self.resource_id})
+        details = self._api_request('job_details/index',
+                                    {'id': self.resource_id})
         device_ids = map(lambda x: x['DeviceID'], details['job_details'])
-        devices = self.netmri.api_request('devices/index',
-                                          {'DeviceID': device_ids})
+        devices = self._api_request('devices/index',
+                                    {'DeviceID': device_ids})
         dev_map = dict(map(lambda x: (x['DeviceID'], x), devices['devices']))
         for detail in details['job_details']:
             detail['device'] = dev_map.get(detail['DeviceID'], None)
@@ -257,7 +268,7 @@ class NetMRIJob(resource.Resource):
         LOG.debug("attr '%s' for resource %s", name, self.resource_id)
 
         if name == self.JOB:
-            job = self.netmri.show('job', int(self.resource_id))
+            job = self._show('job', int(self.resource_id))
             return job
 
         if name == self.JOB_DETAILS:
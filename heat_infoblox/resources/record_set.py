@@ -0,0 +1,235 @@
+# Copyright (c) 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import logging
+
+from heat.common.i18n import _
+from heat.engine import attributes
+from heat.engine import constraints
+from heat.engine import properties
+from heat.engine import resource
+from heat.engine import support
+
+from heat_infoblox import constants
+from heat_infoblox import metrics
+from heat_infoblox import profiling
+from heat_infoblox import resource_utils
+
+
+LOG = logging.getLogger(__name__)
+
+# WAPI object type of each type of record
+RECORD_TYPES = {
+    'A': 'record:a',
+    'AAAA': 'record:aaaa',
+    'CNAME': 'record:cname',
+    'PTR': 'record:ptr',
+}
+
+
+@profiling.profile_cls
+class RecordSet(resource.Resource):
+    '''A resource which represents a set of DNS records of a zone.
+
+    Use this resource to manage many A, AAAA, CNAME and PTR records of a zone
+    at once. The records are created, updated and deleted with a few batched
+    requests, and an update only changes the records which differ.
+    '''
+
+    PROPERTIES = (
+        ZONE, VIEW, RECORDS,
+    ) = (
+        'zone', 'view', 'records',
+    )
+
+    RECORD = (
+        TYPE, NAME, VALUE, TTL,
+    ) = (
+        'type', 'name', 'value', 'ttl',
+    )
+
+    ATTRIBUTES = (
+        RECORDS_ATTR,
+    ) = (
+        'records',
+    )
+
+    support_status = support.SupportStatus(
+        support.UNSUPPORTED,
+        _('See support.infoblox.com for support.'))
+
+    properties_schema = {
+        constants.CONNECTION:
+            resource_utils.connection_schema(constants.DDI),
+        ZONE: properties.Schema(
+            properties.Schema.STRING,
+            _('The authoritative zone of the records.'),
+            required=True),
+        VIEW: properties.Schema(
+            properties.Schema.STRING,
+            _('The DNS view of the zone.'),
+            default='default'),
+        RECORDS: properties.Schema(
+            properties.Schema.LIST,
+            _('The records of the set.'),
+            required=True,
+            update_allowed=True,
+            schema=properties.Schema(
+                properties.Schema.MAP,
+                schema={
+                    TYPE: properties.Schema(
+                        properties.Schema.STRING,
+                        _('The type of the record.'),
+                        required=True,
+                        constraints=[
+                            constraints.AllowedValues(sorted(RECORD_TYPES))
+                        ]),
+                    NAME: properties.Schema(
+                        properties.Schema.STRING,
+                        _('The name of the record, relative to the zone '
+                          'unless it ends with a dot. Use "@" for the '
+                          'zone itself.'),
+                        required=True),
+                    VALUE: properties.Schema(
+                        properties.Schema.STRING,
+                        _('The address of an A or AAAA record, or the '
+                          'domain name a CNAME or PTR record points to.'),
+                        required=True),
+                    TTL: properties.Schema(
+                        properties.Schema.INTEGER,
+                        _('The time to live of the record, in seconds. '
+                          'The TTL of the zone applies if not set.'),
+                        constraints=[
+                            constraints.Range(min=0)
+                        ]),
+                })),
+    }
+
+    attributes_schema = {
+        RECORDS_ATTR: attributes.Schema(
+            _('The records of the set, as found in the zone.'),
+            type=attributes.Schema.LIST)
+    }
+
+    def infoblox(self):
+        if not getattr(self, 'infoblox_object', None):
+            conn = self.properties[constants.CONNECTION]
+            self.infoblox_object = resource_utils.connect_to_infoblox(conn)
+        return self.infoblox_object
+
+    def _fqdn(self, name):
+        zone = self.properties[self.ZONE]
+        if name == '@':
+            return zone
+        if name.endswith('.'):
+            return name[:-1]
+        return '%s.%s' % (name, zone)
+
+    def _records(self, records):
+        """Return {(record type, name, value): ttl} of records."""
+        import netaddr
+
+        result = {}
+        for record in records or []:
+            record_type = RECORD_TYPES[record[self.TYPE]]
+            value = record[self.VALUE]
+            if record_type in ('record:a', 'record:aaaa'):
+                value = str(netaddr.IPAddress(value))
+            else:
+                value = value.rstrip('.')
+            key = (record_type, self._fqdn(record[self.NAME]), value)
+            result[key] = record.get(self.TTL)
+        return result
+
+    def _existing(self, record_types):
+        """Return {(record type, name, value): (ref, ttl)} of the zone."""
+        existing = {}
+        for record_type in sorted(record_types):
+            value_field = constants.RECORD_VALUE_FIELDS[record_type]
+            for record in self.infoblox().get_records(
+                    record_type, self.properties[self.ZONE],
+                    self.properties[self.VIEW]):
+                key = (record_type, record['name'], record[value_field])
+                ttl = record.get('ttl') if record.get('use_ttl') else None
+                existing[key] = (record['_ref'], ttl)
+        return existing
+
+    @staticmethod
+    def _ttl_fields(ttl):
+        if ttl is None:
+            return {'use_ttl': False}
+        return {'ttl': ttl, 'use_ttl': True}
+
+    def _sync(self, old, new):
+        """Change the records of the zone from the old set to the new one.
+
+        Records of the old set missing from the new one are deleted, new
+        records are created and the TTL of the others is updated if it
+        differs from the one in the zone. Records of the zone which are in
+        neither set are left alone.
+        """
+        existing = self._existing(set(key[0] for key in old) |
+                                  set(key[0] for key in new))
+        deletes = [existing[key][0] for key in sorted(old)
+                   if key not in new and key in existing]
+        creates = []
+        updates = []
+        for key in sorted(new):
+            record_type, name, value = key
+            ttl = new[key]
+            if key not in existing:
+                fields = {'name': name, 'view': self.properties[self.VIEW],
+                          constants.RECORD_VALUE_FIELDS[record_type]: value}
+                if ttl is not None:
+                    fields.update(self._ttl_fields(ttl))
+                creates.append((record_type, fields))
+            elif existing[key][1] != ttl:
+                updates.append((existing[key][0], self._ttl_fields(ttl)))
+        self.infoblox().change_records(deletes, creates, updates)
+
+    @metrics.track_action
+    def handle_create(self):
+        self._sync({}, self._records(self.properties[self.RECORDS]))
+        self.resource_id_set('%s/%s' % (self.properties[self.VIEW],
+                                        self.properties[self.ZONE]))
+
+    @metrics.track_action
+    def handle_update(self, json_snippet, tmpl_diff, prop_diff):
+        if self.RECORDS in prop_diff:
+            self._sync(self._records(self.properties[self.RECORDS]),
+                       self._records(prop_diff[self.RECORDS]))
+
+    @metrics.track_action
+    def handle_delete(self):
+        if self.resource_id is None:
+            return None
+        self._sync(self._records(self.properties[self.RECORDS]), {})
+
+    @metrics.track_action
+    def _resolve_attribute(self, name):
+        if name == self.RECORDS_ATTR:
+            records = self._records(self.properties[self.RECORDS])
+            existing = self._existing(set(key[0] for key in records))
+            types = dict((v, k) for k, v in RECORD_TYPES.items())
+            return [{self.TYPE: types[key[0]], self.NAME: key[1],
+                     self.VALUE: key[2], self.TTL: existing[key][1]}
+                    for key in sorted(records) if key in existing]
+        return None
+
+
+def resource_mapping():
+    return {
+        'Infoblox::DNS::RecordSet': RecordSet,
+    }
@@ -0,0 +1,131 @@
+# Copyright (c) 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import random
+import threading
+import time
+
+from heat_infoblox import ibexceptions as exc
+
+"""Retry policy and circuit breaker for WAPI calls."""
+
+# Status codes returned by an overloaded grid master
+RETRYABLE_STATUS_CODES = frozenset([429, 502, 503, 504])
+
+# WAPI reports some server side timeouts as a regular error response
+TIMEOUT_MARKERS = (b'timed out', b'timeout exceeded')
+
+
+class RetryPolicy(object):
+    """Jittered exponential backoff for WAPI overload responses."""
+
+    def __init__(self, max_attempts=5, base_delay=0.5, max_delay=30.0):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def is_retryable(self, response):
+        if response.status_code in RETRYABLE_STATUS_CODES:
+            return True
+        if response.status_code >= 400:
+            content = (response.content or b'').lower()
+            return any(marker in content for marker in TIMEOUT_MARKERS)
+        return False
+
+    def backoff(self, attempt, response=None):
+        """Return the delay before retry number 'attempt' (1-based).
+
+        Uses "full jitter" so that concurrent callers hitting the same
+        overloaded grid master spread their retries instead of retrying in
+        lockstep. A Retry-After header sent by the server is honored as a
+        lower bound.
+        """
+        cap = min(self.max_delay, self.base_delay * (2 ** (attempt - 1)))
+        delay = random.uniform(0, cap)
+        retry_after = None
+        if response is not None:
+            retry_after = response.headers.get('Retry-After')
+        if retry_after:
+            try:
+                delay = max(delay, min(float(retry_after), self.max_delay))
+            except ValueError:
+                pass
+        return delay
+
+
+class CircuitBreaker(object):
+    """Sheds load from a grid master after repeated failures.
+
+    After 'failure_threshold' consecutive failures the breaker opens and all
+    calls fail fast with InfobloxCircuitOpen for 'reset_timeout' seconds.
+    Then a single trial call is let through; its outcome closes the breaker
+    or opens it again. If the trial reports no outcome, e.g. as it raised an
+    unexpected error, another trial is let through 'reset_timeout' seconds
+    later.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = ('closed', 'open', 'half-open')
+
+    def __init__(self, url, failure_threshold=5, reset_timeout=30.0):
+        self.url = url
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            # opened_at is also the start of the trial call when half-open
+            now = time.time()
+            elapsed = now - self.opened_at
+            if elapsed >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self.opened_at = now
+                return
+            raise exc.InfobloxCircuitOpen(
+                url=self.url,
+                retry_in=int(max(0, self.reset_timeout - elapsed)) + 1)
+
+    def record_success(self):
+        with self._lock:
+            self.state = self.CLOSED
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if (self.state == self.HALF_OPEN or
+                    self.failures >= self.failure_threshold):
+                self.state = self.OPEN
+                self.opened_at = time.time()
+
+
+_breakers = {}
+_breakers_lock = threading.Lock()
+
+
+def get_circuit_breaker(url, failure_threshold, reset_timeout):
+    """Return the circuit breaker shared by all connectors to 'url'."""
+    with _breakers_lock:
+        breaker = _breakers.get(url)
+        if breaker is None:
+            breaker = CircuitBreaker(url, failure_threshold, reset_timeout)
+            _breakers[url] = breaker
+        return breaker
@@ -0,0 +1,113 @@
+# Copyright (c) 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import sys
+import threading
+import time
+
+import six
+
+"""Coalescing of identical concurrent calls."""
+
+
+class _Call(object):
+    __slots__ = ('done', 'result', 'exc_info')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.exc_info = None
+
+    def wait(self):
+        self.done.wait()
+        if self.exc_info is not None:
+            six.reraise(*self.exc_info)
+        return self.result
+
+
+class Group(object):
+    """Runs at most one call per key at a time.
+
+    Callers asking for a key while a call for it is in flight wait for that
+    call and share its result (or its exception) instead of issuing their
+    own. Nothing is remembered once the call completes, so this is not a
+    cache: a later caller always triggers a fresh call.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            return call.wait()
+
+        try:
+            call.result = fn()
+        except Exception:
+            call.exc_info = sys.exc_info()
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+
+class Debouncer(object):
+    """Runs one call per key for all the callers of a time window.
+
+    The first caller asking for a key waits 'delay' seconds, then makes the
+    call. Callers asking for the key meanwhile wait for that call and share
+    its result (or its exception). A caller arriving once the call has
+    started opens a new window, so every caller is served by a call started
+    after it asked.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn, delay):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = _Call()
+                self._calls[key] = call
+
+        if not leader:
+            return call.wait()
+
+        try:
+            try:
+                time.sleep(delay)
+            finally:
+                with self._lock:
+                    del self._calls[key]
+            call.result = fn()
+        except Exception:
+            call.exc_info = sys.exc_info()
+            raise
+        finally:
+            call.done.set()
+        return call.result
@@ -0,0 +1,270 @@
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import logging
+import threading
+import time
+
+import six
+from six.moves import intern
+
+"""In-memory snapshot of the grid objects looked up again and again.
+
+The members, name server groups and DNS views of a grid are loaded with one
+paged search per object type, then kept as slotted records indexed by name
+and ref. Name server groups are also indexed by the members they contain.
+Nested values are stored as tuples rather than as lists and dicts, and
+turned back into lists and dicts by every lookup, so callers may change the
+objects they get.
+"""
+
+LOG = logging.getLogger(__name__)
+
+# Fields loaded for each object type; lookups asking for other fields are
+# not answered from the snapshot
+FIELDS = {
+    'member': ('host_name', 'platform', 'vip_setting', 'ipv6_setting'),
+    'nsgroup': ('name', 'grid_primary', 'grid_secondaries'),
+    'view': ('name', 'network_view'),
+}
+
+# Field naming the objects of each type
+NAME_FIELDS = {
+    'member': 'host_name',
+    'nsgroup': 'name',
+    'view': 'name',
+}
+
+# Fields of the name server groups listing their members
+NSGROUP_MEMBER_FIELDS = ('grid_primary', 'grid_secondaries')
+
+
+class _Map(tuple):
+    """A dict stored as a tuple: its keys, shared by all such dicts, then
+    its values."""
+
+    __slots__ = ()
+
+
+# Key tuples of the _Map objects, kept once
+_keys = {}
+
+
+def _intern(value):
+    # Names, keys and common values repeat across objects, keep a single
+    # copy of each
+    return intern(value) if isinstance(value, str) else value
+
+
+def _freeze(value):
+    if isinstance(value, dict):
+        keys = tuple(sorted(value))
+        keys = _keys.setdefault(keys, tuple(_intern(k) for k in keys))
+        return _Map((keys,) + tuple(_freeze(value[k]) for k in keys))
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return _intern(value)
+
+
+def _thaw(value):
+    if isinstance(value, _Map):
+        return dict(zip(value[0], (_thaw(v) for v in value[1:])))
+    if isinstance(value, tuple):
+        return [_thaw(v) for v in value]
+    return value
+
+
+class _Record(object):
+    __slots__ = ('_ref',)
+
+
+def _record_class(objtype):
+    return type(str('%sRecord' % objtype.capitalize()), (_Record,),
+                {'__slots__': FIELDS[objtype]})
+
+
+class _Table(object):
+    """The records of one object type."""
+
+    def __init__(self, objtype, objects):
+        self.objtype = objtype
+        self.fields = FIELDS[objtype]
+        self.name_field = NAME_FIELDS[objtype]
+        self.record_class = _record_class(objtype)
+        self.loaded_at = time.time()
+        self.by_ref = {}
+        self.by_name = {}
+        # Names created since the load, which are looked up on the grid
+        self.stale = set()
+        # {member name: names of its name server groups}
+        self.groups = {}
+        for obj in objects:
+            self.put(obj)
+
+    def put(self, obj):
+        self.remove(obj['_ref'])
+        record = self.record_class()
+        record._ref = obj['_ref']
+        for field in self.fields:
+            if field in obj:
+                setattr(record, field, _freeze(obj[field]))
+        name = getattr(record, self.name_field, None)
+        if name is not None:
+            self.by_name[name] = record
+            self.stale.discard(name)
+        self.by_ref[record._ref] = record
+        self._index(record, add=True)
+
+    def remove(self, ref):
+        record = self.by_ref.pop(ref, None)
+        if record is None:
+            return
+        name = getattr(record, self.name_field, None)
+        if self.by_name.get(name) is record:
+            del self.by_name[name]
+        self._index(record, add=False)
+
+    def _index(self, record, add):
+        if self.objtype != 'nsgroup':
+            return
+        for field in NSGROUP_MEMBER_FIELDS:
+            for member in _thaw(getattr(record, field, ())):
+                # a member is in few groups, tuples take less than sets
+                groups = self.groups.get(member['name'], ())
+                if add and record.name not in groups:
+                    groups += (record.name,)
+                elif not add:
+                    groups = tuple(g for g in groups if g != record.name)
+                if groups:
+                    self.groups[member['name']] = groups
+                else:
+                    self.groups.pop(member['name'], None)
+
+    def as_dict(self, record, return_fields):
+        obj = {'_ref': record._ref}
+        for field in return_fields or (self.name_field,):
+            if hasattr(record, field):
+                obj[field] = _thaw(getattr(record, field))
+        return obj
+
+
+class Snapshot(object):
+    """Members, name server groups and DNS views of a grid.
+
+    Each object type is loaded on its first lookup and again once it is
+    older than 'ttl' seconds. The changes made through the manipulators of
+    the grid are applied to the snapshot as they are made: the kept fields
+    of updated objects are changed in place, deleted objects are removed
+    and the names of created ones are looked up on the grid until the next
+    load.
+    """
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def _table(self, objtype, load):
+        table = self._tables.get(objtype)
+        if table is None or time.time() - table.loaded_at >= self.ttl:
+            table = self._tables[objtype] = _Table(
+                objtype, load(objtype, FIELDS[objtype]))
+            LOG.debug("Loaded %d %s objects in the snapshot",
+                      len(table.by_ref), objtype)
+        return table
+
+    def lookup(self, objtype, load, name=None, return_fields=None):
+        """Return the objects of a type, or the one named 'name'.
+
+        The objects are returned as the WAPI would, as a list of dicts with
+        their '_ref' and return fields. 'load(objtype, fields)' returns all
+        the objects of a type with the given fields; it is called while
+        holding the lock of the snapshot. Returns None if the snapshot
+        cannot answer, so that the caller asks the grid.
+        """
+        if objtype not in FIELDS:
+            return None
+        if return_fields and not set(return_fields) <= set(FIELDS[objtype]):
+            return None
+        with self._lock:
+            table = self._table(objtype, load)
+            if name is None:
+                if table.stale:
+                    return None
+                return [table.as_dict(r, return_fields)
+                        for r in six.itervalues(table.by_ref)]
+            if name in table.stale:
+                return None
+            record = table.by_name.get(name)
+            return [table.as_dict(record, return_fields)] if record else []
+
+    def groups_of(self, member_name, load):
+        """Return the names of the name server groups of a member."""
+        with self._lock:
+            table = self._table('nsgroup', load)
+            return sorted(table.groups.get(member_name, ()))
+
+    def _loaded(self, ref):
+        table = self._tables.get(ref.split('/', 1)[0])
+        if table is not None and ref in table.by_ref:
+            return table
+        return None
+
+    def created(self, objtype, name):
+        with self._lock:
+            table = self._tables.get(objtype)
+            if table is not None:
+                table.stale.add(name)
+
+    def updated(self, ref, fields):
+        with self._lock:
+            table = self._loaded(ref)
+            if table is None:
+                return
+            # the other fields are not kept, e.g. extattrs
+            changes = dict((k, v) for k, v in six.iteritems(fields)
+                           if k in table.fields)
+            if not changes:
+                return
+            obj = table.as_dict(table.by_ref[ref], table.fields)
+            obj.update(changes)
+            if not set(table.fields) <= set(obj):
+                # the object cannot be kept complete, load it again
+                del self._tables[table.objtype]
+                return
+            table.put(obj)
+
+    def deleted(self, ref):
+        with self._lock:
+            table = self._loaded(ref)
+            if table is not None:
+                table.remove(ref)
+
+    def clear(self):
+        with self._lock:
+            self._tables.clear()
+
+
+_snapshots = {}
+_snapshots_lock = threading.Lock()
+
+
+def get_snapshot(url, ttl):
+    """Return the snapshot shared by all manipulators of a grid."""
+    with _snapshots_lock:
+        snapshot = _snapshots.get(url)
+        if snapshot is None:
+            snapshot = _snapshots[url] = Snapshot(ttl)
+        return snapshot
@@ -0,0 +1,232 @@
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import asyncio
+import functools
+import threading
+
+from heat.tests import common
+
+from heat_infoblox import aio_connector
+from heat_infoblox import ibexceptions as exc
+from heat_infoblox import object_manipulator
+from heat_infoblox.tests import fake_wapi_server
+from heat_infoblox.tests import fakes
+
+
+class FakeAioResponse(object):
+    def __init__(self, response):
+        self.status = response.status_code
+        self.headers = response.headers
+        self._content = response.content
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, tb):
+        pass
+
+    async def read(self):
+        return self._content
+
+
+class FakeAioSession(object):
+    """An aiohttp.ClientSession replacement answering from a FakeWapi.
+
+    Counts the requests in flight, and the most seen at once.
+    """
+
+    def __init__(self, wapi, statuses=()):
+        self.sync = fakes.FakeWapiSession(wapi)
+        self.statuses = list(statuses)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.closed = False
+
+    async def _request(self, method, url, data=None, **kwargs):
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            # let the other requests start meanwhile
+            await asyncio.sleep(0)
+            if self.statuses:
+                self.sync.calls.append((method, 'injected', None))
+                return FakeAioResponse(
+                    fakes.FakeResponse(self.statuses.pop(0), {}))
+            content_type = (kwargs.get('headers') or {}).get('Content-Type')
+            if content_type and content_type.startswith('multipart/'):
+                content = fake_wapi_server.uploaded_file(content_type, data)
+                return FakeAioResponse(self.sync.request(
+                    method, url, files={'filedata': (None, content)}))
+            return FakeAioResponse(self.sync.request(method, url, data=data))
+        finally:
+            self.in_flight -= 1
+
+    def request(self, method, url, **kwargs):
+        return _Pending(self._request(method, url, **kwargs))
+
+    async def close(self):
+        self.closed = True
+
+
+class _Pending(object):
+    # aiohttp requests are used as "async with session.request(...)"
+    def __init__(self, coro):
+        self._coro = coro
+
+    async def __aenter__(self):
+        return await self._coro
+
+    async def __aexit__(self, exc_type, exc_value, tb):
+        pass
+
+
+MISSING_REF = 'tsig/ZG5z999:missing'
+
+
+class AioConnectorTest(common.HeatTestCase):
+    def setUp(self):
+        super(AioConnectorTest, self).setUp()
+        self.useFixture(fakes.Registries())
+        self.wapi = fakes.FakeWapi()
+        self.loop = asyncio.new_event_loop()
+        self.addCleanup(self.loop.close)
+
+    def make_connector(self, statuses=(), **options):
+        opts = {'url': fakes.WAPI_URL, 'username': 'admin',
+                'password': 'infoblox', 'restart_debounce_delay': 0}
+        opts.update(options)
+        self.session = FakeAioSession(self.wapi, statuses)
+        return aio_connector.Infoblox(opts, session=self.session)
+
+    def run_async(self, coro):
+        return self.loop.run_until_complete(coro)
+
+    def test_object_lifecycle(self):
+        conn = self.make_connector()
+        ref = self.run_async(conn.create_object('tsig', {'name': 'key',
+                                                         'key': 'c2VjcmV0'}))
+        self.assertEqual([{'_ref': ref, 'name': 'key'}],
+                         self.run_async(conn.get_object(
+                             'tsig', {'name': 'key'}, ['name'])))
+        self.run_async(conn.update_object(ref, {'key': 'bmV3'}))
+        self.assertEqual('bmV3', self.wapi.search('tsig')[0]['key'])
+        self.run_async(conn.delete_object(ref))
+        self.assertEqual([], self.run_async(conn.get_all_objects('tsig')))
+
+    def test_file_transfers(self):
+        conn = self.make_connector()
+        token = self.run_async(conn.upload_file(b'header-member,name\n'))
+        self.assertEqual(b'header-member,name\n', self.wapi.files[token])
+        self.assertEqual({'POST fileop': 1,
+                          'POST fileop?_function=uploadinit': 1},
+                         self.session.sync.call_counts())
+
+        url = self.wapi._new_file('errors.csv', b'errors')['url']
+        self.assertEqual(b'errors', self.run_async(conn.download_file(url)))
+        missing = self.wapi.base_url + self.wapi.FILE_PATH + 'missing/log'
+        self.assertRaises(exc.InfobloxFileTransferError, self.run_async,
+                          conn.download_file(missing))
+
+    def test_same_exceptions(self):
+        conn = self.make_connector()
+        self.run_async(conn.create_object('tsig', {'name': 'key'}))
+        self.assertRaises(exc.InfobloxCannotCreateObject, self.run_async,
+                          conn.create_object('tsig', {'name': 'key'}))
+        self.assertRaises(exc.InfobloxCannotDeleteObject, self.run_async,
+                          conn.delete_object(MISSING_REF))
+        self.assertRaises(exc.InfobloxFuncException, self.run_async,
+                          conn.call_func('unknown', MISSING_REF, {}))
+
+    def test_searches_are_retried(self):
+        conn = self.make_connector(statuses=[503, 429])
+        backoff = self.patchobject(conn.retry_policy, 'backoff',
+                                   return_value=0)
+        self.assertEqual([], self.run_async(conn.get_object('tsig')))
+        self.assertEqual(3, len(self.session.sync.calls))
+        self.assertEqual(2, backoff.call_count)
+
+    def test_read_only_functions_are_retried(self):
+        conn = self.make_connector()
+        backoff = self.patchobject(conn.retry_policy, 'backoff',
+                                   return_value=0)
+        ref = self.run_async(conn.create_object('member', {'host_name': 'm'}))
+        self.session.statuses = [503]
+        self.run_async(conn.call_func('read_token', ref, {}))
+        self.assertEqual(3, len(self.session.sync.calls))
+        self.assertEqual(1, backoff.call_count)
+
+    def test_writes_are_not_retried(self):
+        conn = self.make_connector(statuses=[503])
+        self.assertRaises(exc.InfobloxCannotCreateObject, self.run_async,
+                          conn.create_object('tsig', {'name': 'key'}))
+        self.assertEqual(1, len(self.session.sync.calls))
+
+    def test_fan_out_is_bounded(self):
+        conn = self.make_connector(max_concurrent_writes=3)
+        calls = [functools.partial(conn.create_object, 'tsig',
+                                   {'name': 'key%02d' % i})
+                 for i in range(20)]
+        refs = self.run_async(aio_connector.fan_out(calls, limit=10))
+        self.assertEqual(['key%02d' % i for i in range(20)],
+                         [ref.split(':', 1)[1] for ref in refs])
+        self.assertEqual(3, self.session.max_in_flight)
+
+    def test_fan_out_cancels_on_error(self):
+        conn = self.make_connector()
+        cancelled = []
+
+        async def slow(i):
+            try:
+                await asyncio.sleep(10)
+            except asyncio.CancelledError:
+                cancelled.append(i)
+                raise
+
+        calls = ([functools.partial(slow, i) for i in range(3)] +
+                 [functools.partial(conn.delete_object, MISSING_REF)])
+        self.assertRaises(exc.InfobloxCannotDeleteObject, self.run_async,
+                          aio_connector.fan_out(calls))
+        # the calls still running were cancelled before the error is raised
+        self.assertEqual([0, 1, 2], sorted(cancelled))
+
+    def test_close(self):
+        conn = self.make_connector()
+        self.run_async(conn.close())
+        self.assertTrue(self.session.closed)
+        self.assertIsNone(conn.session)
+
+    def test_manipulator_on_blocking_connector(self):
+        conn = self.make_connector()
+        ready = threading.Event()
+
+        def run_loop():
+            asyncio.set_event_loop(self.loop)
+            self.loop.call_soon(ready.set)
+            self.loop.run_forever()
+
+        thread = threading.Thread(target=run_loop)
+        thread.start()
+        ready.wait()
+        try:
+            ib = object_manipulator.InfobloxObjectManipulator(
+                aio_connector.BlockingConnector(conn, self.loop))
+            self.assertEqual((2, 0), ib.create_tsigs({'a': 'c2VjcmV0',
+                                                      'b': 'c2VjcmV0'}))
+        finally:
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            thread.join()
+        self.assertEqual(['a', 'b'],
+                         sorted(t['name'] for t in self.wapi.search('tsig')))
@@ -0,0 +1,199 @@
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import eventlet
+eventlet.monkey_patch()
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+from oslo_config import cfg
+
+from heat.engine import resources
+from heat.engine import stack
+from heat.engine import template
+from heat.tests import utils
+
+import heat_infoblox
+from heat_infoblox.tests.benchmarks import common
+from heat_infoblox.tests import fake_wapi_server
+
+"""Benchmark of an autoscaling group of grid members.
+
+Each instance of the group is a GridMember and its NameServerGroupMember,
+created and deleted in that order, the way a nested autoscaling stack does.
+All the instances of a group are scaled out, then in, concurrently on
+eventlet green threads against an in-process fake WAPI and a fake Neutron.
+For every group size this reports the wall time, the p50 and p99 latency of
+an instance, the number of WAPI calls and the peak memory allocated during
+the phase (traced with tracemalloc where available).
+
+After each phase the name server group must list all the instances as
+grid secondaries, then none of them. Memberships lost by concurrent updates
+of the group count as errors, and make the benchmark exit with status 1.
+Run it with
+
+    python -m heat_infoblox.tests.benchmarks.autoscale --latency 0.02
+"""
+
+LOG = logging.getLogger(__name__)
+
+SIZES = (1, 10, 100, 500)
+
+NS_GROUP = 'autoscale'
+
+
+class FakeNeutron(object):
+    """Answers the port and subnet lookups of the grid members."""
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+
+    def show_port(self, port_id):
+        time.sleep(self.latency)
+        i = int(port_id.rsplit('-', 1)[1])
+        ip = '10.%d.%d.%d' % (i >> 16 & 255, i >> 8 & 255, i & 255)
+        return {'port': {'fixed_ips': [{'ip_address': ip,
+                                        'subnet_id': 'subnet-1'}]}}
+
+    def show_subnet(self, subnet_id):
+        time.sleep(self.latency)
+        return {'subnet': {'cidr': '10.0.0.0/8', 'gateway_ip': '10.0.0.1'}}
+
+
+def make_template(size, url):
+    connection = {'url': url, 'username': 'admin', 'password': 'infoblox',
+                  'sslverify': False}
+    tmpl_resources = {}
+    for i in range(size):
+        name = 'member-%d.example.com' % i
+        tmpl_resources['member-%d' % i] = {
+            'type': 'Infoblox::Grid::Member',
+            'properties': {'connection': connection,
+                           'name': name,
+                           'model': 'IB-VM-820',
+                           'licenses': ['vnios', 'dns'],
+                           'LAN1': 'port-%d' % i,
+                           'gm_ip': '10.0.0.2',
+                           'gm_certificate': 'certificate',
+                           'dns': {'enable': True}}}
+        tmpl_resources['ns-member-%d' % i] = {
+            'type': 'Infoblox::Grid::NameServerGroupMember',
+            'properties': {'connection': connection,
+                           'group_name': NS_GROUP,
+                           'member_server': {'name': name},
+                           'member_role': 'grid_secondary'}}
+    return {'heat_template_version': '2013-05-23',
+            'resources': tmpl_resources}
+
+
+def make_instances(size, url, neutron):
+    stk = stack.Stack(utils.dummy_context(), 'autoscale_benchmark_%d' % size,
+                      template.Template(make_template(size, url)))
+    instances = []
+    for i in range(size):
+        member = stk['member-%d' % i]
+        member.client = lambda name: neutron
+        instances.append((member, stk['ns-member-%d' % i]))
+    return instances
+
+
+def scale_out(instance):
+    member, ns_member = instance
+    member.handle_create()
+    ns_member.handle_create()
+
+
+def scale_in(instance):
+    member, ns_member = instance
+    ns_member.handle_delete()
+    member.handle_delete()
+
+
+def run_phase(name, action, instances, server, concurrency, expected):
+    server.calls.clear()
+    result = common.run_concurrently(action, instances, concurrency,
+                                     trace_memory=True)
+    group = server.wapi.search('nsgroup', {'name': NS_GROUP})[0]
+    members = len(group['grid_secondaries'])
+    lost = abs(expected - members)
+    if lost:
+        LOG.warning("%s of %d instances: the name server group has %d "
+                    "secondaries instead of %d", name, len(instances),
+                    members, expected)
+    result.update(phase=name, size=len(instances),
+                  calls=sum(server.calls.values()),
+                  errors=result['errors'] + lost,
+                  ns_group_members=members, lost=lost)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark an autoscaling group of grid members.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES,
+                        help='Group sizes to benchmark.')
+    parser.add_argument('--concurrency', type=int,
+                        help='Maximum number of instances scaled at once '
+                             '(default: the group size).')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Seconds added to every WAPI response.')
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--neutron-latency', type=float, default=0.0)
+    parser.add_argument('--json', action='store_true',
+                        help='Print the results as JSON.')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    cfg.CONF.import_opt('plugin_dirs', 'heat.common.config')
+    cfg.CONF.set_override('plugin_dirs',
+                          os.path.dirname(heat_infoblox.__file__))
+    resources.initialise()
+
+    faults = fake_wapi_server.Faults(args.latency, args.jitter,
+                                     args.error_rate, seed=0)
+    server = fake_wapi_server.FakeWapiServer(faults=faults).start()
+    neutron = FakeNeutron(args.neutron_latency)
+    results = []
+    try:
+        for size in args.sizes:
+            server.wapi.add('nsgroup', {'name': NS_GROUP,
+                                        'grid_primary': [{'name': 'gm'}],
+                                        'grid_secondaries': []})
+            instances = make_instances(size, server.url, neutron)
+            concurrency = args.concurrency or size
+            results.append(run_phase('scale-out', scale_out, instances,
+                                     server, concurrency, size))
+            results.append(run_phase('scale-in', scale_in, instances,
+                                     server, concurrency, 0))
+            server.wapi.objects.clear()
+    finally:
+        server.stop()
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+    else:
+        common.print_table(results, extra=('ns_group_members', 'lost'))
+    return 1 if any(result['lost'] for result in results) else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,98 @@
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import logging
+import math
+import time
+
+import eventlet
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+"""Helpers shared by the benchmarks."""
+
+LOG = logging.getLogger(__name__)
+
+# Name, width and conversion of the columns of the result table
+COLUMNS = (
+    ('phase', -10, 's'),
+    ('size', 6, 'd'),
+    ('wall_s', 9, '.3f'),
+    ('p50_ms', 9, '.1f'),
+    ('p99_ms', 9, '.1f'),
+    ('calls', 7, 'd'),
+    ('errors', 6, 'd'),
+    ('peak_mib', 9, '.1f'),
+)
+
+
+def percentile(values, pct):
+    """Return the nearest-rank percentile of a list of numbers."""
+    if not values:
+        return 0.0
+    values = sorted(values)
+    rank = int(math.ceil(pct / 100.0 * len(values)))
+    return values[min(max(rank - 1, 0), len(values) - 1)]
+
+
+def run_concurrently(action, items, concurrency, trace_memory=False):
+    """Call action(item) for all items on a pool of green threads.
+
+    Returns the wall time, the latency percentiles of the calls, the number
+    of calls which raised and the peak memory allocated while running.
+    """
+    latencies = []
+    errors = [0]
+
+    def timed(item):
+        started = time.time()
+        try:
+            action(item)
+        except Exception as e:
+            errors[0] += 1
+            LOG.debug("%s failed: %s", action.__name__, e)
+        latencies.append(time.time() - started)
+
+    if trace_memory and tracemalloc is not None:
+        tracemalloc.start()
+    started = time.time()
+    pool = eventlet.GreenPool(max(concurrency, 1))
+    for item in items:
+        pool.spawn_n(timed, item)
+    pool.waitall()
+    wall = time.time() - started
+    peak = 0
+    if trace_memory and tracemalloc is not None:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return {'wall_s': wall,
+            'p50_ms': percentile(latencies, 50) * 1000,
+            'p99_ms': percentile(latencies, 99) * 1000,
+            'errors': errors[0],
+            'peak_mib': peak / 1048576.0}
+
+
+def print_table(results, columns=COLUMNS, extra=()):
+    """Print results as a table, with the extra keys as last columns."""
+    print(' '.join(['%*s' % (width, name) for name, width, conv in columns] +
+                   list(extra)))
+    for result in results:
+        print(' '.join([('%*' + conv) % (width, result[name])
+                        for name, width, conv in columns] +
+                       [str(result.get(name, '')) for name in extra]))
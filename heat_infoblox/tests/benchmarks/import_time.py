@@ -0,0 +1,131 @@
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import argparse
+import json
+import subprocess
+import sys
+
+from heat_infoblox.tests.benchmarks import common
+
+"""Benchmark of the time taken by heat-engine to load the plugins.
+
+Every plugin module is imported in a new interpreter, after the Heat modules
+it builds on, as the engine does at startup. This reports the median time of
+the import over a number of runs, the number of modules it loaded, and which
+of the dependencies only needed by resource actions were loaded with it.
+Run it with
+
+    python -m heat_infoblox.tests.benchmarks.import_time --runs 5
+"""
+
+PLUGINS = (
+    'heat_infoblox.resources.address_block',
+    'heat_infoblox.resources.grid_member',
+    'heat_infoblox.resources.nameserver_group_member',
+    'heat_infoblox.resources.netmri_job',
+    'heat_infoblox.resources.record_set',
+)
+
+# Modules which must not be loaded until a resource action needs them
+DEFERRED = (
+    'cProfile',
+    'heat_infoblox.connector',
+    'heat_infoblox.object_manipulator',
+    'infoblox_netmri',
+    'netaddr',
+    'osprofiler',
+    'requests',
+    'tracemalloc',
+)
+
+COLUMNS = (
+    ('plugin', -24, 's'),
+    ('import_ms', 10, '.1f'),
+    ('modules', 8, 'd'),
+    ('deferred_loaded', -40, 's'),
+)
+
+# Imported before the plugins, as heat-engine has loaded them already
+HEAT_MODULES = (
+    'heat.common.exception',
+    'heat.common.i18n',
+    'heat.engine.attributes',
+    'heat.engine.constraints',
+    'heat.engine.properties',
+    'heat.engine.resource',
+    'heat.engine.support',
+)
+
+CHILD = '''
+import importlib
+import json
+import sys
+import time
+
+for name in %(heat)r:
+    importlib.import_module(name)
+before = set(sys.modules)
+started = time.time()
+for name in %(plugins)r:
+    importlib.import_module(name)
+elapsed = time.time() - started
+loaded = set(sys.modules) - before
+json.dump({'elapsed': elapsed,
+           'modules': len(loaded),
+           'deferred': sorted(m for m in %(deferred)r if m in loaded)},
+          sys.stdout)
+'''
+
+
+def measure(plugins):
+    """Import plugins in a new interpreter and return what it took."""
+    code = CHILD % {'heat': HEAT_MODULES, 'plugins': tuple(plugins),
+                    'deferred': DEFERRED}
+    out = subprocess.check_output([sys.executable, '-c', code])
+    return json.loads(out.decode('utf-8'))
+
+
+def run(label, plugins, runs):
+    samples = [measure(plugins) for i in range(runs)]
+    return {'plugin': label,
+            'import_ms': common.percentile(
+                [s['elapsed'] for s in samples], 50) * 1000,
+            'modules': samples[0]['modules'],
+            'deferred_loaded': ','.join(samples[0]['deferred']) or '-'}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark the import time of the plugin modules.')
+    parser.add_argument('--runs', type=int, default=5,
+                        help='Number of interpreters started per plugin.')
+    parser.add_argument('--json', action='store_true',
+                        help='Print the results as JSON.')
+    args = parser.parse_args(argv)
+
+    results = [run(name.rsplit('.', 1)[1], [name], args.runs)
+               for name in PLUGINS]
+    results.append(run('all', PLUGINS, args.runs))
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+    else:
+        common.print_table(results, COLUMNS)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+from oslo_config import cfg
+
+from heat.engine import resources
+from heat.engine import stack
+from heat.engine import template
+from heat.tests import utils
+
+import heat_infoblox
+from heat_infoblox.tests.benchmarks import common
+from heat_infoblox.tests import fake_netmri_server
+from heat_infoblox.tests import fake_wapi_server
+
+"""Benchmark of NetMRIJob device resolution and job polling.
+
+For every target list size, a NetMRIJob targeting that many devices by IP
+address and network view is run against an in-process fake NetMRI. This
+reports the time spent resolving the targets to device IDs, the time to
+start the job, and the number and mean duration of the polls made until the
+job completes. Run it with
+
+    python -m heat_infoblox.tests.benchmarks.netmri_jobs --job-duration 2
+"""
+
+LOG = logging.getLogger(__name__)
+
+SIZES = (10, 100, 1000, 10000)
+
+COLUMNS = (
+    ('targets', 7, 'd'),
+    ('resolve_s', 9, '.3f'),
+    ('resolve_kib', 11, '.1f'),
+    ('create_s', 9, '.3f'),
+    ('polls', 6, 'd'),
+    ('poll_ms', 9, '.1f'),
+    ('wait_s', 8, '.3f'),
+    ('calls', 6, 'd'),
+)
+
+
+def make_job(netmri, size, url):
+    targets = [netmri.target(i) for i in range(size)]
+    tmpl = {
+        'heat_template_version': '2013-05-23',
+        'resources': {
+            'job': {
+                'type': 'Infoblox::NetMRI::Job',
+                'properties': {
+                    'connection': {'url': url, 'username': 'admin',
+                                   'password': 'netmri'},
+                    'source': {'script': 'Benchmark Script'},
+                    'targets': targets,
+                }
+            }
+        }
+    }
+    stk = stack.Stack(utils.dummy_context(), 'netmri_benchmark_%d' % size,
+                      template.Template(tmpl))
+    return stk['job']
+
+
+def run(server, size, poll_interval):
+    job = make_job(server.netmri, size, server.url)
+    server.reset()
+
+    started = time.time()
+    device_ids = job._device_ids()
+    resolved = time.time()
+    resolve_kib = server.bytes_sent / 1024.0
+    if len(device_ids) != size:
+        LOG.warning("Resolved %d devices out of %d", len(device_ids), size)
+
+    job.handle_create()
+    created = time.time()
+
+    polls = 0
+    poll_time = 0.0
+    while True:
+        polled = time.time()
+        done = job.check_create_complete(None)
+        poll_time += time.time() - polled
+        polls += 1
+        if done:
+            break
+        time.sleep(poll_interval)
+
+    return {'targets': size,
+            'resolve_s': resolved - started,
+            'resolve_kib': resolve_kib,
+            # handle_create resolves the devices again
+            'create_s': created - resolved,
+            'polls': polls,
+            'poll_ms': poll_time / polls * 1000,
+            'wait_s': time.time() - created,
+            'calls': sum(server.calls.values())}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark NetMRI job device resolution and polling.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=SIZES,
+                        help='Target list sizes to benchmark.')
+    parser.add_argument('--views', type=int, default=4,
+                        help='Number of network views in the inventory.')
+    parser.add_argument('--job-duration', type=float, default=1.0,
+                        help='Seconds a job takes to complete.')
+    parser.add_argument('--poll-interval', type=float, default=0.1,
+                        help='Seconds between two polls of the job.')
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Seconds added to every NetMRI response.')
+    parser.add_argument('--json', action='store_true',
+                        help='Print the results as JSON.')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    cfg.CONF.import_opt('plugin_dirs', 'heat.common.config')
+    cfg.CONF.set_override('plugin_dirs',
+                          os.path.dirname(heat_infoblox.__file__))
+    resources.initialise()
+
+    netmri = fake_netmri_server.FakeNetMRI(max(args.sizes), args.views,
+                                           args.job_duration)
+    faults = fake_wapi_server.Faults(args.latency)
+    server = fake_netmri_server.FakeNetMRIServer(netmri=netmri,
+                                                 faults=faults).start()
+    try:
+        results = [run(server, size, args.poll_interval)
+                   for size in args.sizes]
+    finally:
+        server.stop()
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+    else:
+        common.print_table(results, COLUMNS)
+
+
+if __name__ == '__main__':
+    main()
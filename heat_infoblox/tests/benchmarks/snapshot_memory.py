@@ -0,0 +1,136 @@
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import argparse
+import gc
+import json
+import sys
+import time
+
+from heat_infoblox import snapshot
+from heat_infoblox.tests.benchmarks import common
+
+"""Benchmark of the memory used by the grid snapshot.
+
+Objects of each type kept in the snapshot are generated as the WAPI returns
+them, then held either as the decoded JSON response (lists and dicts) or in
+a snapshot. This reports the memory used by each per 10,000 objects and the
+median time of a lookup by name. Run it with
+
+    python -m heat_infoblox.tests.benchmarks.snapshot_memory --count 10000
+"""
+
+COLUMNS = (
+    ('objtype', -8, 's'),
+    ('count', 7, 'd'),
+    ('raw_mib_10k', 12, '.2f'),
+    ('snapshot_mib_10k', 17, '.2f'),
+    ('ratio', 6, '.2f'),
+    ('lookup_us', 10, '.1f'),
+)
+
+# Number of members in each generated name server group
+GROUP_SIZE = 4
+
+
+def make_objects(objtype, count):
+    """Return count objects of a type, as decoded from a WAPI response."""
+    objects = []
+    for i in range(count):
+        ref = '%s/ZG5zLm9iamVjdCQ%d:object-%d' % (objtype, i, i)
+        if objtype == 'member':
+            objects.append({
+                '_ref': ref, 'host_name': 'member-%d.example.com' % i,
+                'platform': 'VNIOS',
+                'vip_setting': {'address': '10.%d.%d.%d' % (
+                    i >> 16 & 255, i >> 8 & 255, i & 255),
+                    'subnet_mask': '255.0.0.0', 'gateway': '10.0.0.1'}})
+        elif objtype == 'nsgroup':
+            members = [{'name': 'member-%d.example.com' % ((i + j) % count),
+                        'stealth': False}
+                       for j in range(GROUP_SIZE)]
+            objects.append({'_ref': ref, 'name': 'group-%d' % i,
+                            'grid_primary': members[:1],
+                            'grid_secondaries': members[1:]})
+        else:
+            objects.append({'_ref': ref, 'name': 'view-%d' % i,
+                            'network_view': 'default'})
+    # Decode them from JSON as the connector does, so that no string is
+    # shared between the objects unless the snapshot makes it so
+    return json.loads(json.dumps(objects))
+
+
+def traced(build):
+    """Return what build() returns and the memory it still holds."""
+    gc.collect()
+    common.tracemalloc.start()
+    try:
+        result = build()
+        gc.collect()
+        size = common.tracemalloc.get_traced_memory()[0]
+    finally:
+        common.tracemalloc.stop()
+    return result, size
+
+
+def run(objtype, count, lookups=1000):
+    data = json.dumps(make_objects(objtype, count))
+    raw, raw_size = traced(lambda: json.loads(data))
+
+    def build():
+        snap = snapshot.Snapshot(ttl=3600)
+        snap.lookup(objtype, lambda objtype, fields: json.loads(data), '-')
+        return snap
+    snap, snap_size = traced(build)
+    del raw
+
+    name_field = snapshot.NAME_FIELDS[objtype]
+    names = [o[name_field] for o in json.loads(data)[:lookups]]
+    samples = []
+    for name in names:
+        started = time.time()
+        snap.lookup(objtype, None, name, snapshot.FIELDS[objtype])
+        samples.append(time.time() - started)
+
+    per_10k = 10000.0 / count / 1048576
+    return {'objtype': objtype, 'count': count,
+            'raw_mib_10k': raw_size * per_10k,
+            'snapshot_mib_10k': snap_size * per_10k,
+            'ratio': float(snap_size) / raw_size,
+            'lookup_us': common.percentile(samples, 50) * 1e6}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark the memory used by the grid snapshot.')
+    parser.add_argument('--count', type=int, default=10000,
+                        help='Number of objects of each type.')
+    parser.add_argument('--json', action='store_true',
+                        help='Print the results as JSON.')
+    args = parser.parse_args(argv)
+    if common.tracemalloc is None:
+        parser.error('tracemalloc is required')
+
+    results = [run(objtype, args.count) for objtype in sorted(snapshot.FIELDS)]
+
+    if args.json:
+        json.dump(results, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
+    else:
+        common.print_table(results, COLUMNS)
+
+
+if __name__ == '__main__':
+    main()
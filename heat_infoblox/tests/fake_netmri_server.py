@@ -0,0 +1,319 @@
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import argparse
+import collections
+import itertools
+import json
+import logging
+import random
+import threading
+import time
+
+import six
+from six.moves import BaseHTTPServer
+from six.moves import socketserver
+from six.moves.urllib import parse
+
+from heat_infoblox.tests import fake_wapi_server
+
+"""A fake NetMRI API, for benchmarks and functional tests.
+
+It implements the calls made by the NetMRIJob resource against a synthetic
+inventory of devices spread over a number of network views. Jobs complete a
+configurable time after they are started. Run it with
+
+    python -m heat_infoblox.tests.fake_netmri_server --port 8444 \\
+        --devices 10000 --views 4 --job-duration 30
+"""
+
+LOG = logging.getLogger(__name__)
+
+API_VERSION = '3.0'
+
+
+def _as_list(value):
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple)):
+        return value
+    return [value]
+
+
+def _select(objs, select):
+    if not select:
+        return objs
+    if isinstance(select, six.string_types):
+        select = select.split(',')
+    return [dict((k, obj[k]) for k in select if k in obj) for obj in objs]
+
+
+class FakeNetMRI(object):
+    """An in-memory NetMRI inventory and job scheduler.
+
+    Device i has the DeviceID i + 1 and lives in view i % views + 1. Devices
+    in different views may share their IP address, as the IPs are assigned
+    per view.
+    """
+
+    def __init__(self, devices=1000, views=1, job_duration=0.0,
+                 job_jitter=0.0, seed=None):
+        self.views = [{'VirtualNetworkID': v + 1,
+                       'VirtualNetworkName': 'view-%d' % v if v else 'default'}
+                      for v in range(views)]
+        self.devices = []
+        self._by_ip = collections.defaultdict(list)
+        self._by_id = {}
+        for i in range(devices):
+            n = i // views
+            device = {'DeviceID': i + 1,
+                      'DeviceName': 'device-%d' % (i + 1),
+                      'DeviceIPDotted': '10.%d.%d.%d' % (n >> 16 & 255,
+                                                         n >> 8 & 255,
+                                                         n & 255),
+                      'VirtualNetworkID': i % views + 1}
+            self.devices.append(device)
+            self._by_ip[device['DeviceIPDotted']].append(device)
+            self._by_id[device['DeviceID']] = device
+
+        self.job_duration = job_duration
+        self.job_jitter = job_jitter
+        self.jobs = {}
+        self._job_ids = itertools.count(1)
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def target(self, i):
+        """Return the target property of the NetMRIJob for device i."""
+        device = self.devices[i]
+        view = self.views[device['VirtualNetworkID'] - 1]
+        return {'device_ip_address': device['DeviceIPDotted'],
+                'network_view': view['VirtualNetworkName']}
+
+    def handle(self, method, path, body):
+        """Serve one API call. Returns (status code, response data)."""
+        with self._lock:
+            if method == 'POST' and path in self.METHODS:
+                return self.METHODS[path](self, body or {})
+            if method == 'GET' and path.startswith('jobs/'):
+                return self._show_job(path.split('/', 1)[1])
+            return 404, {'message': 'Unknown API method %s' % path}
+
+    def _search_views(self, params):
+        names = _as_list(params.get('VirtualNetworkName'))
+        views = [v for v in self.views
+                 if names is None or v['VirtualNetworkName'] in names]
+        return 200, {'virtual_networks': _select(views,
+                                                 params.get('select'))}
+
+    def _index_devices(self, params):
+        ips = _as_list(params.get('DeviceIPDotted'))
+        ids = _as_list(params.get('DeviceID'))
+        views = _as_list(params.get('VirtualNetworkID'))
+        if ips is not None:
+            devices = [d for ip in ips for d in self._by_ip.get(ip, ())]
+        elif ids is not None:
+            devices = [self._by_id[int(i)] for i in ids
+                       if int(i) in self._by_id]
+        else:
+            devices = list(self.devices)
+        if views is not None:
+            views = set(int(v) for v in views)
+            devices = [d for d in devices if d['VirtualNetworkID'] in views]
+        return 200, {'devices': _select(devices, params.get('select'))}
+
+    def _run_script(self, params):
+        if not params.get('id') and not params.get('name'):
+            return 400, {'message': 'A script id or name is required'}
+        device_ids = [int(i) for i in params.get('device_ids') or []]
+        unknown = [i for i in device_ids if i not in self._by_id]
+        if unknown:
+            return 400, {'message': 'Unknown devices %s' % unknown}
+        job_id = next(self._job_ids)
+        duration = max(0.0, self.job_duration +
+                       self._random.uniform(-self.job_jitter,
+                                            self.job_jitter))
+        self.jobs[job_id] = {'id': job_id,
+                             'started': time.time(),
+                             'duration': duration,
+                             'device_ids': device_ids}
+        return 200, {'JobID': job_id}
+
+    def _job(self, job):
+        done = time.time() - job['started'] >= job['duration']
+        completed_at = None
+        if done:
+            completed_at = time.strftime(
+                '%Y-%m-%d %H:%M:%S',
+                time.gmtime(job['started'] + job['duration']))
+        return {'id': job['id'],
+                'status': 'OK' if done else 'Running',
+                'started_at': time.strftime('%Y-%m-%d %H:%M:%S',
+                                            time.gmtime(job['started'])),
+                'completed_at': completed_at}
+
+    def _show_job(self, job_id):
+        job = self.jobs.get(int(job_id))
+        if job is None:
+            return 404, {'message': 'Job %s not found' % job_id}
+        return 200, {'job': self._job(job)}
+
+    def _index_job_details(self, params):
+        job = self.jobs.get(int(params.get('id') or 0))
+        if job is None:
+            return 404, {'message': 'Job %s not found' % params.get('id')}
+        status = self._job(job)['status']
+        return 200, {'job_details': [{'JobID': job['id'],
+                                      'DeviceID': i,
+                                      'Status': status}
+                                     for i in job['device_ids']]}
+
+    METHODS = {
+        'virtual_networks/search': _search_views,
+        'devices/index': _index_devices,
+        'scripts/run': _run_script,
+        'job_details/index': _index_job_details,
+    }
+
+
+class FakeNetMRIHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # as for fake_wapi_server.FakeWapiHandler, do not delay the body of
+    # kept-alive responses until the client ACKs the headers
+    disable_nagle_algorithm = True
+
+    def _serve(self):
+        server = self.server
+        length = int(self.headers.get('Content-Length') or 0)
+        data = self.rfile.read(length) if length else None
+
+        path = parse.unquote(parse.urlparse(self.path).path)
+        prefix = '/api/%s/' % API_VERSION
+        path = path[len(prefix):]
+
+        time.sleep(server.faults.delay())
+        if server.faults.should_fail():
+            status = server.faults.error_status
+            response = {'message': 'Injected error'}
+        else:
+            try:
+                body = json.loads(data.decode('utf-8')) if data else None
+            except ValueError:
+                status, response = 400, {'message': 'Invalid JSON'}
+            else:
+                status, response = server.netmri.handle(self.command, path,
+                                                        body)
+
+        content = json.dumps(response).encode('utf-8')
+        server.count(self.command, path.split('/', 1)[0]
+                     if self.command == 'GET' else path, len(content))
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    do_GET = do_POST = _serve
+
+    def log_message(self, fmt, *args):
+        LOG.debug(fmt, *args)
+
+
+class FakeNetMRIServer(socketserver.ThreadingMixIn,
+                       BaseHTTPServer.HTTPServer):
+    """A threaded HTTP server answering NetMRI calls from a FakeNetMRI.
+
+    The number of requests received is kept in 'calls', keyed by method and
+    API path, e.g. 'POST devices/index' or 'GET jobs', and the size of the
+    responses in 'bytes_sent'.
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address=('127.0.0.1', 0), netmri=None, faults=None):
+        BaseHTTPServer.HTTPServer.__init__(self, address, FakeNetMRIHandler)
+        self.netmri = netmri or FakeNetMRI()
+        self.faults = faults or fake_wapi_server.Faults()
+        self.calls = collections.Counter()
+        self.bytes_sent = 0
+        self._calls_lock = threading.Lock()
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return 'http://%s:%d/api/%s' % (host, port, API_VERSION)
+
+    def count(self, method, path, size):
+        with self._calls_lock:
+            self.calls['%s %s' % (method, path)] += 1
+            self.bytes_sent += size
+
+    def reset(self):
+        with self._calls_lock:
+            self.calls.clear()
+            self.bytes_sent = 0
+
+    def start(self):
+        """Serve in a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve a fake NetMRI API.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8444)
+    parser.add_argument('--devices', type=int, default=1000,
+                        help='Number of devices in the inventory.')
+    parser.add_argument('--views', type=int, default=1,
+                        help='Number of network views.')
+    parser.add_argument('--job-duration', type=float, default=0.0,
+                        help='Seconds a job takes to complete.')
+    parser.add_argument('--job-jitter', type=float, default=0.0)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Seconds added to every response.')
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    netmri = FakeNetMRI(args.devices, args.views, args.job_duration,
+                        args.job_jitter, args.seed)
+    faults = fake_wapi_server.Faults(args.latency, args.jitter,
+                                     args.error_rate, seed=args.seed)
+    server = FakeNetMRIServer((args.host, args.port), netmri=netmri,
+                              faults=faults)
+    LOG.info("Serving a fake NetMRI API at %s", server.url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
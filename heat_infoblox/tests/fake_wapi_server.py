@@ -0,0 +1,237 @@
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import argparse
+import collections
+import email
+import json
+import logging
+import random
+import ssl
+import threading
+import time
+
+from six.moves import BaseHTTPServer
+from six.moves import socketserver
+from six.moves.urllib import parse
+
+from heat_infoblox.tests import fakes
+
+"""A fake WAPI served over HTTP(S), for benchmarks and functional tests.
+
+The objects are kept in a fakes.FakeWapi. Every response can be delayed by
+a fixed latency plus a random jitter, and a share of the requests can be
+answered with an error status instead, to exercise pooling, batching and
+retries against something closer to a real grid than a mock. Run it with
+
+    python -m heat_infoblox.tests.fake_wapi_server --port 8443 \\
+        --latency 0.05 --jitter 0.02 --error-rate 0.01
+
+and point the 'wapi_url' of the resources at the URL it prints.
+"""
+
+LOG = logging.getLogger(__name__)
+
+WAPI_VERSION = 'v2.3'
+
+
+class Faults(object):
+    """Latency and errors injected into the responses."""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0,
+                 error_status=503, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def delay(self):
+        with self._lock:
+            jitter = self._random.uniform(-self.jitter, self.jitter)
+        return max(0.0, self.latency + jitter)
+
+    def should_fail(self):
+        if not self.error_rate:
+            return False
+        with self._lock:
+            return self._random.random() < self.error_rate
+
+
+def uploaded_file(content_type, data):
+    """Return the content of the file of a multipart/form-data body."""
+    message = b'Content-Type: ' + content_type.encode('ascii') + b'\r\n\r\n'
+    parse_bytes = getattr(email, 'message_from_bytes',
+                          email.message_from_string)
+    for part in parse_bytes(message + data).get_payload():
+        if part.get_filename():
+            return part.get_payload(decode=True)
+    return None
+
+
+class FakeWapiHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # The headers and the body are separate writes; with Nagle's algorithm
+    # the body of each kept-alive response waits for a delayed ACK (~40ms)
+    disable_nagle_algorithm = True
+
+    def _send(self, status, response):
+        if isinstance(response, bytes):
+            content, content_type = response, 'application/octet-stream'
+        else:
+            content = json.dumps(response).encode('utf-8')
+            content_type = 'application/json'
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        self.wfile.write(content)
+
+    def _transfer(self, path, data):
+        server = self.server
+        server.count(self.command, 'fileop')
+        time.sleep(server.faults.delay())
+        if data is not None:
+            data = uploaded_file(self.headers.get('Content-Type', ''), data)
+        self._send(*server.wapi.transfer(self.command, path, data))
+
+    def _serve(self):
+        server = self.server
+        length = int(self.headers.get('Content-Length') or 0)
+        data = self.rfile.read(length) if length else None
+
+        parsed = parse.urlparse(self.path)
+        path = parse.unquote(parsed.path)
+        if path.startswith(server.wapi.FILE_PATH):
+            return self._transfer(path, data)
+        prefix = '/wapi/%s/' % WAPI_VERSION
+        query = dict(parse.parse_qsl(parsed.query))
+        server.count(self.command, path[len(prefix):].split('/', 1)[0],
+                     query.get('_function'))
+
+        time.sleep(server.faults.delay())
+        if not path.startswith(prefix):
+            status, response = 404, {'Error': 'AdmConProtoError: Unknown '
+                                              'WAPI version'}
+        elif server.faults.should_fail():
+            status = server.faults.error_status
+            response = {'Error': 'AdmConProtoError: Injected error'}
+        else:
+            try:
+                body = json.loads(data.decode('utf-8')) if data else None
+            except ValueError:
+                status, response = 400, {'Error': 'AdmConProtoError: '
+                                                  'Invalid JSON'}
+            else:
+                status, response = server.wapi.handle(
+                    self.command, path[len(prefix):], query, body)
+        self._send(status, response)
+
+    do_GET = do_POST = do_PUT = do_DELETE = _serve
+
+    def log_message(self, fmt, *args):
+        LOG.debug(fmt, *args)
+
+
+class FakeWapiServer(socketserver.ThreadingMixIn,
+                     BaseHTTPServer.HTTPServer):
+    """A threaded HTTP(S) server answering WAPI calls from a FakeWapi.
+
+    The number of requests received is kept in 'calls', keyed as in
+    fakes.FakeWapiSession.call_counts().
+    """
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address=('127.0.0.1', 0), wapi=None, faults=None,
+                 certfile=None, keyfile=None):
+        BaseHTTPServer.HTTPServer.__init__(self, address, FakeWapiHandler)
+        self.wapi = wapi or fakes.FakeWapi()
+        self.faults = faults or Faults()
+        self.calls = collections.Counter()
+        self._calls_lock = threading.Lock()
+        self._thread = None
+        self.scheme = 'http'
+        if certfile:
+            context = ssl.SSLContext(ssl.PROTOCOL_SSLv23)
+            context.load_cert_chain(certfile, keyfile)
+            self.socket = context.wrap_socket(self.socket, server_side=True)
+            self.scheme = 'https'
+
+        # URLs of the files uploaded or downloaded point to this server
+        host, port = self.server_address[:2]
+        self.wapi.base_url = '%s://%s:%d' % (self.scheme, host, port)
+
+    @property
+    def url(self):
+        return '%s/wapi/%s/' % (self.wapi.base_url, WAPI_VERSION)
+
+    def count(self, method, objtype, function=None):
+        key = '%s %s' % (method, objtype)
+        if function:
+            key += '?_function=%s' % function
+        with self._calls_lock:
+            self.calls[key] += 1
+
+    def start(self):
+        """Serve in a background thread."""
+        self._thread = threading.Thread(target=self.serve_forever)
+        self._thread.daemon = True
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve a fake WAPI.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8443)
+    parser.add_argument('--latency', type=float, default=0.0,
+                        help='Seconds added to every response.')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='Maximum random seconds added to or removed '
+                             'from the latency.')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='Share of the requests answered with an error.')
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--seed', type=int,
+                        help='Seed of the jitter and errors.')
+    parser.add_argument('--cert', help='Certificate file, to serve HTTPS.')
+    parser.add_argument('--key', help='Private key of the certificate.')
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    faults = Faults(args.latency, args.jitter, args.error_rate,
+                    args.error_status, args.seed)
+    server = FakeWapiServer((args.host, args.port), faults=faults,
+                            certfile=args.cert, keyfile=args.key)
+    LOG.info("Serving a fake WAPI at %s", server.url)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,467 @@
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import copy
+import csv
+import itertools
+import json
+import re
+import threading
+
+import fixtures
+import netaddr
+import six
+from six.moves.urllib import parse
+
+from heat_infoblox import connector
+from heat_infoblox import endpoints
+from heat_infoblox import governor
+from heat_infoblox import metrics
+from heat_infoblox import object_manipulator
+from heat_infoblox import refcache
+from heat_infoblox import replay
+from heat_infoblox import retry
+from heat_infoblox import singleflight
+from heat_infoblox import snapshot
+
+"""In-memory stand-ins for the WAPI and the clients used by the resources."""
+
+WAPI_URL = 'https://infoblox/wapi/v2.3/'
+
+# Field which names an object of each type, used to build its reference
+NAME_FIELDS = {
+    'member': 'host_name',
+    'zone_auth': 'fqdn',
+}
+
+# Fields which must be unique together, if not the name field alone
+UNIQUE_FIELDS = {
+    'fixedaddress': ('ipv4addr', 'network_view'),
+    'network': ('network', 'network_view'),
+    'record:a': ('name', 'ipv4addr'),
+    'record:aaaa': ('name', 'ipv6addr'),
+    'record:ptr': ('name', 'ptrdname'),
+}
+
+# Object types which are another view of the objects of a base type
+ALIASES = {
+    'member:dns': 'member',
+}
+
+
+def _matches(obj, payload, extattrs):
+    for key, value in six.iteritems(payload or {}):
+        if obj.get(key) != value:
+            return False
+    for key, value in six.iteritems(extattrs):
+        actual = obj.get('extattrs', {}).get(key.rstrip('~'), {}).get('value')
+        if key.endswith('~'):
+            if actual is None or not re.search(value, six.text_type(actual)):
+                return False
+        elif actual != value:
+            return False
+    return True
+
+
+def _set_field(obj, path, value):
+    # 'a.b' sets obj['a']['b']
+    names = path.split('.')
+    for name in names[:-1]:
+        obj = obj.setdefault(name, {})
+    obj[names[-1]] = value
+
+
+class FakeWapi(object):
+    """A minimal in-memory WAPI.
+
+    Objects are stored as dicts by object type. Searches match the request
+    body fields and '*EA=value' query arguments exactly, '*EA~=regex'
+    arguments as regular expressions, and support _max_results,
+    _return_as_object and paging. The read_token and
+    create_token functions of members, the restartservices function of the
+    grid, the next_available_ip function of networks, the fileop functions
+    of CSV imports and 'request' multi-calls are supported. DNS records and
+    fixed addresses get the zone or network they belong to, as on a grid.
+    """
+
+    # Path of the URLs of the files uploaded to or downloaded from the grid
+    FILE_PATH = '/http_direct_file_io/'
+
+    def __init__(self, base_url='https://infoblox'):
+        self.base_url = base_url
+        self.objects = collections.defaultdict(collections.OrderedDict)
+        self.files = {}
+        self._imports = {}
+        self._ids = itertools.count(1)
+        self._pages = {}
+        self._lock = threading.Lock()
+
+    def _ref(self, objtype, obj_id, obj):
+        name = obj.get(NAME_FIELDS.get(ALIASES.get(objtype, objtype), 'name'))
+        return '%s/ZG5z%d:%s' % (objtype, obj_id, name)
+
+    def _find(self, ref):
+        objtype, rest = ref.split('/', 1)
+        store = self.objects[ALIASES.get(objtype, objtype)]
+        obj_id = int(rest.split(':', 1)[0][4:])
+        return objtype, obj_id, store.get(obj_id)
+
+    def add(self, objtype, obj):
+        """Add an object directly, e.g. to set up a test. Returns its ref."""
+        with self._lock:
+            obj_id = next(self._ids)
+            self.objects[objtype][obj_id] = copy.deepcopy(obj)
+            return self._ref(objtype, obj_id, obj)
+
+    def _view(self, objtype, obj_id, obj, return_fields):
+        result = {'_ref': self._ref(objtype, obj_id, obj)}
+        fields = return_fields or [k for k in obj if not k.startswith('_')]
+        for field in fields:
+            if field in obj:
+                result[field] = copy.deepcopy(obj[field])
+        return result
+
+    def search(self, objtype, payload=None, return_fields=None,
+               extattrs=None):
+        store = self.objects[ALIASES.get(objtype, objtype)]
+        return [self._view(objtype, obj_id, obj, return_fields)
+                for obj_id, obj in list(store.items())
+                if _matches(obj, payload, extattrs or {})]
+
+    def handle(self, method, path, query, body):
+        """Serve one WAPI call. Returns (status code, response data)."""
+        with self._lock:
+            if path == 'request' and method == 'POST':
+                return self._multi(body or [])
+            return self._handle(method, path, query, body)
+
+    def transfer(self, method, path, data=None):
+        """Serve the upload (POST) or download (GET) of a file.
+
+        Returns (status code, content of the downloaded file or error).
+        """
+        with self._lock:
+            token = path.split(self.FILE_PATH, 1)[-1].split('/', 1)[0]
+            if token not in self.files:
+                return 404, {'Error': 'AdmConDataNotFoundError: Unknown '
+                                      'file %s' % token}
+            if method == 'POST':
+                self.files[token] = data
+                return 200, {}
+            return 200, self.files[token]
+
+    def _new_file(self, name, content=None):
+        token = 'file%d' % next(self._ids)
+        self.files[token] = content
+        return {'token': token,
+                'url': '%s%s%s/%s' % (self.base_url, self.FILE_PATH, token,
+                                      name)}
+
+    def _handle(self, method, path, query, body):
+        return_fields = None
+        if query.get('_return_fields'):
+            return_fields = query['_return_fields'].split(',')
+        extattrs = dict((k[1:], v) for k, v in six.iteritems(query)
+                        if k.startswith('*'))
+        if '/' not in path:
+            if method == 'POST' and path == 'fileop':
+                return self._fileop(query.get('_function'), body or {})
+            if method == 'GET':
+                if path == 'csvimporttask':
+                    self._run_imports()
+                return self._search(path, query, body, return_fields,
+                                    extattrs)
+            if method == 'POST':
+                return self._create(path, body or {})
+            return 400, {'Error': 'AdmConProtoError: Bad method'}
+
+        objtype, obj_id, obj = self._find(path)
+        if obj is None:
+            return 404, {'Error': 'AdmConDataNotFoundError: '
+                                  'Reference %s not found' % path}
+        if method == 'POST' and '_function' in query:
+            return self._call(query['_function'], obj, body)
+        if method == 'GET':
+            return 200, self._view(objtype, obj_id, obj, return_fields)
+        if method == 'PUT':
+            obj.update(copy.deepcopy(body or {}))
+            return 200, self._ref(objtype, obj_id, obj)
+        if method == 'DELETE':
+            del self.objects[ALIASES.get(objtype, objtype)][obj_id]
+            return 200, path
+        return 400, {'Error': 'AdmConProtoError: Bad method'}
+
+    def _search(self, objtype, query, body, return_fields, extattrs):
+        max_results = int(query.get('_max_results', 0))
+        if query.get('_page_id'):
+            page = self._pages.pop(query['_page_id'], None)
+            if page is None:
+                return 400, {'Error': 'AdmConProtoError: Page id %s is not '
+                                      'valid' % query['_page_id']}
+            return 200, self._page(*page)
+
+        result = self.search(objtype, body, return_fields, extattrs)
+        if query.get('_paging') == '1':
+            return 200, self._page(result, abs(max_results) or 1000)
+
+        if max_results < 0:
+            result = result[:-max_results]
+        elif max_results and len(result) > max_results:
+            return 400, {'Error': 'AdmConProtoError: Result set too large '
+                                  '(> %d)' % max_results}
+        if query.get('_return_as_object') == '1':
+            return 200, {'result': result}
+        return 200, result
+
+    def _page(self, result, size):
+        response = {'result': result[:size]}
+        if len(result) > size:
+            page_id = 'page%d' % next(self._ids)
+            self._pages[page_id] = (result[size:], size)
+            response['next_page_id'] = page_id
+        return response
+
+    def _multi(self, calls):
+        # Like the WAPI, a failed call rolls back the ones before it
+        saved = copy.deepcopy(self.objects)
+        results = []
+        for call in calls:
+            query = dict((k, six.text_type(v)) for k, v
+                         in six.iteritems(call.get('args') or {}))
+            status, result = self._handle(call.get('method', 'GET'),
+                                          call['object'], query,
+                                          call.get('data'))
+            if status >= 400:
+                self.objects = saved
+                return status, result
+            results.append(result)
+        return 200, results
+
+    def _create(self, objtype, body):
+        name_field = NAME_FIELDS.get(objtype, 'name')
+        data = dict((k, v) for k, v in six.iteritems(body)
+                    if k != 'restart_if_needed')
+        key = dict((field, data.get(field)) for field
+                   in UNIQUE_FIELDS.get(objtype, (name_field,)))
+        for existing in self.objects[objtype].values():
+            if _matches(existing, key, {}):
+                return 400, {'Error': 'AdmConDataError: None (IBDataConflict'
+                                      'Error: IB.Data.Conflict:Duplicate '
+                                      'object \'%s\')' % data.get(name_field)}
+        if objtype.startswith('record:'):
+            data['zone'] = self._zone_of(data.get('name', ''))
+        if objtype == 'fixedaddress':
+            data.setdefault('network_view', 'default')
+            data['network'] = self._network_of(data['ipv4addr'],
+                                               data['network_view'])
+        obj_id = next(self._ids)
+        self.objects[objtype][obj_id] = copy.deepcopy(data)
+        return 201, self._ref(objtype, obj_id, data)
+
+    def _zone_of(self, name):
+        # The longest authoritative zone which name belongs to
+        zones = [z['fqdn'] for z in self.objects['zone_auth'].values()
+                 if name == z['fqdn'] or name.endswith('.' + z['fqdn'])]
+        return max(zones, key=len) if zones else None
+
+    def _fileop(self, func_name, body):
+        if func_name == 'uploadinit':
+            return 200, self._new_file('import_file')
+        if func_name == 'csv_import':
+            if self.files.get(body.get('token')) is None:
+                return 400, {'Error': 'AdmConDataError: Nothing uploaded '
+                                      'for token %s' % body.get('token')}
+            task = {'import_id': next(self._ids), 'status': 'PENDING',
+                    'lines_processed': 0, 'lines_failed': 0}
+            self._imports[task['import_id']] = self.files.pop(body['token'])
+            self.objects['csvimporttask'][task['import_id']] = task
+            return 200, {'csv_import_task': copy.deepcopy(task)}
+        if func_name == 'csv_error_log':
+            task = self.objects['csvimporttask'].get(body.get('import_id'))
+            if task is None:
+                return 404, {'Error': 'AdmConDataNotFoundError: Unknown '
+                                      'import %s' % body.get('import_id')}
+            return 200, self._new_file('csv-errors.csv',
+                                       task.get('_errors', b''))
+        if func_name == 'downloadcomplete':
+            self.files.pop(body.get('token'), None)
+            return 200, {}
+        return 400, {'Error': 'AdmConProtoError: Unknown function %s' %
+                              func_name}
+
+    def _run_imports(self):
+        # Imports run in the background of a grid; here, when polled
+        for import_id, content in list(self._imports.items()):
+            del self._imports[import_id]
+            self._import(self.objects['csvimporttask'][import_id],
+                         content.decode('utf-8'))
+
+    def _import(self, task, text):
+        rows = [row for row in csv.reader(six.StringIO(text)) if row]
+        header, errors = rows[0], []
+        objtype = header[0][len('header-'):]
+        for row in rows[1:]:
+            data = {}
+            for column, value in zip(header[1:], row[1:]):
+                if value:
+                    _set_field(data, column.rstrip('*'), value)
+            status, result = self._create(objtype, data)
+            task['lines_processed'] += 1
+            if status >= 400:
+                task['lines_failed'] += 1
+                errors.append(row + [result['Error']])
+        if errors:
+            out = six.StringIO()
+            writer = csv.writer(out, lineterminator='\n')
+            writer.writerows([header + ['error']] + errors)
+            task['_errors'] = out.getvalue().encode('utf-8')
+        task['status'] = 'COMPLETED'
+
+    def _network_of(self, ip, network_view):
+        for network in self.objects['network'].values():
+            if (network.get('network_view', 'default') == network_view and
+                    netaddr.IPAddress(ip) in
+                    netaddr.IPNetwork(network['network'])):
+                return network['network']
+        return None
+
+    def _next_available_ips(self, network, body):
+        view = network.get('network_view', 'default')
+        used = set(a['ipv4addr'] for a in self.objects['fixedaddress'].values()
+                   if a.get('network_view', 'default') == view)
+        used.update((body or {}).get('exclude') or [])
+        num = (body or {}).get('num', 1)
+        ips = []
+        for ip in netaddr.IPNetwork(network['network']).iter_hosts():
+            if len(ips) == num:
+                break
+            if str(ip) not in used:
+                ips.append(str(ip))
+        if len(ips) < num:
+            return 400, {'Error': 'AdmConDataError: None (IBDataConflict'
+                                  'Error: IB.Data.Conflict:No free IP '
+                                  'available)'}
+        return 200, {'ips': ips}
+
+    def _call(self, func_name, obj, body):
+        if func_name == 'create_token':
+            obj['_tokens'] = [{'token': 'token-%s' % obj.get('host_name')}]
+            return 200, {'pnode_tokens': obj['_tokens']}
+        if func_name == 'read_token':
+            return 200, {'pnode_tokens': obj.get('_tokens', [])}
+        if func_name == 'next_available_ip':
+            return self._next_available_ips(obj, body)
+        if func_name == 'restartservices':
+            obj.setdefault('_restarts', []).append(body)
+            return 200, {}
+        return 400, {'Error': 'AdmConProtoError: Unknown function %s' %
+                              func_name}
+
+
+class FakeResponse(object):
+    def __init__(self, status_code, data):
+        self.status_code = status_code
+        if isinstance(data, bytes):
+            self.content = data
+        else:
+            self.content = json.dumps(data).encode('utf-8')
+        self.headers = {}
+
+
+class FakeWapiSession(object):
+    """A requests.Session replacement answering from a FakeWapi.
+
+    Every request is logged in 'calls' as (method, objtype, function).
+    """
+
+    def __init__(self, wapi=None):
+        self.wapi = wapi or FakeWapi()
+        self.calls = []
+
+    def request(self, method, url, data=None, files=None, **kwargs):
+        parsed = parse.urlparse(url)
+        if self.wapi.FILE_PATH in parsed.path:
+            self.calls.append((method, 'fileop', None))
+            if files:
+                data = list(files.values())[0][1]
+            return FakeResponse(*self.wapi.transfer(method, parsed.path,
+                                                    data))
+        path = parse.unquote(parsed.path.split('/wapi/', 1)[-1])
+        path = path.split('/', 1)[1]
+        query = dict(parse.parse_qsl(parsed.query))
+        if isinstance(data, bytes):
+            data = data.decode('utf-8')
+        body = json.loads(data) if data else None
+        self.calls.append((method, path.split('/', 1)[0],
+                           query.get('_function')))
+        status, response = self.wapi.handle(method, path, query, body)
+        return FakeResponse(status, response)
+
+    def call_counts(self):
+        """Return the number of calls as {'METHOD objtype[:function]': n}."""
+        counts = collections.Counter()
+        for method, objtype, function in self.calls:
+            key = '%s %s' % (method, objtype)
+            if function:
+                key += '?_function=%s' % function
+            counts[key] += 1
+        return dict(counts)
+
+
+def make_connector(session=None, **options):
+    """Return a connector to WAPI_URL sending its requests to 'session'."""
+    opts = {'url': WAPI_URL, 'username': 'admin', 'password': 'infoblox'}
+    opts.update(options)
+    conn = connector.Infoblox(opts)
+    if session is not None:
+        conn.session = session
+    return conn
+
+
+class Registries(fixtures.Fixture):
+    """Empty module-level registries of the plugin for a test.
+
+    Circuit breakers, governors, read endpoint pools, in-flight searches,
+    pending restarts, tenant views, snapshots, ref caches, recorders,
+    replay traces and metrics are shared by all the connectors of a
+    process. Each test gets its own, and the previous ones are restored
+    after it.
+    """
+
+    def setUp(self):
+        super(Registries, self).setUp()
+        for obj, name, value in (
+                (retry, '_breakers', {}),
+                (governor, '_governors', {}),
+                (endpoints, '_pools', {}),
+                (connector, '_searches', singleflight.Group()),
+                (object_manipulator, '_restarts', singleflight.Debouncer()),
+                (object_manipulator, '_tenant_views', {}),
+                (snapshot, '_snapshots', {}),
+                (refcache, '_caches', {}),
+                (replay, '_recorders', {}),
+                (replay, '_traces', {}),
+                (metrics, 'REGISTRY', metrics.Registry()),
+                (metrics, '_exporters', {'statsd': None,
+                                         'text_file': None})):
+            self.useFixture(fixtures.MonkeyPatch(
+                '%s.%s' % (obj.__name__, name), value))
+        self.addCleanup(self._close_caches)
+
+    @staticmethod
+    def _close_caches():
+        for cache in refcache._caches.values():
+            cache.close()
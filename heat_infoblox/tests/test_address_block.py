@@ -0,0 +1,137 @@
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import copy
+
+from oslo_config import cfg
+
+cfg.CONF.import_opt('plugin_dirs', 'heat.common.config')
+cfg.CONF.set_override('plugin_dirs', '/opt/stack/heat-infoblox/heat_infoblox')
+
+from heat.common import exception
+from heat.engine import stack
+from heat.engine import template
+from heat.tests import common
+from heat.tests import utils
+from heat_infoblox import ibexceptions as exc
+from heat_infoblox import object_manipulator
+from heat_infoblox.resources import address_block
+from heat_infoblox.tests import fakes
+
+
+my_template = {
+    'heat_template_version': '2013-05-23',
+    'resources': {
+        'block': {
+            'type': 'Infoblox::IPAM::AddressBlock',
+            'properties': {
+                'connection': {'url': 'https://infoblox/wapi/v2.3/',
+                               'username': 'admin',
+                               'password': 'infoblox'},
+                'network': '10.0.0.0/24',
+                'count': 5,
+            }
+        }
+    }
+}
+
+
+class AddressBlockTest(common.HeatTestCase):
+    def setUp(self):
+        super(AddressBlockTest, self).setUp()
+        self.useFixture(fakes.Registries())
+        self.ctx = utils.dummy_context()
+        self.wapi = fakes.FakeWapi()
+        self.wapi.add('network', {'network': '10.0.0.0/24',
+                                  'network_view': 'default'})
+        self.session = fakes.FakeWapiSession(self.wapi)
+        self.block = self.make_block(my_template)
+
+    def make_block(self, tmpl):
+        stk = stack.Stack(self.ctx, 'address_block_test_stack',
+                          template.Template(tmpl))
+        res = stk['block']
+        # as the stack is not stored
+        self.patchobject(res, 'physical_resource_name',
+                         return_value='stack-block-abcdef')
+        conn = fakes.make_connector(self.session)
+        res.infoblox_object = object_manipulator.InfobloxObjectManipulator(
+            conn)
+        return res
+
+    def reserved(self):
+        return sorted(a['ipv4addr'] for a in self.wapi.search('fixedaddress'))
+
+    def test_resource_mapping(self):
+        mapping = address_block.resource_mapping()
+        self.assertEqual(1, len(mapping))
+        self.assertEqual(address_block.AddressBlock,
+                         mapping['Infoblox::IPAM::AddressBlock'])
+
+    def test_handle_create(self):
+        self.wapi.add('fixedaddress', {'ipv4addr': '10.0.0.2',
+                                       'network_view': 'default'})
+        self.block.handle_create()
+        addresses = ['10.0.0.1', '10.0.0.3', '10.0.0.4', '10.0.0.5',
+                     '10.0.0.6']
+        self.assertEqual(addresses,
+                         self.block._resolve_attribute('addresses'))
+        self.assertEqual(sorted(addresses + ['10.0.0.2']), self.reserved())
+        # one call to find the addresses, one to reserve them, one to read
+        # the attribute
+        self.assertEqual({'GET network': 1,
+                          'POST network?_function=next_available_ip': 1,
+                          'POST request': 1,
+                          'GET fixedaddress': 1},
+                         self.session.call_counts())
+
+    def test_missing_network(self):
+        tmpl = copy.deepcopy(my_template)
+        tmpl['resources']['block']['properties']['network'] = '10.1.0.0/24'
+        self.block = self.make_block(tmpl)
+        self.assertRaises(exception.EntityNotFound, self.block.handle_create)
+
+    def test_addresses_taken_meanwhile_are_skipped(self):
+        reserve_ips = self.block.infoblox().reserve_ips
+
+        def reserve_taken(ips, *args):
+            if not self.wapi.search('fixedaddress'):
+                self.wapi.add('fixedaddress', {'ipv4addr': ips[0],
+                                               'network_view': 'default'})
+            return reserve_ips(ips, *args)
+
+        self.patchobject(self.block.infoblox(), 'reserve_ips',
+                         side_effect=reserve_taken)
+        self.block.handle_create()
+        self.assertEqual(['10.0.0.2', '10.0.0.3', '10.0.0.4', '10.0.0.5',
+                          '10.0.0.6'],
+                         self.block._resolve_attribute('addresses'))
+
+    def test_network_full(self):
+        tmpl = copy.deepcopy(my_template)
+        tmpl['resources']['block']['properties']['count'] = 300
+        self.block = self.make_block(tmpl)
+        self.assertRaises(exc.InfobloxFuncException, self.block.handle_create)
+
+    def test_handle_delete_releases_in_bulk(self):
+        other = self.wapi.add('fixedaddress', {'ipv4addr': '10.0.0.200',
+                                               'network_view': 'default'})
+        self.block.handle_create()
+        self.session.calls = []
+        self.block.handle_delete()
+        self.assertEqual(['10.0.0.200'], self.reserved())
+        self.assertEqual(other, self.wapi.search('fixedaddress')[0]['_ref'])
+        self.assertEqual({'GET fixedaddress': 1, 'POST request': 1},
+                         self.session.call_counts())
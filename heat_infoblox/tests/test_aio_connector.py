@@ -0,0 +1,26 @@
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import sys
+
+"""Tests of aio_connector, which requires Python 3.5 or later.
+
+The tests are in aio_connector_tests, as Python 2.7 cannot even compile
+them, and are only collected from here on later versions.
+"""
+
+if sys.version_info >= (3, 5):
+    from heat_infoblox.tests.aio_connector_tests import (  # noqa
+        AioConnectorTest)
@@ -0,0 +1,463 @@
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import threading
+
+import mock
+
+from heat.tests import common
+
+from heat_infoblox import codec
+from heat_infoblox import connector
+from heat_infoblox import endpoints
+from heat_infoblox import governor
+from heat_infoblox import ibexceptions as exc
+from heat_infoblox import logutils
+from heat_infoblox import retry
+from heat_infoblox import singleflight
+from heat_infoblox import tracing
+from heat_infoblox.tests import fakes
+
+
+def make_response(status_code, content=b'[]', headers=None):
+    return mock.Mock(status_code=status_code, content=content,
+                     headers=headers or {})
+
+
+class ConnectorTestBase(common.HeatTestCase):
+    def setUp(self):
+        super(ConnectorTestBase, self).setUp()
+        self.useFixture(fakes.Registries())
+        self.sleep = self.patchobject(connector.time, 'sleep')
+        self.conn = self.make_connector()
+
+    def make_connector(self, **options):
+        return fakes.make_connector(mock.Mock(), **options)
+
+
+class ConnectorTest(ConnectorTestBase):
+    def test_get_object_retries_overload(self):
+        self.conn.session.request.side_effect = [
+            make_response(503), make_response(429), make_response(200)]
+        self.assertEqual([], self.conn.get_object('member'))
+        self.assertEqual(3, self.conn.session.request.call_count)
+        self.assertEqual(2, self.sleep.call_count)
+
+    def test_get_object_gives_up_after_max_attempts(self):
+        conn = self.make_connector(retry_max_attempts=2)
+        conn.session.request.return_value = make_response(503, b'{}')
+        self.assertRaises(exc.InfobloxSearchError,
+                          conn.get_object, 'member')
+        self.assertEqual(2, conn.session.request.call_count)
+
+    def test_create_object_is_not_retried(self):
+        self.conn.session.request.return_value = make_response(503, b'{}')
+        self.assertRaises(exc.InfobloxCannotCreateObject,
+                          self.conn.create_object, 'member', {})
+        self.assertEqual(1, self.conn.session.request.call_count)
+
+    def test_circuit_opens_after_repeated_failures(self):
+        # the breaker of self.conn has the default threshold
+        retry._breakers.clear()
+        conn = self.make_connector(retry_max_attempts=1,
+                                   circuit_breaker_threshold=2)
+        conn.session.request.return_value = make_response(503, b'{}')
+        for i in range(2):
+            self.assertRaises(exc.InfobloxSearchError,
+                              conn.get_object, 'member')
+        self.assertRaises(exc.InfobloxCircuitOpen,
+                          conn.get_object, 'member')
+        self.assertEqual(2, conn.session.request.call_count)
+
+    def test_zero_options_are_not_defaults(self):
+        conn = self.make_connector(retry_max_attempts=0, read_rate_limit=0,
+                                   retry_base_delay=0, snapshot_ttl=0)
+        self.assertEqual(0, conn.retry_max_attempts)
+        self.assertEqual(0, conn.retry_base_delay)
+        conn.session.request.return_value = make_response(503, b'{}')
+        self.assertRaises(exc.InfobloxSearchError, conn.get_object, 'member')
+        self.assertEqual(1, conn.session.request.call_count)
+        self.assertEqual(5, self.make_connector().retry_max_attempts)
+
+    def test_retries_count_as_one_breaker_failure(self):
+        self.conn.session.request.return_value = make_response(503, b'{}')
+        for i in range(2):
+            self.assertRaises(exc.InfobloxSearchError,
+                              self.conn.get_object, 'member')
+        self.assertEqual(10, self.conn.session.request.call_count)
+        self.assertEqual(2, self.conn.circuit_breaker.failures)
+        self.assertEqual(retry.CircuitBreaker.CLOSED,
+                         self.conn.circuit_breaker.state)
+
+    def test_connectors_share_grid_limits(self):
+        other = self.make_connector()
+        self.assertIs(self.conn.governor, other.governor)
+        self.assertIs(self.conn.circuit_breaker, other.circuit_breaker)
+
+    def test_requests_hold_governor_slot(self):
+        self.conn.governor = mock.MagicMock()
+        self.conn.session.request.return_value = make_response(200)
+        self.conn.get_object('member')
+        self.conn.update_object('member/ref', {})
+        self.assertEqual([mock.call(False), mock.call(True)],
+                         self.conn.governor.slot.call_args_list)
+
+    def test_read_only_posts_hold_read_slot(self):
+        self.conn.governor = mock.MagicMock()
+        self.conn.session.request.return_value = make_response(200)
+        self.conn.call_func('read_token', 'member/ref', {})
+        self.conn.multi_request([{'method': 'GET', 'object': 'member'}])
+        self.conn.call_func('create_token', 'member/ref', {})
+        self.conn.multi_request([{'method': 'PUT', 'object': 'member/ref'}])
+        self.assertEqual([mock.call(False), mock.call(False),
+                          mock.call(True), mock.call(True)],
+                         self.conn.governor.slot.call_args_list)
+
+    def test_concurrent_identical_searches_share_request(self):
+        release = threading.Event()
+
+        def slow_request(*args, **kwargs):
+            release.wait()
+            return make_response(200, b'[{"name": "foo"}]')
+        self.conn.session.request.side_effect = slow_request
+
+        results = []
+
+        def search():
+            results.append(self.conn.get_object('nsgroup', {'name': 'foo'}))
+        threads = [threading.Thread(target=search) for i in range(5)]
+        for t in threads:
+            t.start()
+        # give the followers time to block on the leader's request
+        threading.Event().wait(0.1)
+        release.set()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(5, len(results))
+        self.assertEqual(1, self.conn.session.request.call_count)
+        self.assertEqual([{'name': 'foo'}], results[0])
+        # results are decoded per caller, never shared
+        self.assertIsNot(results[0][0], results[-1][0])
+
+    def test_payload_is_serialized_once(self):
+        self.conn.codec = mock.Mock(wraps=self.conn.codec)
+        self.conn.session.request.return_value = make_response(
+            201, b'"member/ref"')
+        self.assertEqual('member/ref',
+                         self.conn.create_object('member', {'a': 1}))
+        self.conn.codec.dumps.assert_called_once_with({'a': 1})
+        self.conn.codec.loads.assert_called_once_with(b'"member/ref"')
+
+    def test_non_json_error_response(self):
+        self.conn.session.request.return_value = make_response(
+            404, b'<html>Not found</html>')
+        e = self.assertRaises(exc.InfobloxCannotDeleteObject,
+                              self.conn.delete_object, 'member/ref')
+        self.assertIsNone(e.response)
+
+    def test_no_debug_formatting_when_disabled(self):
+        body = self.patchobject(logutils, 'Body')
+        self.patchobject(connector.LOG, 'isEnabledFor', return_value=False)
+        self.conn.session.request.return_value = make_response(200)
+        self.conn.get_object('member', {'host_name': 'foo'})
+        self.assertFalse(body.called)
+
+    def test_debug_log_redacts_secrets(self):
+        self.patchobject(connector.LOG, 'isEnabledFor', return_value=True)
+        debug = self.patchobject(connector.LOG, 'debug')
+        conn = self.make_connector(password='pw-secret')
+        conn.session.request.return_value = make_response(201, b'"r"')
+        conn.create_object('tsig', {'name': 'k', 'key': 'c2VjcmV0'})
+        logged = ' '.join(str(call[0][0] % call[0][1:])
+                          for call in debug.call_args_list)
+        self.assertIn('tsig', logged)
+        self.assertNotIn('c2VjcmV0', logged)
+        self.assertNotIn('pw-secret', logged)
+
+    def test_trace_point_per_http_call(self):
+        profiler = mock.Mock()
+        self.patchobject(tracing, '_profiler', new=[profiler])
+        self.conn.session.request.return_value = make_response(200, b'[]')
+        self.conn.get_object('member:dns', {'host_name': 'foo'})
+        profiler.start.assert_called_once_with(
+            'infoblox-wapi', info={'method': 'GET', 'objtype': 'member:dns',
+                                   'host': 'infoblox'})
+        profiler.stop.assert_called_once_with(
+            info={'status': 200, 'size': 2})
+
+    def test_get_all_objects_reads_all_pages(self):
+        self.conn.session = fakes.FakeWapiSession()
+        for i in range(5):
+            self.conn.session.wapi.add('networkview', {
+                'name': 'view%d' % i,
+                'extattrs': {'TenantID': {'value': 'tenant%d' % i}}})
+        self.conn.session.wapi.add('networkview', {'name': 'default'})
+        views = self.conn.get_all_objects('networkview', page_size=2,
+                                          return_fields=['name'],
+                                          query_params={'*TenantID~': '.*'})
+        self.assertEqual(['view%d' % i for i in range(5)],
+                         [v['name'] for v in views])
+        self.assertEqual(3, len(self.conn.session.calls))
+
+    def test_no_trace_point_when_not_profiling(self):
+        profiler = mock.Mock()
+        self.patchobject(tracing, '_profiler', new=[profiler])
+        profiler.get.return_value = None
+        self.conn.session.request.return_value = make_response(200)
+        self.conn.get_object('member')
+        self.assertFalse(profiler.start.called)
+
+
+class ReadRoutingTest(ConnectorTestBase):
+    def setUp(self):
+        super(ReadRoutingTest, self).setUp()
+        self.conn = self.make_connector(
+            read_urls=['https://gmc1/wapi/v2.3/', 'https://gmc2/wapi/v2.3/'])
+        self.conn.session.request.return_value = make_response(200)
+
+    def requested_hosts(self):
+        return [c[0][1].split('/')[2]
+                for c in self.conn.session.request.call_args_list]
+
+    def test_reads_go_round_robin_to_read_endpoints(self):
+        for i in range(3):
+            self.conn.get_object('member', {'host_name': str(i)})
+        self.assertEqual(['gmc1', 'gmc2', 'gmc1'], self.requested_hosts())
+
+    def test_writes_go_to_master_and_pin_reads(self):
+        self.conn.update_object('member:dns/ref', {})
+        self.conn.get_object('member', {'host_name': 'foo'})
+        self.conn.get_object('nsgroup', {'name': 'foo'})
+        self.assertEqual(['infoblox', 'infoblox', 'gmc1'],
+                         self.requested_hosts())
+
+    def test_from_master(self):
+        self.conn.get_object('nsgroup', {'name': 'foo'}, from_master=True)
+        self.assertEqual(['infoblox'], self.requested_hosts())
+
+    def test_failed_endpoint_falls_back_to_master(self):
+        self.conn.retry_policy.max_attempts = 1
+        self.conn.session.request.side_effect = [
+            make_response(503), make_response(200), make_response(200)]
+        self.conn.get_object('member', {'host_name': 'foo'})
+        self.conn.get_object('member', {'host_name': 'bar'})
+        # gmc1 failed and is out of rotation for the second search
+        self.assertEqual(['gmc1', 'infoblox', 'gmc2'],
+                         self.requested_hosts())
+
+    def test_overloaded_endpoint_falls_back_to_master(self):
+        self.conn.retry_policy.max_attempts = 1
+        self.conn.session.request.side_effect = [
+            make_response(429), make_response(200)]
+        self.conn.get_object('member', {'host_name': 'foo'})
+        self.assertEqual(['gmc1', 'infoblox'], self.requested_hosts())
+
+    def test_read_only_function(self):
+        self.conn.call_func('read_token', 'member/ref', {})
+        self.conn.call_func('create_token', 'member/ref', {})
+        self.conn.call_func('read_token', 'member/ref', {})
+        self.assertEqual(['gmc1', 'infoblox', 'infoblox'],
+                         self.requested_hosts())
+
+
+class EndpointPoolTest(common.HeatTestCase):
+    def test_least_loaded(self):
+        pool = endpoints.EndpointPool(['a', 'b'], endpoints.LEAST_LOADED)
+        with pool.use(pool.select()) as first:
+            self.assertEqual('a', first.url)
+            self.assertEqual('b', pool.select().url)
+        self.assertEqual('a', pool.select().url)
+
+    def test_mark_down_and_recover(self):
+        time = self.patchobject(endpoints.time, 'time', return_value=100)
+        pool = endpoints.EndpointPool(['a'], cooldown=10)
+        pool.mark_down(pool.select())
+        self.assertIsNone(pool.select())
+        time.return_value = 110
+        self.assertEqual('a', pool.select().url)
+
+
+class RetryPolicyTest(common.HeatTestCase):
+    def test_is_retryable(self):
+        policy = retry.RetryPolicy()
+        self.assertTrue(policy.is_retryable(make_response(503)))
+        self.assertTrue(policy.is_retryable(
+            make_response(400, b'{"Error": "Request timed out"}')))
+        self.assertFalse(policy.is_retryable(make_response(400, b'{}')))
+        self.assertFalse(policy.is_retryable(make_response(200)))
+
+    def test_backoff_is_bounded(self):
+        policy = retry.RetryPolicy(base_delay=1, max_delay=4)
+        for attempt in range(1, 10):
+            self.assertTrue(0 <= policy.backoff(attempt) <= 4)
+
+    def test_backoff_honors_retry_after(self):
+        policy = retry.RetryPolicy(base_delay=0.01, max_delay=10)
+        r = make_response(429, headers={'Retry-After': '3'})
+        self.assertEqual(3, policy.backoff(1, r))
+
+
+class CircuitBreakerTest(common.HeatTestCase):
+    def test_half_open_lets_one_trial_through(self):
+        breaker = retry.CircuitBreaker('url', failure_threshold=1,
+                                       reset_timeout=10)
+        time = self.patchobject(retry.time, 'time', return_value=100)
+        breaker.record_failure()
+        self.assertRaises(exc.InfobloxCircuitOpen, breaker.before_call)
+
+        time.return_value = 111
+        breaker.before_call()
+        self.assertEqual(breaker.HALF_OPEN, breaker.state)
+        self.assertRaises(exc.InfobloxCircuitOpen, breaker.before_call)
+
+        breaker.record_success()
+        breaker.before_call()
+        self.assertEqual(breaker.CLOSED, breaker.state)
+
+    def test_trial_without_outcome_is_tried_again(self):
+        breaker = retry.CircuitBreaker('url', failure_threshold=1,
+                                       reset_timeout=10)
+        time = self.patchobject(retry.time, 'time', return_value=100)
+        breaker.record_failure()
+        time.return_value = 111
+        # the trial call ends without recording success or failure
+        breaker.before_call()
+        time.return_value = 120
+        self.assertRaises(exc.InfobloxCircuitOpen, breaker.before_call)
+        time.return_value = 121
+        breaker.before_call()
+        self.assertEqual(breaker.HALF_OPEN, breaker.state)
+
+
+class GovernorTest(common.HeatTestCase):
+    def test_token_bucket_unlimited(self):
+        sleep = self.patchobject(governor.time, 'sleep')
+        bucket = governor.TokenBucket(0)
+        for i in range(100):
+            bucket.acquire()
+        self.assertFalse(sleep.called)
+
+    def test_token_bucket_waits_when_empty(self):
+        self.patchobject(governor.time, 'time', return_value=100)
+        sleep = self.patchobject(governor.time, 'sleep')
+        bucket = governor.TokenBucket(2, burst=2)
+        bucket.acquire()
+        bucket.acquire()
+        self.assertFalse(sleep.called)
+        bucket.acquire()
+        sleep.assert_called_once_with(0.5)
+
+    def test_slot_limits_in_flight(self):
+        gov = governor.Governor(max_reads=1, max_writes=1)
+        with gov.slot(False):
+            self.assertFalse(gov._semaphores[False].acquire(False))
+            self.assertTrue(gov._semaphores[True].acquire(False))
+            gov._semaphores[True].release()
+        self.assertTrue(gov._semaphores[False].acquire(False))
+
+    def test_zero_slots_are_unlimited(self):
+        gov = governor.Governor(max_reads=0, max_writes=1)
+        with gov.slot(False):
+            with gov.slot(False):
+                pass
+        self.assertIsNone(gov._semaphores[False])
+
+
+class SingleflightTest(common.HeatTestCase):
+    def test_followers_share_result(self):
+        group = singleflight.Group()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def fn():
+            calls.append(1)
+            started.set()
+            release.wait()
+            return 'result'
+
+        results = []
+        leader = threading.Thread(
+            target=lambda: results.append(group.do('key', fn)))
+        leader.start()
+        started.wait()
+        followers = [threading.Thread(
+            target=lambda: results.append(group.do('key', fn)))
+            for i in range(3)]
+        for t in followers:
+            t.start()
+        threading.Event().wait(0.1)
+        release.set()
+        for t in [leader] + followers:
+            t.join()
+        self.assertEqual(['result'] * 4, results)
+        self.assertEqual(1, len(calls))
+        self.assertEqual({}, group._calls)
+
+    def test_error_is_raised_and_forgotten(self):
+        group = singleflight.Group()
+
+        def fail():
+            raise ValueError()
+        self.assertRaises(ValueError, group.do, 'key', fail)
+        self.assertEqual('ok', group.do('key', lambda: 'ok'))
+
+
+class CodecTest(common.HeatTestCase):
+    def test_installed_codecs_round_trip(self):
+        payload = {'name': u'caf\xe9', 'ttl': 300, 'zones': ['a/b', None]}
+        for name, factory in codec.CODECS:
+            try:
+                c = codec.get_codec(name)
+            except ImportError:
+                continue
+            data = c.dumps(payload)
+            self.assertIsInstance(data, bytes)
+            self.assertEqual(payload, c.loads(data))
+
+    def test_auto_falls_back_to_stdlib(self):
+        self.patchobject(codec, '_codecs', new={})
+        self.patchobject(codec, 'CODECS', new=(
+            ('missing', mock.Mock(side_effect=ImportError)),
+            ('json', codec._json)))
+        self.assertEqual('json', codec.get_codec().name)
+
+    def test_unknown_codec(self):
+        self.assertRaises(ValueError, codec.get_codec, 'yaml')
+
+
+class LogutilsTest(common.HeatTestCase):
+    def test_body_is_truncated(self):
+        self.assertEqual('xxxx... (10 bytes)',
+                         str(logutils.Body(b'x' * 10, limit=4)))
+        self.assertEqual('', str(logutils.Body(None)))
+
+    def test_body_is_redacted(self):
+        body = logutils.Body(b'{"name": "k", "key": "c2VjcmV0", "ttl": 1}')
+        self.assertEqual('{"name": "k", "key": "***", "ttl": 1}', str(body))
+
+    def test_truncated_secret_is_redacted(self):
+        body = logutils.Body(b'{"password": "infoblox"}', limit=17)
+        self.assertNotIn('info', str(body))
+
+    def test_redacted_payload(self):
+        payload = {'name': 'k', 'nested': [{'password': 'p'}]}
+        self.assertEqual(str({'name': 'k', 'nested': [{'password': '***'}]}),
+                         str(logutils.Redacted(payload)))
+
+    def test_redact_url(self):
+        self.assertEqual('https://admin:***@gm/wapi/v2.3/',
+                         logutils.redact_url('https://admin:pw@gm/wapi/v2.3/'))
@@ -0,0 +1,93 @@
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import socket
+
+import requests
+
+from heat.tests import common
+
+from heat_infoblox.tests import fake_netmri_server
+
+
+class FakeNetMRIServerTest(common.HeatTestCase):
+    def setUp(self):
+        super(FakeNetMRIServerTest, self).setUp()
+        self.netmri = fake_netmri_server.FakeNetMRI(devices=8, views=2)
+        self.server = fake_netmri_server.FakeNetMRIServer(
+            netmri=self.netmri).start()
+        self.addCleanup(self.server.stop)
+
+    def api_request(self, path, params):
+        r = requests.post('%s/%s' % (self.server.url, path), json=params)
+        self.assertEqual(200, r.status_code)
+        return r.json()
+
+    def test_kept_alive_connection_has_no_nagle_delay(self):
+        # otherwise the body of each response waits for a delayed ACK
+        nodelay = []
+        setup = fake_netmri_server.FakeNetMRIHandler.setup
+
+        def recording_setup(handler):
+            setup(handler)
+            nodelay.append(handler.connection.getsockopt(
+                socket.IPPROTO_TCP, socket.TCP_NODELAY))
+
+        self.patchobject(fake_netmri_server.FakeNetMRIHandler, 'setup',
+                         new=recording_setup)
+        session = requests.Session()
+        for i in range(3):
+            session.post('%s/devices/index' % self.server.url, json={})
+        self.assertEqual(1, len(nodelay))
+        self.assertTrue(nodelay[0])
+
+    def test_device_resolution(self):
+        target = self.netmri.target(5)
+        views = self.api_request('virtual_networks/search', {
+            'VirtualNetworkName': [target['network_view']],
+            'select': ['VirtualNetworkID', 'VirtualNetworkName']})
+        view_id = views['virtual_networks'][0]['VirtualNetworkID']
+
+        # the same IP exists in both views
+        devices = self.api_request('devices/index', {
+            'DeviceIPDotted': [target['device_ip_address']]})['devices']
+        self.assertEqual(2, len(devices))
+        devices = self.api_request('devices/index', {
+            'DeviceIPDotted': [target['device_ip_address']],
+            'VirtualNetworkID': [view_id],
+            'select': 'DeviceID,DeviceIPDotted,VirtualNetworkID'})['devices']
+        self.assertEqual([{'DeviceID': 6,
+                           'DeviceIPDotted': target['device_ip_address'],
+                           'VirtualNetworkID': view_id}], devices)
+        self.assertEqual(2, self.server.calls['POST devices/index'])
+
+    def test_job(self):
+        self.netmri.job_duration = 60
+        job_id = self.api_request('scripts/run', {'name': 'my-script',
+                                                  'device_ids': [1, 2]})
+        job_id = job_id['JobID']
+        r = requests.get('%s/jobs/%d' % (self.server.url, job_id))
+        self.assertIsNone(r.json()['job']['completed_at'])
+        self.netmri.jobs[job_id]['duration'] = 0
+        r = requests.get('%s/jobs/%d' % (self.server.url, job_id))
+        self.assertIsNotNone(r.json()['job']['completed_at'])
+        details = self.api_request('job_details/index', {'id': job_id})
+        self.assertEqual([1, 2], [d['DeviceID']
+                                  for d in details['job_details']])
+
+    def test_unknown_device(self):
+        r = requests.post(self.server.url + '/scripts/run',
+                          json={'name': 'my-script', 'device_ids': [100]})
+        self.assertEqual(400, r.status_code)
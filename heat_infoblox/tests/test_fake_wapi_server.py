@@ -0,0 +1,131 @@
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import socket
+
+import requests
+
+from heat.tests import common
+
+from heat_infoblox import connector
+from heat_infoblox import ibexceptions as exc
+from heat_infoblox import object_manipulator
+from heat_infoblox.tests import fake_wapi_server
+from heat_infoblox.tests import fakes
+
+
+class FakeWapiServerTest(common.HeatTestCase):
+    def setUp(self):
+        super(FakeWapiServerTest, self).setUp()
+        self.useFixture(fakes.Registries())
+        self.patchobject(connector.time, 'sleep')
+        self.faults = fake_wapi_server.Faults()
+        self.server = fake_wapi_server.FakeWapiServer(
+            faults=self.faults).start()
+        self.addCleanup(self.server.stop)
+        self.conn = connector.Infoblox({'url': self.server.url,
+                                        'username': 'admin',
+                                        'password': 'infoblox'})
+
+    def test_object_lifecycle(self):
+        ref = self.conn.create_object('member', {'host_name': 'my-name'})
+        self.assertTrue(ref.startswith('member/'))
+        members = self.conn.get_object('member:dns', {'host_name': 'my-name'})
+        self.assertEqual(1, len(members))
+        self.conn.update_object(members[0]['_ref'], {'enable_dns': True})
+        self.assertEqual([{'_ref': ref, 'enable_dns': True}],
+                         self.conn.get_object('member',
+                                              return_fields=['enable_dns']))
+        self.conn.call_func('create_token', ref, {})
+        tokens = self.conn.call_func('read_token', ref, {})['pnode_tokens']
+        self.assertEqual(1, len(tokens))
+        self.conn.delete_object(ref)
+        self.assertEqual([], self.conn.get_object('member'))
+        self.assertEqual(2, self.server.calls['GET member'])
+
+    def test_kept_alive_connection_has_no_nagle_delay(self):
+        # otherwise the body of each response waits for a delayed ACK
+        nodelay = []
+        setup = fake_wapi_server.FakeWapiHandler.setup
+
+        def recording_setup(handler):
+            setup(handler)
+            nodelay.append(handler.connection.getsockopt(
+                socket.IPPROTO_TCP, socket.TCP_NODELAY))
+
+        self.patchobject(fake_wapi_server.FakeWapiHandler, 'setup',
+                         new=recording_setup)
+        for i in range(3):
+            self.conn.get_object('member')
+        self.assertEqual(1, len(nodelay))
+        self.assertTrue(nodelay[0])
+
+    def test_paging(self):
+        for i in range(5):
+            self.server.wapi.add('networkview', {'name': 'view-%d' % i})
+        names = []
+        params = {'_paging': 1, '_max_results': 2, '_return_as_object': 1}
+        while True:
+            page = requests.get(self.server.url + 'networkview',
+                                params=params).json()
+            names.extend(v['name'] for v in page['result'])
+            if 'next_page_id' not in page:
+                break
+            params = {'_page_id': page['next_page_id']}
+        self.assertEqual(['view-%d' % i for i in range(5)], names)
+
+    def test_multi_request(self):
+        calls = [{'method': 'POST', 'object': 'tsig',
+                  'data': {'name': 'key-%d' % i, 'key': 'c2VjcmV0'}}
+                 for i in range(3)]
+        r = requests.post(self.server.url + 'request', json=calls)
+        self.assertEqual(200, r.status_code)
+        self.assertEqual(3, len(r.json()))
+
+        # a failed call rolls back the whole request
+        calls = [{'method': 'POST', 'object': 'tsig',
+                  'data': {'name': 'key-3', 'key': 'c2VjcmV0'}},
+                 {'method': 'POST', 'object': 'tsig',
+                  'data': {'name': 'key-0', 'key': 'c2VjcmV0'}}]
+        r = requests.post(self.server.url + 'request', json=calls)
+        self.assertEqual(400, r.status_code)
+        self.assertEqual(3, len(self.server.wapi.search('tsig')))
+
+    def test_csv_import(self):
+        self.patchobject(object_manipulator.time, 'sleep')
+        self.server.wapi.add('member', {'host_name': 'member-1'})
+        ib = object_manipulator.InfobloxObjectManipulator(self.conn)
+        members = [{'name': 'member-%d' % i, 'hwmodel': 'IB-VM-820',
+                    'licenses': ['dns', 'enterprise']} for i in range(3)]
+        errors = ib.import_members(members)
+        self.assertEqual(['member-1'], list(errors))
+        self.assertIn('Duplicate', errors['member-1'])
+        member = ib.get_member('member-2', return_fields=['pre_provisioning'])
+        self.assertEqual('IB-VM-820', member[0]['pre_provisioning'][
+            'hardware_info']['hwmodel'])
+        self.assertEqual(1, self.server.calls['POST fileop'])
+        self.assertEqual(1, self.server.calls['GET fileop'])
+
+    def test_injected_errors_are_retried(self):
+        self.faults.error_rate = 1.0
+        self.assertRaises(exc.InfobloxSearchError,
+                          self.conn.get_object, 'member')
+        self.assertEqual(self.conn.retry_max_attempts,
+                         self.server.calls['GET member'])
+
+    def test_latency(self):
+        faults = fake_wapi_server.Faults(latency=0.1, jitter=0.05, seed=1)
+        for i in range(20):
+            self.assertTrue(0.05 <= faults.delay() <= 0.15)
@@ -0,0 +1,147 @@
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import logging
+import os
+import shutil
+import tempfile
+
+import mock
+
+from heat.tests import common
+
+from heat_infoblox import config
+from heat_infoblox import connector
+from heat_infoblox import metrics
+from heat_infoblox import object_manipulator
+
+
+class MetricsTest(common.HeatTestCase):
+    def setUp(self):
+        super(MetricsTest, self).setUp()
+        self.registry = metrics.Registry()
+        self.patchobject(metrics, 'REGISTRY', new=self.registry)
+        self.patchobject(metrics, '_exporters',
+                         new={'statsd': None, 'text_file': None})
+
+    def test_record(self):
+        self.registry.record('member', 'GET', 200, 0.03, 10, 100)
+        self.registry.record('member', 'GET', 404, 0.2, 10, 50)
+        self.registry.record('member', 'GET', None, 60, 10, 0)
+        stats = self.registry.get('member', 'GET')
+        self.assertEqual(3, stats.calls)
+        self.assertEqual(2, stats.errors)
+        self.assertEqual(30, stats.bytes_sent)
+        self.assertEqual(150, stats.bytes_received)
+        self.assertEqual(3, stats.latency.count)
+        self.assertEqual(1, stats.latency.counts[2])
+        self.assertEqual(1, stats.latency.counts[-1])
+
+    def test_render_text(self):
+        self.registry.record('member:dns', 'PUT', 200, 0.03, 10, 100)
+        text = self.registry.render_text()
+        labels = 'objtype="member:dns",method="PUT"'
+        self.assertIn('heat_infoblox_wapi_calls_total{%s} 1' % labels, text)
+        self.assertIn('heat_infoblox_wapi_latency_seconds_bucket'
+                      '{%s,le="0.025"} 0' % labels, text)
+        self.assertIn('heat_infoblox_wapi_latency_seconds_bucket'
+                      '{%s,le="0.05"} 1' % labels, text)
+        self.assertIn('heat_infoblox_wapi_latency_seconds_bucket'
+                      '{%s,le="+Inf"} 1' % labels, text)
+
+    def test_write_text_file(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        path = os.path.join(tmp_dir, 'wapi.prom')
+        metrics.configure(text_file=path)
+        metrics.record_call('member', 'GET', 200, 0.1, 0, 2)
+        metrics.write_text_file(force=True)
+        with open(path) as f:
+            self.assertEqual(self.registry.render_text(), f.read())
+        self.assertEqual(['wapi.prom'], os.listdir(tmp_dir))
+
+    def test_exporters_are_set_from_engine_config(self):
+        self.patchobject(metrics, '_exporters', new={})
+        self.patchobject(config.CONF.infoblox, 'metrics_file',
+                         new='/tmp/wapi.prom')
+        metrics.record_call('member', 'GET', 200, 0.1, 0, 2)
+        self.assertEqual({'statsd': None, 'text_file': '/tmp/wapi.prom'},
+                         metrics._exporters)
+        # connectors do not change them
+        connector.Infoblox({'url': 'https://infoblox/wapi/v2.3/',
+                            'username': 'admin', 'password': 'infoblox'})
+        self.assertEqual('/tmp/wapi.prom', metrics._exporters['text_file'])
+
+    def test_statsd(self):
+        metrics.configure(statsd_address='127.0.0.1:8125')
+        statsd = metrics._exporters['statsd']
+        statsd._socket = mock.Mock()
+        metrics.record_call('member?_function=read_token', 'POST', 500,
+                            0.25, 2, 30)
+        packet = statsd._socket.sendto.call_args[0][0].decode()
+        name = 'heat_infoblox.wapi.member__function_read_token.POST'
+        self.assertEqual(['%s.calls:1|c' % name,
+                          '%s.latency:250|ms' % name,
+                          '%s.bytes_received:30|c' % name,
+                          '%s.errors:1|c' % name],
+                         packet.split('\n'))
+
+    def test_track_action(self):
+        log = self.patchobject(metrics.LOG, 'log')
+        self.patchobject(metrics.LOG, 'isEnabledFor', return_value=True)
+
+        class Resource(object):
+            name = 'my_member'
+
+            @metrics.track_action
+            def handle_create(self):
+                metrics.record_call('member', 'POST', 201, 0.1, 0, 0)
+                metrics.record_call('member', 'PUT', 200, 0.1, 0, 0)
+                metrics.record_call('member', 'PUT', 400, 0.1, 0, 0)
+                return 'done'
+
+        self.assertEqual('done', Resource().handle_create())
+        self.assertEqual(logging.DEBUG, log.call_args[0][0])
+        summary = log.call_args[0][5]
+        self.assertTrue(summary.startswith('3 WAPI calls (1 errors) in'))
+        self.assertTrue(summary.endswith('POST member x1, PUT member x2'))
+        # calls outside of an action are not counted by any scope
+        metrics.record_call('member', 'GET', 200, 0.1, 0, 0)
+
+        self.patchobject(metrics, 'SLOW_ACTION', new=-1)
+        Resource().handle_create()
+        self.assertEqual(logging.INFO, log.call_args[0][0])
+
+    def test_track_action_counts_worker_calls(self):
+        def update(i):
+            metrics.record_call('member', 'PUT', 200, 0.1, 0, 0)
+
+        scope = metrics.ActionScope()
+        with scope:
+            object_manipulator.parallel_map(update, range(6), 3)
+        self.assertEqual({('PUT', 'member'): 6}, scope.calls)
+
+    def test_connector_records_calls(self):
+        conn = connector.Infoblox({'url': 'https://infoblox/wapi/v2.3/',
+                                   'username': 'admin',
+                                   'password': 'infoblox'})
+        conn.session = mock.Mock()
+        conn.session.request.return_value = mock.Mock(
+            status_code=200, content=b'{"pnode_tokens": []}')
+        conn.call_func('read_token', 'member/b25l:foo', {})
+        stats = self.registry.get('member?_function=read_token', 'POST')
+        self.assertEqual(1, stats.calls)
+        self.assertEqual(2, stats.bytes_sent)
+        self.assertEqual(20, stats.bytes_received)
@@ -0,0 +1,478 @@
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+from heat.tests import common
+
+from heat_infoblox import connector
+from heat_infoblox import ibexceptions as exc
+from heat_infoblox import object_manipulator
+from heat_infoblox import refcache
+from heat_infoblox.tests import fakes
+
+
+class ObjectManipulatorTest(common.HeatTestCase):
+    def setUp(self):
+        super(ObjectManipulatorTest, self).setUp()
+        self.useFixture(fakes.Registries())
+        self.wapi = fakes.FakeWapi()
+        self.grid = self.wapi.add('grid', {'name': 'Infoblox'})
+        self.session = fakes.FakeWapiSession(self.wapi)
+
+    def make_infoblox(self, **options):
+        options.setdefault('restart_debounce_delay', 0)
+        conn = fakes.make_connector(self.session, **options)
+        return object_manipulator.InfobloxObjectManipulator(conn)
+
+    def restarts(self):
+        return self.wapi.search('grid', return_fields=['_restarts'])[0].get(
+            '_restarts', [])
+
+    def test_create_zones_auth(self):
+        self.wapi.add('zone_auth', {'fqdn': 'zone1.com', 'view': 'default'})
+        ib = self.make_infoblox()
+        fqdns = ['zone%d.com' % i for i in range(5)]
+        created = ib.create_zones_auth(fqdns, 'default', ns_group='group',
+                                       batch_size=2)
+
+        self.assertEqual(4, len(created))
+        zones = self.wapi.search('zone_auth')
+        self.assertEqual(sorted(fqdns), sorted(z['fqdn'] for z in zones))
+        self.assertEqual(4, len([z for z in zones
+                                 if z.get('ns_group') == 'group']))
+        self.assertFalse(any('restart_if_needed' in z for z in zones))
+        # a lookup and a creation per batch, then one restart
+        self.assertEqual({'POST request': 6,
+                          'GET grid': 1,
+                          'POST grid?_function=restartservices': 1},
+                         self.session.call_counts())
+        self.assertEqual([{'member_order': 'SIMULTANEOUSLY',
+                           'restart_option': 'RESTART_IF_NEEDED',
+                           'service_option': 'DNS'}], self.restarts())
+
+    def test_create_zones_auth_falls_back_to_single_creates(self):
+        ib = self.make_infoblox()
+        search = self.wapi.search
+
+        def search_missing_zone(objtype, *args, **kwargs):
+            # zone2.com was created by someone else since our lookup
+            if objtype == 'zone_auth' and not self.wapi.objects['zone_auth']:
+                self.wapi.objects['zone_auth'][100] = {'fqdn': 'zone2.com',
+                                                       'view': 'default'}
+                return []
+            return search(objtype, *args, **kwargs)
+
+        self.patchobject(self.wapi, 'search', side_effect=search_missing_zone)
+        created = ib.create_zones_auth(['zone1.com', 'zone2.com'], 'default')
+        self.assertEqual(1, len(created))
+        self.assertEqual(['zone1.com', 'zone2.com'],
+                         sorted(z['fqdn'] for z in search('zone_auth')))
+        self.assertEqual(1, len(self.restarts()))
+
+    def test_no_restart_without_new_zones(self):
+        self.wapi.add('zone_auth', {'fqdn': 'zone.com', 'view': 'default'})
+        ib = self.make_infoblox()
+        self.assertEqual([], ib.create_zones_auth(['zone.com'], 'default'))
+        self.assertEqual([], self.restarts())
+
+    def test_restarts_are_debounced(self):
+        ib = self.make_infoblox(restart_debounce_delay=0.05)
+        threads = [threading.Thread(target=ib.restart_grid_services,
+                                    args=('DNS',)) for i in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(1, len(self.restarts()))
+
+        ib.restart_grid_services('DNS')
+        self.assertEqual(2, len(self.restarts()))
+
+    def test_restart_without_grid_is_skipped(self):
+        self.wapi = fakes.FakeWapi()
+        self.session = fakes.FakeWapiSession(self.wapi)
+        self.make_infoblox().restart_grid_services('DNS')
+        self.assertEqual({'GET grid': 1}, self.session.call_counts())
+
+    def make_multi_tenant_infoblox(self):
+        ib = self.make_infoblox()
+        ib.connector.multi_tenant = True
+        ib.connector.network_view = 'default'
+        ib.connector.dns_view = 'default'
+        for tenant in ('t1', 't2'):
+            net_view = 'default.%s' % tenant
+            self.wapi.add('networkview', {
+                'name': net_view,
+                'extattrs': {'TenantID': {'value': tenant}}})
+            self.wapi.add('view', {'name': 'default.%s' % net_view,
+                                   'network_view': net_view})
+        self.wapi.add('networkview', {'name': 'default'})
+        return ib
+
+    def test_dns_view_of_known_tenants_is_cached(self):
+        ib = self.make_multi_tenant_infoblox()
+        for tenant in ('t1', 't2', 't1'):
+            self.assertEqual('default.default.%s' % tenant,
+                             ib.get_dns_view(tenant))
+        self.assertEqual({'GET networkview': 1, 'GET view': 1},
+                         self.session.call_counts())
+
+        # other manipulators of the grid share the cache
+        self.make_multi_tenant_infoblox().get_dns_view('t2')
+        self.assertEqual(2, len(self.session.calls))
+
+    def test_dns_view_of_new_tenant_is_created(self):
+        ib = self.make_multi_tenant_infoblox()
+        self.assertEqual('default.default.t3', ib.get_dns_view('t3'))
+        self.assertEqual(['default.default.t3'],
+                         [v['name'] for v in self.wapi.search(
+                             'view', {'network_view': 'default.t3'})])
+        calls = len(self.session.calls)
+        self.assertEqual('default.default.t3', ib.get_dns_view('t3'))
+        self.assertEqual(calls, len(self.session.calls))
+
+    def test_missing_dns_view_is_created(self):
+        ib = self.make_multi_tenant_infoblox()
+        self.wapi.objects['view'].clear()
+        self.assertEqual('default.default.t1', ib.get_dns_view('t1'))
+        self.assertEqual(1, len(self.wapi.search(
+            'view', {'name': 'default.default.t1'})))
+
+    def test_failed_view_creation_is_not_cached(self):
+        ib = self.make_multi_tenant_infoblox()
+        create = self.patchobject(
+            ib, 'create_dns_view',
+            side_effect=exc.InfobloxCannotCreateObject(
+                response=None, objtype='view', content='', code=503))
+        self.assertRaises(exc.InfobloxCannotCreateObject,
+                          ib.get_dns_view, 't3')
+        create.side_effect = None
+        self.assertEqual('default.default.t3', ib.get_dns_view('t3'))
+        self.assertEqual(2, create.call_count)
+
+    def test_views_are_looked_up_again_after_ttl(self):
+        ib = self.make_multi_tenant_infoblox()
+        ib.get_dns_view('t1')
+        views = object_manipulator.get_tenant_views(ib.connector.url)
+        self.patchobject(views, 'ttl', new=-1)
+        self.wapi.objects['view'].clear()
+        self.assertEqual('default.default.t1', ib.get_dns_view('t1'))
+        self.assertEqual(1, len(self.wapi.search(
+            'view', {'name': 'default.default.t1'})))
+
+    def test_deleted_views_are_looked_up_again(self):
+        ib = self.make_multi_tenant_infoblox()
+        ib.get_dns_view('t1')
+        ib.delete_network_view('default.t1')
+        self.session.calls = []
+        ib.get_dns_view('t2')
+        self.assertEqual({'GET networkview': 1, 'GET view': 1},
+                         self.session.call_counts())
+
+    def test_import_members(self):
+        self.sleep = self.patchobject(object_manipulator.time, 'sleep')
+        self.wapi.add('member', {'host_name': 'member-1'})
+        ib = self.make_infoblox()
+        members = [{'name': 'member-%d' % i, 'platform': 'VNIOS',
+                    'lan1': {'ipv4': {'address': '10.0.0.%d' % i,
+                                      'subnet_mask': '255.255.255.0',
+                                      'gateway': '10.0.0.254'}},
+                    'hwmodel': 'IB-VM-820', 'licenses': ['dns', 'grid']}
+                   for i in range(3)]
+        errors = ib.import_members(members, poll_interval=1)
+
+        self.assertEqual(['member-1'], list(errors))
+        self.assertIn('Duplicate object', errors['member-1'])
+        imported = self.wapi.search('member', {'host_name': 'member-2'})[0]
+        self.assertEqual({'address': '10.0.0.2',
+                          'subnet_mask': '255.255.255.0',
+                          'gateway': '10.0.0.254'},
+                         imported['vip_setting'])
+        self.assertEqual('dns,grid',
+                         imported['pre_provisioning']['licenses'])
+        self.sleep.assert_called_once_with(1)
+        # the calls do not depend on the number of members
+        self.assertEqual({'POST fileop?_function=uploadinit': 1,
+                          'POST fileop': 1,
+                          'POST fileop?_function=csv_import': 1,
+                          'GET csvimporttask': 1,
+                          'POST fileop?_function=csv_error_log': 1,
+                          'GET fileop': 1,
+                          'POST fileop?_function=downloadcomplete': 1},
+                         self.session.call_counts())
+        self.assertEqual({}, self.wapi.files)
+
+    def test_import_members_without_errors(self):
+        self.patchobject(object_manipulator.time, 'sleep')
+        ib = self.make_infoblox()
+        self.assertEqual({}, ib.import_members([{'name': 'member'}]))
+        self.assertNotIn('POST fileop?_function=csv_error_log',
+                         self.session.call_counts())
+
+    def test_import_members_timeout(self):
+        self.patchobject(object_manipulator.time, 'sleep')
+        self.patchobject(self.wapi, '_run_imports')
+        ib = self.make_infoblox()
+        self.assertRaises(exc.InfobloxCsvImportFailed, ib.import_members,
+                          [{'name': 'member'}], poll_interval=1, timeout=0)
+
+    def tsigs(self):
+        return dict((t['name'], t['key']) for t in self.wapi.search('tsig'))
+
+    def test_create_tsigs(self):
+        self.wapi.add('tsig', {'name': 'same', 'key': 'c2FtZQ=='})
+        self.wapi.add('tsig', {'name': 'rotated', 'key': 'b2xk'})
+        self.wapi.add('tsig', {'name': 'other', 'key': 'b3RoZXI='})
+        ib = self.make_infoblox()
+        keys = dict(('key%d' % i, 'c2VjcmV0%d' % i) for i in range(5))
+        keys.update({'same': 'c2FtZQ==', 'rotated': 'bmV3'})
+
+        self.assertEqual((5, 1), ib.create_tsigs(keys, batch_size=4))
+        keys['other'] = 'b3RoZXI='
+        self.assertEqual(keys, self.tsigs())
+        # one paged search, then the six changes in two batches
+        self.assertEqual({'GET tsig': 1, 'POST request': 2},
+                         self.session.call_counts())
+
+    def test_create_tsigs_up_to_date(self):
+        self.wapi.add('tsig', {'name': 'key', 'key': 'c2VjcmV0'})
+        ib = self.make_infoblox()
+        self.assertEqual((0, 0), ib.create_tsigs({'key': 'c2VjcmV0'}))
+        self.assertEqual({'GET tsig': 1}, self.session.call_counts())
+
+    def test_delete_tsigs(self):
+        for i in range(3):
+            self.wapi.add('tsig', {'name': 'key%d' % i, 'key': 'c2VjcmV0'})
+        ib = self.make_infoblox()
+        self.assertEqual(2, ib.delete_tsigs(['key0', 'key2', 'missing']))
+        self.assertEqual({'key1': 'c2VjcmV0'}, self.tsigs())
+        self.assertEqual({'GET tsig': 1, 'POST request': 1},
+                         self.session.call_counts())
+
+    def test_tsig_lookup_is_by_name(self):
+        request = self.patchobject(self.session, 'request',
+                                   wraps=self.session.request)
+        ib = self.make_infoblox()
+        ib.create_tsig('key', 'hmac-md5', 'c2VjcmV0')
+        ib.create_tsig('key', 'hmac-md5', 'c2VjcmV0')
+        self.assertEqual({'key': 'c2VjcmV0'}, self.tsigs())
+        ib.delete_tsig('key', 'hmac-md5', 'c2VjcmV0')
+        self.assertEqual({}, self.tsigs())
+        lookups = [str(c) for c in request.call_args_list if c[0][0] == 'GET']
+        self.assertEqual(3, len(lookups))
+        self.assertFalse([c for c in lookups if 'c2VjcmV0' in c])
+
+    def test_tsig_with_other_secret_is_rotated(self):
+        self.wapi.add('tsig', {'name': 'key', 'key': 'b2xk'})
+        ib = self.make_infoblox()
+        ib.create_tsig('key', 'hmac-md5', 'c2VjcmV0')
+        self.assertEqual({'key': 'c2VjcmV0'}, self.tsigs())
+        ib.create_tsig('key', 'hmac-md5', 'c2VjcmV0')
+        self.assertEqual({'GET tsig': 2, 'PUT tsig': 1},
+                         self.session.call_counts())
+
+    def test_parallel_map_is_bounded_and_ordered(self):
+        lock = threading.Lock()
+        running = [0, 0]
+
+        def call(i):
+            with lock:
+                running[0] += 1
+                running[1] = max(running)
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+            if i % 3 == 0:
+                raise ValueError(i)
+            return i * 2
+
+        results = object_manipulator.parallel_map(call, range(10), 4)
+        self.assertEqual(4, running[1])
+        self.assertEqual([1, 2, 4, 5, 7, 8],
+                         [i for i, r in enumerate(results) if r == i * 2])
+        self.assertEqual([0, 3, 6, 9],
+                         [r.args[0] for r in results
+                          if isinstance(r, ValueError)])
+
+    def test_map_get_members(self):
+        for i in range(5):
+            self.wapi.add('member', {'host_name': 'member-%d' % i})
+        ib = self.make_infoblox(http_pool_maxsize=2)
+        names = ['member-3', 'missing', 'member-0']
+        members = ib.map_get_members(names, ['host_name'])
+        self.assertEqual([['member-3'], [], ['member-0']],
+                         [[m['host_name'] for m in r] for r in members])
+
+    def test_map_update_ns_groups(self):
+        for name in ('a', 'b'):
+            self.wapi.add('nsgroup', {'name': name})
+        ib = self.make_infoblox()
+        ib.map_update_ns_groups([('a', {'comment': 'first'}),
+                                 ('b', {'comment': 'second'})])
+        self.assertEqual({'a': 'first', 'b': 'second'},
+                         dict((g['name'], g['comment'])
+                              for g in self.wapi.search('nsgroup')))
+
+    def test_map_delete_objects_collects_errors(self):
+        refs = [self.wapi.add('tsig', {'name': 'key%d' % i})
+                for i in range(3)]
+        self.wapi.handle('DELETE', refs[1], {}, None)
+        ib = self.make_infoblox()
+        results = ib.map_delete_objects(refs)
+        self.assertEqual(refs[0], results[0])
+        self.assertIsInstance(results[1], exc.InfobloxCannotDeleteObject)
+        self.assertEqual(refs[2], results[2])
+        self.assertEqual([], self.wapi.search('tsig'))
+
+    def test_lookups_from_snapshot(self):
+        for i in range(3):
+            self.wapi.add('member', {'host_name': 'member-%d' % i,
+                                     'platform': 'VNIOS'})
+        self.wapi.add('nsgroup', {'name': 'group',
+                                  'grid_primary': [{'name': 'member-0'}],
+                                  'grid_secondaries': [{'name': 'member-1'}]})
+        self.wapi.add('view', {'name': 'default', 'network_view': 'default'})
+        ib = self.make_infoblox(snapshot_ttl=60)
+        for i in range(3):
+            member = ib.get_member('member-%d' % i, ['host_name',
+                                                     'platform'])
+            self.assertEqual('member-%d' % i, member[0]['host_name'])
+        self.assertEqual([], ib.get_member('missing', ['host_name']))
+        self.assertEqual(['member-1'], [m['name'] for m in ib.get_ns_group(
+            'group', ['grid_secondaries'])[0]['grid_secondaries']])
+        self.assertEqual(['group'], ib.get_ns_groups_of_member('member-0'))
+        self.assertEqual('default', ib.get_view(
+            'default', ['network_view'])[0]['network_view'])
+        # one paged search per object type, shared by other manipulators
+        self.make_infoblox(snapshot_ttl=60).get_member('member-0')
+        self.assertEqual({'GET member': 1, 'GET nsgroup': 1, 'GET view': 1},
+                         self.session.call_counts())
+
+    def test_snapshot_follows_own_writes(self):
+        self.wapi.add('nsgroup', {'name': 'group', 'grid_primary': [],
+                                  'grid_secondaries': []})
+        ib = self.make_infoblox(snapshot_ttl=60)
+        self.assertEqual([], ib.get_ns_groups_of_member('member'))
+        group = ib.get_ns_group('group', ['name', 'grid_primary',
+                                          'grid_secondaries'],
+                                for_update=True)[0]
+        group['grid_primary'].append({'name': 'member'})
+        ib.update_ns_group('group', group)
+        self.assertEqual(['group'], ib.get_ns_groups_of_member('member'))
+
+        ib.create_member(name='member')
+        self.assertEqual(['member'], [m['host_name'] for m in
+                                      ib.get_member('member')])
+        ib.delete_member('member')
+        self.assertEqual([], ib.get_member('member'))
+        # the snapshot was loaded once; the others are the read for update
+        # and the lookup of the update
+        self.assertEqual(3, self.session.call_counts()['GET nsgroup'])
+
+    def test_member_writes_keep_snapshot(self):
+        self.wapi.add('member', {'host_name': 'member', 'platform': 'VNIOS',
+                                 'vip_setting': {}, 'ipv6_setting': {}})
+        ib = self.make_infoblox(snapshot_ttl=60)
+        ib.get_member('member')
+        ib.pre_provision_member('member', 'IB-VM-820')
+        ib.pre_provision_member('member', 'IB-VM-1420')
+        self.assertEqual(['member'], [m['host_name'] for m in
+                                      ib.get_member('member')])
+        self.assertEqual(1, self.session.call_counts()['GET member'] -
+                         self.session.call_counts()['PUT member'])
+
+    def test_snapshot_is_opt_in(self):
+        self.wapi.add('member', {'host_name': 'member'})
+        ib = self.make_infoblox()
+        self.assertIsNone(ib.snapshot)
+        ib.get_member('member')
+        ib.get_member('member')
+        self.assertEqual({'GET member': 2}, self.session.call_counts())
+
+    def make_cached_infoblox(self, **options):
+        """Return a manipulator with a ref cache, as after an engine start."""
+        if not hasattr(self, 'cache_file'):
+            tmp_dir = tempfile.mkdtemp()
+            self.addCleanup(shutil.rmtree, tmp_dir)
+            self.cache_file = os.path.join(tmp_dir, 'refs.sqlite')
+        for cache in refcache._caches.values():
+            cache.close()
+        refcache._caches.clear()
+        self.session.calls = []
+        return self.make_infoblox(ref_cache_file=self.cache_file, **options)
+
+    def test_refs_are_cached_across_restarts(self):
+        self.wapi.add('nsgroup', {'name': 'group'})
+        self.make_cached_infoblox().update_ns_group('group', {'comment': 'a'})
+        self.assertEqual({'GET nsgroup': 1, 'PUT nsgroup': 1},
+                         self.session.call_counts())
+
+        ib = self.make_cached_infoblox()
+        ib.update_ns_group('group', {'comment': 'b'})
+        self.assertEqual({'PUT nsgroup': 1}, self.session.call_counts())
+        self.assertEqual('b', self.wapi.search('nsgroup')[0]['comment'])
+
+        # the ref of a created object is remembered too
+        ib.create_tsig('key', 'HMAC-MD5', 'c2VjcmV0')
+        self.make_cached_infoblox().delete_tsig('key', None, None)
+        self.assertEqual({'DELETE tsig': 1}, self.session.call_counts())
+        self.assertEqual([], self.wapi.search('tsig'))
+
+    def test_stale_ref_is_looked_up_again(self):
+        self.wapi.add('tsig', {'name': 'key'})
+        self.make_cached_infoblox().delete_tsig('key', None, None)
+        # created again by someone else, with another ref
+        self.wapi.add('tsig', {'name': 'key'})
+        ib = self.make_cached_infoblox()
+        ib.connector.ref_cache.put_ref(ib.connector.url, 'tsig',
+                                       refcache.natural_key({'name': 'key'}),
+                                       'tsig/ZG5z999:key')
+        ib.delete_tsig('key', None, None)
+        self.assertEqual([], self.wapi.search('tsig'))
+        self.assertEqual({'DELETE tsig': 2, 'GET tsig': 1},
+                         self.session.call_counts())
+
+    def test_searches_are_cached_until_written(self):
+        self.wapi.add('member', {'host_name': 'member'})
+        fields = ['host_name', 'vip_setting']
+        self.make_cached_infoblox().get_member('member', fields)
+        ib = self.make_cached_infoblox()
+        self.assertEqual('member',
+                         ib.get_member('member', fields)[0]['host_name'])
+        self.assertEqual({}, self.session.call_counts())
+
+        # a write by another worker outdates the cached searches
+        self.make_cached_infoblox().pre_provision_member('member', 'IB-VM-820')
+        self.session.calls = []
+        ib.get_member('member', fields)
+        self.assertEqual({'GET member': 1}, self.session.call_counts())
+
+    def test_cached_searches_are_per_user(self):
+        self.wapi.add('member', {'host_name': 'member'})
+        self.make_cached_infoblox().get_member('member')
+        self.make_cached_infoblox(username='other').get_member('member')
+        self.assertEqual({'GET member': 1}, self.session.call_counts())
+
+    def test_missed_bump_is_logged(self):
+        ib = self.make_cached_infoblox()
+        self.patchobject(ib.connector.ref_cache, 'bump', return_value=False)
+        log = self.patchobject(connector.LOG, 'warning')
+        ib.create_tsig('key', 'hmac-md5', 'c2VjcmV0')
+        self.assertEqual('tsig', log.call_args[0][1])
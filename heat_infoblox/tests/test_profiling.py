@@ -0,0 +1,90 @@
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import pstats
+import shutil
+import tempfile
+
+import fixtures
+
+from heat.tests import common
+
+from heat_infoblox import config
+from heat_infoblox import profiling
+
+
+@profiling.profile_cls
+class FakeResource(object):
+    name = 'my/resource'
+
+    def handle_create(self):
+        return [b'x' * 1024 for i in range(100)]
+
+    def handle_delete(self):
+        return self.handle_create()
+
+
+class ProfilingTest(common.HeatTestCase):
+    def setUp(self):
+        super(ProfilingTest, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.resource = FakeResource()
+
+    def enable(self):
+        self.useFixture(fixtures.EnvironmentVariable(profiling.ENV_DIR,
+                                                     self.tmp_dir))
+
+    def test_disabled(self):
+        self.useFixture(fixtures.EnvironmentVariable(profiling.ENV_DIR))
+        self.assertEqual(100, len(self.resource.handle_create()))
+        self.assertEqual([], os.listdir(self.tmp_dir))
+
+    def test_profile_written(self):
+        self.enable()
+        self.assertEqual(100, len(self.resource.handle_create()))
+        names = sorted(os.listdir(self.tmp_dir))
+        self.assertIn('-FakeResource-my_resource-handle_create.prof',
+                      names[0])
+        stats = pstats.Stats(os.path.join(self.tmp_dir, names[0]))
+        self.assertTrue(any(func[2] == 'handle_create'
+                            for func in stats.stats))
+        tracemalloc = profiling.get_tracemalloc()
+        if tracemalloc is not None:
+            self.assertTrue(names[1].endswith('.tracemalloc'))
+            tracemalloc.Snapshot.load(
+                os.path.join(self.tmp_dir, names[1]))
+
+    def test_nested_action_not_profiled(self):
+        self.enable()
+        self.resource.handle_delete()
+        names = os.listdir(self.tmp_dir)
+        self.assertTrue(all('handle_delete' in name for name in names))
+
+    def test_rotation(self):
+        self.enable()
+        old = os.path.join(self.tmp_dir, 'old.prof')
+        with open(old, 'w') as f:
+            f.write('x' * 1000)
+        os.utime(old, (0, 0))
+        other = os.path.join(self.tmp_dir, 'notes.txt')
+        with open(other, 'w') as f:
+            f.write('x' * 1000)
+        self.patchobject(config.CONF.infoblox, 'profile_max_bytes', new=1)
+        self.resource.handle_create()
+        names = os.listdir(self.tmp_dir)
+        self.assertNotIn('old.prof', names)
+        self.assertIn('notes.txt', names)
@@ -0,0 +1,179 @@
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import copy
+
+from oslo_config import cfg
+
+cfg.CONF.import_opt('plugin_dirs', 'heat.common.config')
+cfg.CONF.set_override('plugin_dirs', '/opt/stack/heat-infoblox/heat_infoblox')
+
+from heat.engine import stack
+from heat.engine import template
+from heat.tests import common
+from heat.tests import utils
+from heat_infoblox import constants
+from heat_infoblox import metrics
+from heat_infoblox import object_manipulator
+from heat_infoblox.resources import record_set
+from heat_infoblox.tests import fakes
+
+
+my_template = {
+    'heat_template_version': '2013-05-23',
+    'resources': {
+        'records': {
+            'type': 'Infoblox::DNS::RecordSet',
+            'properties': {
+                'connection': {'url': 'https://infoblox/wapi/v2.3/',
+                               'username': 'admin',
+                               'password': 'infoblox'},
+                'zone': 'example.com',
+                'records': [
+                    {'type': 'A', 'name': 'www', 'value': '10.0.0.1'},
+                    {'type': 'A', 'name': 'www', 'value': '10.0.0.2',
+                     'ttl': 60},
+                    {'type': 'AAAA', 'name': '@',
+                     'value': '2001:db8:0:0::1'},
+                    {'type': 'CNAME', 'name': 'web',
+                     'value': 'www.example.com.'},
+                ]
+            }
+        }
+    }
+}
+
+
+class RecordSetTest(common.HeatTestCase):
+    def setUp(self):
+        super(RecordSetTest, self).setUp()
+        self.useFixture(fakes.Registries())
+        self.ctx = utils.dummy_context()
+        self.wapi = fakes.FakeWapi()
+        self.wapi.add('zone_auth', {'fqdn': 'example.com',
+                                    'view': 'default'})
+        self.session = fakes.FakeWapiSession(self.wapi)
+        self.record_set = self.make_record_set(my_template)
+
+    def make_record_set(self, tmpl):
+        stk = stack.Stack(self.ctx, 'record_set_test_stack',
+                          template.Template(tmpl))
+        res = stk['records']
+        conn = fakes.make_connector(self.session)
+        res.infoblox_object = object_manipulator.InfobloxObjectManipulator(
+            conn)
+        return res
+
+    def records(self):
+        return sorted(
+            (objtype, r['name'],
+             r[constants.RECORD_VALUE_FIELDS[objtype]],
+             r.get('ttl'))
+            for objtype in record_set.RECORD_TYPES.values()
+            for r in self.wapi.search(objtype))
+
+    def test_resource_mapping(self):
+        mapping = record_set.resource_mapping()
+        self.assertEqual(1, len(mapping))
+        self.assertEqual(record_set.RecordSet,
+                         mapping['Infoblox::DNS::RecordSet'])
+
+    def test_handle_create(self):
+        self.record_set.handle_create()
+        self.assertEqual(
+            [('record:a', 'www.example.com', '10.0.0.1', None),
+             ('record:a', 'www.example.com', '10.0.0.2', 60),
+             ('record:aaaa', 'example.com', '2001:db8::1', None),
+             ('record:cname', 'web.example.com', 'www.example.com', None)],
+            self.records())
+        self.assertEqual('default/example.com', self.record_set.resource_id)
+        # one search per record type, then one multi-request
+        self.assertEqual({'GET record:a': 1, 'GET record:aaaa': 1,
+                          'GET record:cname': 1, 'POST request': 1},
+                         self.session.call_counts())
+
+    def test_create_is_batched_in_order(self):
+        tmpl = copy.deepcopy(my_template)
+        tmpl['resources']['records']['properties']['records'] = [
+            {'type': 'A', 'name': 'host%03d' % i, 'value': '10.0.1.%d' % i}
+            for i in reversed(range(250))]
+        batches = []
+        self.record_set = self.make_record_set(tmpl)
+        multi_request = self.record_set.infoblox().connector.multi_request
+
+        def record_batch(calls):
+            batches.append([call['data']['name'] for call in calls])
+            return multi_request(calls)
+
+        self.patchobject(self.record_set.infoblox().connector,
+                         'multi_request', side_effect=record_batch)
+        self.record_set.handle_create()
+        self.assertEqual([100, 100, 50], [len(b) for b in batches])
+        names = sum(batches, [])
+        self.assertEqual(sorted(names), names)
+
+    def test_handle_update_only_changes_differences(self):
+        self.record_set.handle_create()
+        self.session.calls = []
+        records = copy.deepcopy(
+            my_template['resources']['records']['properties']['records'])
+        # drop one, change a TTL, add one, keep the others
+        del records[0]
+        records[0]['ttl'] = 120
+        records.append({'type': 'PTR', 'name': '1.0.0.10.in-addr.arpa.',
+                        'value': 'www.example.com'})
+        self.wapi.add('zone_auth', {'fqdn': '10.in-addr.arpa',
+                                    'view': 'default'})
+        self.record_set.handle_update(None, None, {'records': records})
+
+        self.assertEqual(
+            [('record:a', 'www.example.com', '10.0.0.2', 120),
+             ('record:aaaa', 'example.com', '2001:db8::1', None),
+             ('record:cname', 'web.example.com', 'www.example.com', None),
+             ('record:ptr', '1.0.0.10.in-addr.arpa', 'www.example.com',
+              None)],
+            self.records())
+        self.assertEqual({'GET record:a': 1, 'GET record:aaaa': 1,
+                          'GET record:cname': 1, 'GET record:ptr': 1,
+                          'POST request': 1},
+                         self.session.call_counts())
+
+    def test_unchanged_update_makes_no_change(self):
+        self.record_set.handle_create()
+        self.session.calls = []
+        log = self.patchobject(metrics.LOG, 'log')
+        self.patchobject(metrics.LOG, 'isEnabledFor', return_value=True)
+        records = my_template['resources']['records']['properties']['records']
+        self.record_set.handle_update(None, None, {'records': records})
+        self.assertNotIn('POST request', self.session.call_counts())
+        self.assertEqual('handle_update', log.call_args[0][4])
+
+    def test_handle_delete_leaves_other_records(self):
+        other = self.wapi.add('record:a', {'name': 'other.example.com',
+                                           'ipv4addr': '10.0.0.9',
+                                           'zone': 'example.com',
+                                           'view': 'default'})
+        self.record_set.handle_create()
+        self.record_set.handle_delete()
+        self.assertEqual([other], [r['_ref']
+                                   for r in self.wapi.search('record:a')])
+        self.assertEqual([], self.wapi.search('record:cname'))
+
+    def test_records_attribute(self):
+        self.record_set.handle_create()
+        records = self.record_set._resolve_attribute('records')
+        self.assertEqual(4, len(records))
+        self.assertEqual({'type': 'A', 'name': 'www.example.com',
+                          'value': '10.0.0.2', 'ttl': 60}, records[1])
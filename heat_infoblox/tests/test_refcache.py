@@ -0,0 +1,151 @@
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+import mock
+
+from heat.tests import common
+
+from heat_infoblox import refcache
+
+
+GRID = 'https://infoblox/wapi/v2.3/'
+
+
+class RefCacheTest(common.HeatTestCase):
+    def setUp(self):
+        super(RefCacheTest, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.path = os.path.join(self.tmp_dir, 'refs.sqlite')
+        self.cache = self.make_cache()
+
+    def make_cache(self, ttl=300):
+        # as another engine worker, or the engine after a restart
+        cache = refcache.RefCache(self.path, ttl)
+        self.addCleanup(cache.close)
+        return cache
+
+    def test_refs(self):
+        key = refcache.natural_key({'host_name': 'member'})
+        self.assertIsNone(self.cache.get_ref(GRID, 'member', key))
+        self.cache.put_ref(GRID, 'member', key, 'member/ZG5z1:member')
+        self.assertEqual('member/ZG5z1:member',
+                         self.make_cache().get_ref(GRID, 'member', key))
+        self.assertIsNone(self.cache.get_ref('https://other/', 'member', key))
+
+        self.cache.forget_ref(GRID, 'member/ZG5z1:member')
+        self.assertIsNone(self.make_cache().get_ref(GRID, 'member', key))
+
+    def test_natural_key_is_stable(self):
+        self.assertEqual(refcache.natural_key({'a': 1, 'b': 2}),
+                         refcache.natural_key({'b': 2, 'a': 1}))
+        self.assertEqual(refcache.natural_key({}), refcache.natural_key(None))
+
+    def test_entries_expire(self):
+        with mock.patch.object(refcache.time, 'time', return_value=1000):
+            self.cache.put_ref(GRID, 'member', 'key', 'member/ZG5z1:m')
+            self.cache.put_result(GRID, 'member', 'query', b'[]', 0)
+        with mock.patch.object(refcache.time, 'time', return_value=1300):
+            self.assertEqual('member/ZG5z1:m',
+                             self.cache.get_ref(GRID, 'member', 'key'))
+            self.assertEqual(b'[]',
+                             self.cache.get_result(GRID, 'member', 'query'))
+        with mock.patch.object(refcache.time, 'time', return_value=1301):
+            self.assertIsNone(self.cache.get_ref(GRID, 'member', 'key'))
+            self.assertIsNone(self.cache.get_result(GRID, 'member', 'query'))
+
+    def test_bump_outdates_results_of_all_workers(self):
+        other = self.make_cache()
+        version = self.cache.version(GRID, 'nsgroup')
+        self.cache.put_result(GRID, 'nsgroup', 'query', b'[1]', version)
+        self.assertEqual(b'[1]', other.get_result(GRID, 'nsgroup', 'query'))
+
+        other.bump(GRID, 'nsgroup')
+        self.assertIsNone(self.cache.get_result(GRID, 'nsgroup', 'query'))
+        # a result read before the bump is stored with the version before
+        self.cache.put_result(GRID, 'nsgroup', 'query', b'[1]', version)
+        self.assertIsNone(self.cache.get_result(GRID, 'nsgroup', 'query'))
+        self.assertEqual(version + 1, self.cache.version(GRID, 'nsgroup'))
+
+    def test_large_results_are_not_cached(self):
+        content = b'x' * (refcache.MAX_RESULT_BYTES + 1)
+        self.cache.put_result(GRID, 'member', 'query', content, 0)
+        self.assertIsNone(self.cache.get_result(GRID, 'member', 'query'))
+
+    def test_concurrent_workers(self):
+        caches = [self.make_cache() for i in range(4)]
+
+        def work(cache):
+            for i in range(25):
+                cache.bump(GRID, 'member')
+                cache.put_ref(GRID, 'member', 'key%d' % i, 'ref%d' % i)
+
+        threads = [threading.Thread(target=work, args=(c,)) for c in caches]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        # no bump is lost; refs stored while another worker holds the lock
+        # are not, which is a later cache miss
+        self.assertEqual(100, self.cache.version(GRID, 'member'))
+
+    def lock(self):
+        # as another worker in the middle of a write
+        self.cache.version(GRID, 'member')
+        holder = sqlite3.connect(self.path, isolation_level=None)
+        self.addCleanup(holder.close)
+        holder.execute('BEGIN IMMEDIATE')
+        return holder
+
+    def test_locked_database_is_a_miss(self):
+        self.cache.put_ref(GRID, 'member', 'key', 'ref')
+        holder = self.lock()
+        started = time.time()
+        self.cache.put_ref(GRID, 'member', 'other', 'ref2')
+        self.assertLess(time.time() - started, 0.5)
+        # readers do not wait for the writer
+        self.assertEqual('ref', self.cache.get_ref(GRID, 'member', 'key'))
+        holder.execute('ROLLBACK')
+        self.assertIsNone(self.cache.get_ref(GRID, 'member', 'other'))
+
+    def test_bump_is_retried_while_locked(self):
+        holder = self.lock()
+        sleep = self.patchobject(refcache.time, 'sleep',
+                                 side_effect=lambda delay: holder.execute(
+                                     'ROLLBACK'))
+        self.assertTrue(self.cache.bump(GRID, 'member'))
+        sleep.assert_called_once_with(refcache.BUMP_RETRY_DELAY)
+        self.assertEqual(1, self.cache.version(GRID, 'member'))
+
+        self.lock()
+        self.patchobject(refcache, 'BUMP_RETRIES', new=2)
+        sleep = self.patchobject(refcache.time, 'sleep')
+        self.assertFalse(self.cache.bump(GRID, 'member'))
+        self.assertEqual(2, sleep.call_count)
+
+    def test_database_errors_are_misses(self):
+        cache = self.make_cache()
+        cache.path = os.path.join(self.tmp_dir, 'missing', 'refs.sqlite')
+        self.assertIsNone(cache.get_ref(GRID, 'member', 'key'))
+        cache.put_ref(GRID, 'member', 'key', 'ref')
+        cache.bump(GRID, 'member')
+        self.assertIsNone(cache.version(GRID, 'member'))
@@ -0,0 +1,116 @@
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import shutil
+import tempfile
+
+import mock
+
+from heat.tests import common
+
+from heat_infoblox import connector
+from heat_infoblox import ibexceptions as exc
+from heat_infoblox import replay
+from heat_infoblox.tests import fakes
+
+
+def make_response(status_code, content):
+    return mock.Mock(status_code=status_code, content=content,
+                     headers={'Content-Type': 'application/json'})
+
+
+class ReplayTest(common.HeatTestCase):
+    def setUp(self):
+        super(ReplayTest, self).setUp()
+        self.useFixture(fakes.Registries())
+        self.sleep = self.patchobject(replay.time, 'sleep')
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+    def make_connector(self, url='https://infoblox/wapi/v2.3/', **options):
+        opts = {'url': url, 'username': 'admin', 'password': 'infoblox'}
+        opts.update(options)
+        return connector.Infoblox(opts)
+
+    def record(self, path):
+        conn = self.make_connector(record_file=path)
+        conn.session.session = mock.Mock()
+        conn.session.session.request.side_effect = [
+            make_response(200, b'[{"_ref": "member/b25l:a", '
+                               b'"host_name": "a"}]'),
+            make_response(201, b'"tsig/ZG5z:key"'),
+        ]
+        conn.get_object('member', {'host_name': 'a'})
+        conn.create_object('tsig', {'name': 'key', 'key': 'c2VjcmV0'})
+        replay.get_recorder(path).close()
+
+    def test_record_and_replay(self):
+        for name in ('trace.jsonl', 'trace.jsonl.gz'):
+            path = os.path.join(self.tmp_dir, name)
+            self.record(path)
+
+            conn = self.make_connector(url='https://replay/wapi/v2.3/',
+                                       replay_file=path)
+            self.assertEqual([{'_ref': 'member/b25l:a', 'host_name': 'a'}],
+                             conn.get_object('member', {'host_name': 'a'}))
+            self.assertEqual('tsig/ZG5z:key',
+                             conn.create_object('tsig', {'name': 'key',
+                                                         'key': 'other'}))
+
+    def test_secrets_are_masked(self):
+        path = os.path.join(self.tmp_dir, 'trace.jsonl')
+        self.record(path)
+        with open(path) as f:
+            trace = f.read()
+        self.assertNotIn('c2VjcmV0', trace)
+        self.assertIn('"path":"/wapi/v2.3/member"', trace)
+
+    def test_time_scale(self):
+        path = os.path.join(self.tmp_dir, 'trace.jsonl')
+        with open(path, 'w') as f:
+            f.write('{"at":0,"body":"null","content":"[]","elapsed":0.5,'
+                    '"headers":{},"method":"GET","path":"/wapi/v2.3/view",'
+                    '"status":200}\n')
+        conn = self.make_connector(replay_file=path, replay_time_scale=0.1)
+        conn.get_object('view')
+        self.sleep.assert_called_once_with(0.05)
+
+        self.sleep.reset_mock()
+        conn = self.make_connector(replay_file=path, replay_time_scale=0)
+        conn.get_object('view')
+        self.assertFalse(self.sleep.called)
+
+    def test_last_exchange_is_served_again(self):
+        path = os.path.join(self.tmp_dir, 'trace.jsonl')
+        self.record(path)
+        conn = self.make_connector(replay_file=path, replay_time_scale=0)
+        for i in range(3):
+            self.assertEqual(1, len(conn.get_object('member',
+                                                    {'host_name': 'a'})))
+
+    def test_missing_exchange(self):
+        path = os.path.join(self.tmp_dir, 'trace.jsonl')
+        self.record(path)
+        conn = self.make_connector(replay_file=path, replay_time_scale=0)
+        self.assertRaises(exc.InfobloxSearchError, conn.get_object,
+                          'member', {'host_name': 'b'})
+
+    def test_request_key_ignores_host_and_order(self):
+        self.assertEqual(
+            replay.request_key('GET', 'https://a/wapi/v2.3/member?b=1&a=2',
+                               b'{"x": 1, "y": 2}'),
+            replay.request_key('GET', 'https://b/wapi/v2.3/member?a=2&b=1',
+                               '{"y":2,"x":1}'))
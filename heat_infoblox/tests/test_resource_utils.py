@@ -13,13 +13,12 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
-import mock
-
 from heat.tests import common
 
 from heat_infoblox import config as cfg
 from heat_infoblox import connector
 from heat_infoblox import resource_utils
+from heat_infoblox.tests.benchmarks import import_time
 
 
 class ResourceUtilsTest(common.HeatTestCase):
@@ -28,12 +27,18 @@ class ResourceUtilsTest(common.HeatTestCase):
 
     def test_wapi_config_file(self):
 
-        connector.Infoblox = mock.MagicMock()
+        infoblox = self.patchobject(connector, 'Infoblox')
         resource_utils.connect_to_infoblox({'url': 'test_wapi_url',
                                             'username': 'test_username',
                                             'password': 'test_password',
                                             'sslverify': False})
-        connector.Infoblox.assert_called_with({'url': 'test_wapi_url',
-                                               'username': 'test_username',
-                                               'password': 'test_password',
-                                               'sslverify': False})
+        expected = resource_utils.connector_options()
+        expected.update({'url': 'test_wapi_url',
+                         'username': 'test_username',
+                         'password': 'test_password',
+                         'sslverify': False})
+        infoblox.assert_called_with(expected)
+
+    def test_plugins_defer_imports(self):
+        result = import_time.measure(import_time.PLUGINS)
+        self.assertEqual([], result['deferred'])
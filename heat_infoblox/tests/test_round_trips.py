@@ -0,0 +1,279 @@
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+
+import mock
+
+from oslo_config import cfg
+
+cfg.CONF.import_opt('plugin_dirs', 'heat.common.config')
+cfg.CONF.set_override('plugin_dirs', '/opt/stack/heat-infoblox/heat_infoblox')
+
+from heat.engine import stack
+from heat.engine import template
+from heat.tests import common
+from heat.tests import utils
+from heat_infoblox import object_manipulator
+from heat_infoblox.tests import fakes
+
+"""Round-trip budgets of the resource actions.
+
+Each action runs against the real connector and object manipulator, with
+the HTTP session replaced by a fake WAPI, and must make exactly the calls
+listed here. A change which adds a call must update its budget, so that
+the extra round trip is a deliberate, reviewed decision.
+"""
+
+BUDGETS = {
+    'grid_member_create': {
+        'neutron': {'show_port': 1, 'show_subnet': 1},
+        'wapi': {'GET member': 2, 'POST member': 1, 'PUT member': 1,
+                 'GET member:dns': 1, 'PUT member:dns': 1},
+    },
+    'grid_member_delete': {
+        'wapi': {'GET nsgroup': 2, 'PUT nsgroup': 1,
+                 'GET member': 1, 'DELETE member': 1},
+    },
+    'grid_member_user_data': {
+        'wapi': {'GET member': 1,
+                 'POST member?_function=read_token': 1},
+    },
+    'grid_member_user_data_new_token': {
+        'wapi': {'GET member': 1,
+                 'POST member?_function=read_token': 2,
+                 'POST member?_function=create_token': 1},
+    },
+    'ns_group_member_create': {
+        'wapi': {'GET nsgroup': 2, 'PUT nsgroup': 1},
+    },
+    'ns_group_member_delete': {
+        'wapi': {'GET nsgroup': 2, 'PUT nsgroup': 1},
+    },
+    'ns_group_member_attribute': {
+        'wapi': {'GET nsgroup': 1},
+    },
+    'netmri_job_create_by_id': {
+        'netmri': {'api_request scripts/run': 1},
+    },
+    'netmri_job_create_by_ip': {
+        'netmri': {'api_request virtual_networks/search': 1,
+                   'api_request devices/index': 1,
+                   'api_request scripts/run': 1},
+    },
+    'netmri_job_poll': {
+        'netmri': {'show job': 1},
+    },
+    'netmri_job_details': {
+        'netmri': {'api_request job_details/index': 1,
+                   'api_request devices/index': 1},
+    },
+}
+
+
+def client_calls(client):
+    """Count the calls made on a mock client by method and first argument.
+
+    Calls which take a path or an object type, e.g. NetMRI's api_request,
+    are counted separately for each one.
+    """
+    counts = collections.Counter()
+    for name, args, kwargs in client.method_calls:
+        if name in ('api_request', 'show'):
+            name = '%s %s' % (name, args[0])
+        counts[name] += 1
+    return dict(counts)
+
+
+class RoundTripTestBase(common.HeatTestCase):
+    def setUp(self):
+        super(RoundTripTestBase, self).setUp()
+        self.useFixture(fakes.Registries())
+        self.ctx = utils.dummy_context()
+        self.wapi = fakes.FakeWapi()
+        self.session = fakes.FakeWapiSession(self.wapi)
+
+    def make_infoblox(self):
+        conn = fakes.make_connector(self.session)
+        return object_manipulator.InfobloxObjectManipulator(conn)
+
+    def make_resource(self, name, resource_type, props):
+        tmpl = {
+            'heat_template_version': '2013-05-23',
+            'resources': {
+                name: {'type': resource_type, 'properties': props}
+            }
+        }
+        stk = stack.Stack(self.ctx, 'round_trip_test_stack',
+                          template.Template(tmpl))
+        return stk[name]
+
+    def assertBudget(self, budget, **clients):
+        """Check the calls made against the named budget.
+
+        The WAPI calls are always checked; other clients are passed as
+        keyword arguments named as in the budget, e.g. neutron=client.
+        """
+        expected = BUDGETS[budget]
+        self.assertEqual(expected.get('wapi', {}),
+                         self.session.call_counts(),
+                         'WAPI calls of %s' % budget)
+        for name, client in clients.items():
+            self.assertEqual(expected.get(name, {}), client_calls(client),
+                             '%s calls of %s' % (name, budget))
+
+
+class GridMemberRoundTripTest(RoundTripTestBase):
+    def setUp(self):
+        super(GridMemberRoundTripTest, self).setUp()
+        self.member = self.make_resource('my_member', 'Infoblox::Grid::Member',
+                                         {'name': 'my-name',
+                                          'gm_ip': '10.1.1.2',
+                                          'gm_certificate': 'testing',
+                                          'LAN1': 'abc123',
+                                          'dns': {'enable': True}})
+        self.member.infoblox_object = self.make_infoblox()
+        self.neutron = mock.Mock()
+        self.neutron.show_port.return_value = {'port': {'fixed_ips': [
+            {'ip_address': '1.1.1.2', 'subnet_id': 'subnet-1'}]}}
+        self.neutron.show_subnet.return_value = {'subnet': {
+            'cidr': '1.1.1.0/24', 'gateway_ip': '1.1.1.1'}}
+        self.member.client = mock.Mock(return_value=self.neutron)
+
+    def test_create(self):
+        self.member.handle_create()
+        self.assertBudget('grid_member_create', neutron=self.neutron)
+        self.assertEqual(1, len(self.wapi.search('member')))
+
+    def test_delete(self):
+        self.wapi.add('member', {'host_name': 'my-name'})
+        self.wapi.add('nsgroup', {
+            'name': 'with-member',
+            'grid_primary': [{'name': 'my-primary'}],
+            'grid_secondaries': [{'name': 'my-name'}]})
+        self.wapi.add('nsgroup', {
+            'name': 'without-member',
+            'grid_primary': [{'name': 'my-primary'}],
+            'grid_secondaries': []})
+        self.member.resource_id = 'my-name'
+        self.member.handle_delete()
+        self.assertBudget('grid_member_delete', neutron=self.neutron)
+        self.assertEqual([], self.wapi.search('member'))
+
+    def test_user_data(self):
+        ref = self.wapi.add('member', {'host_name': 'my-name'})
+        self.wapi.handle('POST', ref, {'_function': 'create_token'}, {})
+        self.member.resource_id = 'my-name'
+        user_data = self.member._resolve_attribute('user_data')
+        self.assertIn('token: token-my-name', user_data)
+        self.assertBudget('grid_member_user_data', neutron=self.neutron)
+
+    def test_user_data_new_token(self):
+        self.wapi.add('member', {'host_name': 'my-name'})
+        self.member.resource_id = 'my-name'
+        user_data = self.member._resolve_attribute('user_data')
+        self.assertIn('token: token-my-name', user_data)
+        self.assertBudget('grid_member_user_data_new_token',
+                          neutron=self.neutron)
+
+
+class NameServerGroupMemberRoundTripTest(RoundTripTestBase):
+    def setUp(self):
+        super(NameServerGroupMemberRoundTripTest, self).setUp()
+        self.wapi.add('nsgroup', {'name': 'foo',
+                                  'grid_primary': [{'name': 'my-primary'}],
+                                  'grid_secondaries': []})
+        self.ns_group_member = self.make_resource(
+            'ns_group_member', 'Infoblox::Grid::NameServerGroupMember',
+            {'group_name': 'foo',
+             'member_server': {'name': 'my-member'},
+             'member_role': 'grid_secondary'})
+        self.ns_group_member.infoblox_object = self.make_infoblox()
+
+    def test_create(self):
+        self.ns_group_member.resource_id = None
+        self.ns_group_member.handle_create()
+        self.assertBudget('ns_group_member_create')
+        group = self.wapi.search('nsgroup')[0]
+        self.assertEqual(['my-member'],
+                         [m['name'] for m in group['grid_secondaries']])
+
+    def test_delete(self):
+        self.ns_group_member.resource_id = 'foo/grid_secondary/my-member'
+        self.ns_group_member.handle_delete()
+        self.assertBudget('ns_group_member_delete')
+
+    def test_attribute(self):
+        group = self.ns_group_member._resolve_attribute('name_server_group')
+        self.assertEqual('foo', group['name'])
+        self.assertBudget('ns_group_member_attribute')
+
+
+class NetMRIJobRoundTripTest(RoundTripTestBase):
+    def make_job(self, targets):
+        job = self.make_resource('job', 'Infoblox::NetMRI::Job',
+                                 {'source': {'script': 'my-script'},
+                                  'targets': targets})
+        job.netmri_object = mock.Mock()
+        return job
+
+    def test_create_by_id(self):
+        job = self.make_job([{'device_id': '1'}, {'device_id': '2'}])
+        job.netmri_object.api_request.return_value = {'JobID': 10}
+        job.resource_id = None
+        job.handle_create()
+        self.assertBudget('netmri_job_create_by_id',
+                          netmri=job.netmri_object)
+
+    def test_create_by_ip(self):
+        job = self.make_job([
+            {'device_ip_address': '10.0.0.1', 'network_view': 'default'},
+            {'device_ip_address': '10.0.0.2', 'network_view': 'default'}])
+        responses = {
+            'virtual_networks/search': {'virtual_networks': [
+                {'VirtualNetworkID': 1, 'VirtualNetworkName': 'default'}]},
+            'devices/index': {'devices': [
+                {'DeviceID': 5, 'DeviceIPDotted': '10.0.0.1',
+                 'VirtualNetworkID': 1},
+                {'DeviceID': 6, 'DeviceIPDotted': '10.0.0.2',
+                 'VirtualNetworkID': 1}]},
+            'scripts/run': {'JobID': 10},
+        }
+        job.netmri_object.api_request.side_effect = (
+            lambda path, params: responses[path])
+        job.resource_id = None
+        job.handle_create()
+        self.assertBudget('netmri_job_create_by_ip',
+                          netmri=job.netmri_object)
+
+    def test_poll(self):
+        job = self.make_job([{'device_id': '1'}])
+        job.netmri_object.show.return_value = {'completed_at': None}
+        job.resource_id = '10'
+        self.assertFalse(job.check_create_complete(None))
+        self.assertBudget('netmri_job_poll', netmri=job.netmri_object)
+
+    def test_details(self):
+        job = self.make_job([{'device_id': '1'}])
+        responses = {
+            'job_details/index': {'job_details': [{'DeviceID': 1}]},
+            'devices/index': {'devices': [{'DeviceID': 1}]},
+        }
+        job.netmri_object.api_request.side_effect = (
+            lambda path, params: responses[path])
+        job.resource_id = '10'
+        details = job._resolve_attribute('job_details')
+        self.assertEqual({'DeviceID': 1}, details[0]['device'])
+        self.assertBudget('netmri_job_details', netmri=job.netmri_object)
@@ -0,0 +1,117 @@
+# Copyright 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import mock
+
+from heat.tests import common
+
+from heat_infoblox import snapshot
+
+
+GROUPS = [
+    {'_ref': 'nsgroup/ZG5z1:a', 'name': 'a',
+     'grid_primary': [{'name': 'm1', 'stealth': False}],
+     'grid_secondaries': [{'name': 'm2'}]},
+    {'_ref': 'nsgroup/ZG5z2:b', 'name': 'b',
+     'grid_primary': [{'name': 'm2'}], 'grid_secondaries': []},
+]
+
+
+class SnapshotTest(common.HeatTestCase):
+    def setUp(self):
+        super(SnapshotTest, self).setUp()
+        self.load = mock.Mock(side_effect=lambda objtype, fields: GROUPS)
+        self.snapshot = snapshot.Snapshot(ttl=60)
+
+    def lookup(self, name=None, return_fields=None):
+        return self.snapshot.lookup('nsgroup', self.load, name,
+                                    return_fields)
+
+    def test_lookup_loads_once(self):
+        self.assertEqual([GROUPS[0]], self.lookup(
+            'a', ['name', 'grid_primary', 'grid_secondaries']))
+        self.assertEqual([{'_ref': 'nsgroup/ZG5z2:b', 'name': 'b'}],
+                         self.lookup('b'))
+        self.assertEqual([], self.lookup('missing'))
+        self.assertEqual(['a', 'b'], sorted(g['name'] for g in self.lookup()))
+        self.load.assert_called_once_with('nsgroup',
+                                          snapshot.FIELDS['nsgroup'])
+
+    def test_records_are_slotted(self):
+        self.lookup()
+        record = self.snapshot._tables['nsgroup'].by_name['a']
+        self.assertFalse(hasattr(record, '__dict__'))
+        self.assertIsInstance(record.grid_primary, tuple)
+
+    def test_callers_get_copies(self):
+        group = self.lookup('a', ['grid_primary'])[0]
+        group['grid_primary'].append({'name': 'm3'})
+        self.assertEqual([{'name': 'm1', 'stealth': False}],
+                         self.lookup('a', ['grid_primary'])[0]['grid_primary'])
+
+    def test_unknown_fields_are_not_answered(self):
+        self.assertIsNone(self.lookup('a', ['comment']))
+        self.assertIsNone(self.snapshot.lookup('zone_auth', self.load))
+        self.assertFalse(self.load.called)
+
+    def test_reload_after_ttl(self):
+        with mock.patch.object(snapshot.time, 'time', return_value=1000):
+            self.lookup('a')
+        with mock.patch.object(snapshot.time, 'time', return_value=1059):
+            self.lookup('a')
+        self.assertEqual(1, self.load.call_count)
+        with mock.patch.object(snapshot.time, 'time', return_value=1060):
+            self.lookup('a')
+        self.assertEqual(2, self.load.call_count)
+
+    def test_groups_of(self):
+        self.assertEqual(['a', 'b'], self.snapshot.groups_of('m2', self.load))
+        self.assertEqual(['a'], self.snapshot.groups_of('m1', self.load))
+        self.assertEqual([], self.snapshot.groups_of('m3', self.load))
+
+    def test_own_writes(self):
+        self.lookup()
+        self.snapshot.updated('nsgroup/ZG5z1:a',
+                              {'_ref': 'nsgroup/ZG5z1:a',
+                               'grid_secondaries': [{'name': 'm3'}]})
+        self.assertEqual([{'name': 'm3'}], self.lookup(
+            'a', ['grid_secondaries'])[0]['grid_secondaries'])
+        self.assertEqual(['a'], self.snapshot.groups_of('m3', self.load))
+        self.assertEqual(['b'], self.snapshot.groups_of('m2', self.load))
+
+        self.snapshot.deleted('nsgroup/ZG5z2:b')
+        self.assertEqual([], self.lookup('b'))
+        self.assertEqual([], self.snapshot.groups_of('m2', self.load))
+
+        self.snapshot.created('nsgroup', 'c')
+        self.assertIsNone(self.lookup('c'))
+        self.assertIsNone(self.lookup())
+        self.assertEqual(1, self.load.call_count)
+
+    def test_update_of_other_fields_is_ignored(self):
+        self.lookup()
+        self.snapshot.updated('nsgroup/ZG5z1:a', {'comment': 'changed',
+                                                  'extattrs': {}})
+        self.assertEqual([GROUPS[0]], self.lookup(
+            'a', ['name', 'grid_primary', 'grid_secondaries']))
+        self.assertEqual(1, self.load.call_count)
+
+    def test_update_of_incomplete_object_reloads(self):
+        self.load.side_effect = lambda objtype, fields: [
+            {'_ref': 'nsgroup/ZG5z1:a', 'name': 'a'}]
+        self.lookup()
+        self.snapshot.updated('nsgroup/ZG5z1:a', {'grid_primary': []})
+        self.lookup('a')
+        self.assertEqual(2, self.load.call_count)
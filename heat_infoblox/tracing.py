@@ -0,0 +1,72 @@
+# Copyright (c) 2016 Infoblox Inc.
+# All Rights Reserved.
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import contextlib
+
+"""OSprofiler trace points.
+
+Everything here is a no-op when osprofiler is not installed or when the
+current request is not being profiled.
+"""
+
+# osprofiler.profiler, or None if it is not installed. Imported on first
+# use, so that loading the plugins does not import osprofiler.
+_profiler = []
+
+
+def get_profiler():
+    if not _profiler:
+        try:
+            from osprofiler import profiler
+        except ImportError:
+            profiler = None
+        _profiler.append(profiler)
+    return _profiler[0]
+
+
+def enabled():
+    profiler = get_profiler()
+    return profiler is not None and profiler.get() is not None
+
+
+@contextlib.contextmanager
+def trace(name, info=None):
+    """Trace the enclosed block as 'name'.
+
+    Yields a dict the block can fill with details only known at the end,
+    e.g. a response status, which are recorded when the trace point stops.
+    """
+    if not enabled():
+        yield {}
+        return
+
+    profiler = get_profiler()
+    profiler.start(name, info=info)
+    stop_info = {}
+    try:
+        yield stop_info
+    finally:
+        profiler.stop(info=stop_info)
+
+
+def trace_cls(name):
+    """Trace all methods of the decorated class.
+
+    Arguments are not recorded since they may contain credentials.
+    """
+    profiler = get_profiler()
+    if profiler is None:
+        return lambda cls: cls
+    return profiler.trace_cls(name, hide_args=True, trace_private=True)